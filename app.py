@@ -1,7 +1,7 @@
 from flask import Flask, render_template_string, request, jsonify, redirect, url_for
-import math
 import sqlite3
 from flask_cors import CORS
+from geo import haversine
 
 app = Flask(__name__)
 CORS(app)
@@ -23,15 +23,6 @@ def init_db():
                            ('Default Location', 0, 0))
         conn.commit()
 
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371000
-    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
-
 HTML_TEMPLATE = """
 <!DOCTYPE html>
 <html>
@@ -1,11 +1,48 @@
-from flask import Flask, render_template_string, request, jsonify, redirect, url_for, send_file
+from flask import Flask, Response, request, jsonify, redirect, url_for
+import json
 import math
 import sqlite3
 from flask_cors import CORS
+from assets import AssetStore, compact_html
+from compression import Compress
+from geo import haversine, bearing
+from changelog import init_changelog, current_version, changes_since, maybe_compact
+from search import init_search, search
+import wire
+from importer import import_waypoints, open_source, WaypointError
+from jobs import JobManager, JobError
+from snapshot import LocationsView
+from tracking import SessionRegistry, SESSION_HEADER, FIX_ACCEPTED, fix_extras
+from resultcache import ResultCache
+from tiles import TileServer
+from vectortiles import VectorTileCache, init_vectortiles
+from heatmap import HeatGrid
 import os
+import zipfile
+
+try:
+    from flask_sock import Sock, ConnectionClosed
+except ImportError:
+    Sock = None
 
 app = Flask(__name__)
 CORS(app)
+assets = AssetStore()
+assets.init_app(app)
+tiles = TileServer()           # offline map tiles from tiles/*.mbtiles
+tiles.init_app(app)
+vector_tiles = VectorTileCache()   # /vtiles: locations as Mapbox Vector Tiles
+vector_tiles.init_app(app)
+Compress(app)
+sessions = SessionRegistry()   # live tracking, see /ws/track and /update_location
+heat = HeatGrid()              # /heat: where devices spend time, fed by every accepted fix
+heat.init_app(app)
+sessions.on_fix = heat.add
+results = ResultCache()        # distances by (target, position cell)
+jobs = JobManager('locations.db')   # process pool for /jobs, started on first use
+# Target lookups for /update_location: mmap'd snapshot + change-log overlay,
+# shared through the page cache by every worker process.
+locations_view = LocationsView('locations.snap')
 
 def init_db():
     with sqlite3.connect('locations.db') as conn:
@@ -23,15 +60,17 @@ def init_db():
             c.execute('INSERT INTO locations (name, latitude, longitude) VALUES (?, ?, ?)',
                       ('Default Location', 0, 0))
         conn.commit()
+        init_changelog(conn)
+        init_search(conn)
+        init_vectortiles(conn)
+        locations_view.refresh(conn)
+
+# At import, once per process: WSGI servers (gunicorn) never run __main__.
+init_db()
 
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371000
-    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = math.sin(dlat / 2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
+def location_dict(row):
+    id, name, lat, lon = row
+    return dict(id=id, name=name, latitude=lat, longitude=lon)
 
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -40,454 +79,8 @@ HTML_TEMPLATE = """
 <meta charset="utf-8">
 <title>GPS Distance Tracker</title>
 <meta name="viewport" content="width=device-width, initial-scale=1">
-<link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap" rel="stylesheet">
-<style>
-    * { margin: 0; padding: 0; box-sizing: border-box; }
-
-    body {
-        font-family: 'Inter', -apple-system, BlinkMacSystemFont, sans-serif;
-        background: #f0ece4;
-        min-height: 100vh;
-        padding: 20px;
-        color: #2c2c2c;
-    }
-
-    .container { max-width: 1200px; margin: 0 auto; }
-
-    header {
-        text-align: center;
-        margin-bottom: 30px;
-        padding: 24px 0 10px;
-    }
-
-    h1 {
-        color: #2c2c2c;
-        font-size: 2em;
-        font-weight: 700;
-        margin-bottom: 6px;
-        letter-spacing: 0.5px;
-    }
-
-    .subtitle {
-        color: #7a6e5f;
-        font-size: 0.95em;
-    }
-
-    .main-grid {
-        display: grid;
-        grid-template-columns: 1fr 1fr;
-        gap: 20px;
-        margin-bottom: 20px;
-    }
-
-    @media (max-width: 768px) {
-        .main-grid { grid-template-columns: 1fr; }
-    }
-
-    .card {
-        background: #fff;
-        border-radius: 12px;
-        padding: 24px;
-        box-shadow: 0 2px 12px rgba(0,0,0,0.07);
-        border: 1px solid #e0d9cf;
-    }
-
-    /* === COMPASS === */
-    .compass-container {
-        display: flex;
-        flex-direction: column;
-        align-items: center;
-        justify-content: center;
-        min-height: 400px;
-    }
-
-    .location-selector { width: 100%; margin-bottom: 16px; }
-
-    .search-box {
-        width: 100%;
-        padding: 10px 16px;
-        border: 1.5px solid #d4cdc3;
-        border-radius: 8px;
-        font-size: 0.95em;
-        background: #faf8f5;
-        transition: all 0.2s;
-        margin-bottom: 10px;
-        color: #2c2c2c;
-    }
-
-    .search-box:focus {
-        outline: none;
-        border-color: #7a6e5f;
-        background: #fff;
-    }
-
-    select {
-        width: 100%;
-        padding: 10px 16px;
-        border: 1.5px solid #d4cdc3;
-        border-radius: 8px;
-        font-size: 0.95em;
-        background: #faf8f5;
-        cursor: pointer;
-        color: #2c2c2c;
-        transition: all 0.2s;
-    }
-
-    select:focus {
-        outline: none;
-        border-color: #7a6e5f;
-    }
-
-    .kompas-wrapper {
-        image-rendering: pixelated;
-        image-rendering: crisp-edges;
-        width: 240px;
-        height: 240px;
-        overflow: hidden;
-        border: 3px solid #5a4e3f;
-        border-radius: 6px;
-        box-shadow: 0 4px 20px rgba(0,0,0,0.2);
-        margin: 16px 0;
-    }
-
-    #mcCompass {
-        width: 240px;
-        height: 7680px;
-        background-image: url('/kompas.png');
-        background-size: 240px 7680px;
-        background-repeat: no-repeat;
-        background-position: 0px 0px;
-    }
-
-    .distance-display { text-align: center; margin-top: 10px; }
-
-    .distance-value {
-        font-size: 2.6em;
-        font-weight: 700;
-        color: #3d3228;
-        margin-bottom: 4px;
-        letter-spacing: 1px;
-    }
-
-    .distance-label {
-        font-size: 0.9em;
-        color: #9a8e7f;
-        font-weight: 500;
-    }
-
-    .bearing-info {
-        display: flex;
-        justify-content: space-around;
-        margin-top: 16px;
-        padding-top: 16px;
-        border-top: 1.5px solid #ede8e0;
-        width: 100%;
-    }
-
-    .bearing-item { text-align: center; }
-
-    .bearing-item-label {
-        font-size: 0.8em;
-        color: #9a8e7f;
-        margin-bottom: 4px;
-        text-transform: uppercase;
-        letter-spacing: 0.5px;
-    }
-
-    .bearing-item-value {
-        font-size: 1.3em;
-        font-weight: 600;
-        color: #3d3228;
-    }
-
-    /* === SECTION === */
-    .section-title {
-        font-size: 1.1em;
-        font-weight: 700;
-        margin-bottom: 16px;
-        color: #3d3228;
-        text-transform: uppercase;
-        letter-spacing: 0.5px;
-    }
-
-    .form-group { margin-bottom: 12px; }
-
-    input[type="text"],
-    input[type="number"] {
-        width: 100%;
-        padding: 10px 16px;
-        border: 1.5px solid #d4cdc3;
-        border-radius: 8px;
-        font-size: 0.95em;
-        background: #faf8f5;
-        color: #2c2c2c;
-        transition: all 0.2s;
-    }
-
-    input[type="text"]:focus,
-    input[type="number"]:focus {
-        outline: none;
-        border-color: #7a6e5f;
-        background: #fff;
-    }
-
-    .button-group {
-        display: flex;
-        gap: 8px;
-        margin-top: 12px;
-    }
-
-    /* === BUTTONS === */
-    button {
-        flex: 1;
-        padding: 8px 14px;
-        border: none;
-        border-radius: 7px;
-        font-size: 0.85em;
-        font-weight: 600;
-        cursor: pointer;
-        transition: all 0.2s;
-        letter-spacing: 0.2px;
-    }
-
-    .btn-primary {
-        background: #4a3f35;
-        color: #fff;
-    }
-    .btn-primary:hover {
-        background: #3a3028;
-        box-shadow: 0 2px 8px rgba(74,63,53,0.3);
-    }
-
-    .btn-secondary {
-        background: #ede8e0;
-        color: #4a3f35;
-        border: 1px solid #d4cdc3;
-    }
-    .btn-secondary:hover { background: #e0d9cf; }
-
-    .btn-danger {
-        background: #c0392b;
-        color: #fff;
-    }
-    .btn-danger:hover { background: #a93226; }
-
-    .btn-success {
-        background: #2e7d52;
-        color: #fff;
-    }
-    .btn-success:hover { background: #256342; }
-
-    .btn-maps {
-        background: #2c5f8a;
-        color: #fff;
-    }
-    .btn-maps:hover {
-        background: #1e4d73;
-        box-shadow: 0 2px 8px rgba(44,95,138,0.3);
-    }
-
-    .btn-reveal {
-        background: #f0ece4;
-        color: #4a3f35;
-        border: 1.5px solid #c4bdb3;
-        width: 100%;
-        margin-top: 10px;
-        padding: 7px 14px;
-        font-size: 0.82em;
-    }
-    .btn-reveal:hover { background: #e5dfd6; }
-
-    /* === LOCATION CARDS === */
-    .locations-grid {
-        display: grid;
-        gap: 12px;
-        margin-top: 16px;
-    }
-
-    .location-card {
-        background: #faf8f5;
-        border-radius: 10px;
-        padding: 16px;
-        border: 1.5px solid #e0d9cf;
-        transition: all 0.2s;
-    }
-
-    .location-card:hover {
-        border-color: #7a6e5f;
-        box-shadow: 0 2px 10px rgba(0,0,0,0.07);
-    }
-
-    .location-card-header {
-        display: flex;
-        justify-content: space-between;
-        align-items: center;
-        margin-bottom: 12px;
-        padding-bottom: 12px;
-        border-bottom: 1.5px solid #e0d9cf;
-    }
-
-    .location-name {
-        font-size: 1.1em;
-        font-weight: 700;
-        color: #2c2c2c;
-    }
-
-    .location-index {
-        background: #4a3f35;
-        color: #fff;
-        padding: 3px 10px;
-        border-radius: 20px;
-        font-size: 0.8em;
-        font-weight: 600;
-    }
-
-    .location-coords {
-        display: grid;
-        grid-template-columns: 1fr 1fr;
-        gap: 8px;
-        margin-bottom: 12px;
-    }
-
-    .coord-item {
-        background: #fff;
-        padding: 8px 10px;
-        border-radius: 7px;
-        border: 1px solid #ede8e0;
-    }
-
-    .coord-label {
-        font-size: 0.75em;
-        color: #9a8e7f;
-        margin-bottom: 3px;
-        text-transform: uppercase;
-        letter-spacing: 0.3px;
-    }
-
-    .coord-value {
-        font-size: 0.9em;
-        font-weight: 600;
-        color: #2c2c2c;
-        font-family: 'Courier New', monospace;
-        filter: blur(5px);
-        user-select: none;
-        transition: filter 0.3s;
-    }
-
-    .coord-value.revealed { filter: blur(0px); user-select: text; }
-
-    .location-actions {
-        display: flex;
-        gap: 8px;
-    }
-
-    .location-actions button {
-        flex: 1;
-        padding: 7px 10px;
-        font-size: 0.82em;
-    }
-
-    /* === EDIT MODE === */
-    .location-card.edit-mode {
-        background: #fff;
-        border-color: #7a6e5f;
-    }
-
-    .edit-form { display: none; }
-    .edit-mode .edit-form { display: block; }
-    .edit-mode .view-content { display: none; }
-
-    .edit-input-group { margin-bottom: 10px; }
-
-    .edit-input-group label {
-        display: block;
-        font-size: 0.82em;
-        color: #7a6e5f;
-        margin-bottom: 4px;
-        font-weight: 600;
-        text-transform: uppercase;
-        letter-spacing: 0.3px;
-    }
-
-    .edit-input-group input {
-        width: 100%;
-        padding: 8px 12px;
-        border: 1.5px solid #d4cdc3;
-        border-radius: 7px;
-        font-size: 0.9em;
-        background: #faf8f5;
-    }
-
-    /* === DESKTOP TABLE === */
-    table {
-        width: 100%;
-        border-collapse: separate;
-        border-spacing: 0;
-        margin-top: 16px;
-        display: none;
-    }
-
-    @media (min-width: 1024px) {
-        table { display: table; }
-        .locations-grid { display: none; }
-
-        th {
-            background: #f5f0e8;
-            padding: 12px 14px;
-            text-align: left;
-            font-weight: 600;
-            font-size: 0.8em;
-            color: #7a6e5f;
-            border-bottom: 1.5px solid #e0d9cf;
-            text-transform: uppercase;
-            letter-spacing: 0.4px;
-        }
-
-        th:first-child { border-top-left-radius: 8px; }
-        th:last-child  { border-top-right-radius: 8px; }
-
-        td {
-            padding: 12px 14px;
-            border-bottom: 1px solid #f0ece4;
-            font-size: 0.9em;
-        }
-
-        tr:last-child td:first-child { border-bottom-left-radius: 8px; }
-        tr:last-child td:last-child  { border-bottom-right-radius: 8px; }
-        tr:hover { background: #faf8f5; }
-
-        .table-coord {
-            font-family: 'Courier New', monospace;
-            font-size: 0.85em;
-            filter: blur(5px);
-            user-select: none;
-            transition: filter 0.3s;
-            display: inline-block;
-        }
-        .table-coord.revealed { filter: blur(0px); user-select: text; }
-
-        .table-input {
-            padding: 7px 10px;
-            border: 1px solid #d4cdc3;
-            border-radius: 6px;
-            font-size: 0.85em;
-            width: 100%;
-            background: #faf8f5;
-        }
-
-        .table-button {
-            padding: 6px 12px;
-            font-size: 0.82em;
-            margin-right: 4px;
-        }
-    }
-
-    @keyframes pulse {
-        0%, 100% { opacity: 1; }
-        50%       { opacity: 0.4; }
-    }
-    .loading { animation: pulse 1.5s ease-in-out infinite; }
-</style>
+{% if 'fonts.css' in assets %}<link href="{{ asset_url('fonts.css') }}" rel="stylesheet">{% endif %}
+<link href="{{ asset_url('app13.css') }}" rel="stylesheet">
 </head>
 <body>
 <div class="container">
@@ -527,6 +120,21 @@ HTML_TEMPLATE = """
                         <div class="bearing-item-label">Direction</div>
                         <div id="directionValue" class="bearing-item-value">---</div>
                     </div>
+                    <div class="bearing-item">
+                        <div class="bearing-item-label">ETA</div>
+                        <div id="etaValue" class="bearing-item-value">---</div>
+                    </div>
+                </div>
+
+                <div id="mapBox" class="map-box" hidden>
+                    <div id="tileMap" class="tile-map"></div>
+                    <div class="map-controls">
+                        <button type="button" onclick="TileMap.zoomBy(1)">+</button>
+                        <button type="button" onclick="TileMap.zoomBy(-1)">−</button>
+                        <button type="button" onclick="TileMap.recenter()">⌖</button>
+                        <button type="button" id="heatToggle" onclick="TileMap.toggleHeat()" title="Heatmap">🔥</button>
+                    </div>
+                    <div id="mapAttribution" class="map-attribution"></div>
                 </div>
 
                 <div style="margin-top: 16px; width: 100%;">
@@ -628,7 +236,7 @@ HTML_TEMPLATE = """
             </thead>
             <tbody>
             {% for loc in locations %}
-            <tr>
+            <tr id="row-{{ loc[0] }}">
                 <td>{{ loop.index }}</td>
                 <td><strong>{{ loc[1] }}</strong></td>
                 <td><span class="table-coord" id="tlat-{{ loc[0] }}">{{ "%.6f"|format(loc[2]) }}</span></td>
@@ -653,203 +261,149 @@ HTML_TEMPLATE = """
     </div>
 </div>
 
-<script>
-// ── Minecraft Compass ────────────────────────────────────────
-const TOTAL_FRAMES = 32;
-const FRAME_H      = 240;
-
-function bearingToFrame(bearing) {
-    const adjusted = (540 - bearing) % 360;
-    return Math.round((adjusted / 360) * TOTAL_FRAMES) % TOTAL_FRAMES;
-}
-
-function setCompassFrame(frame) {
-    const offsetY = -((TOTAL_FRAMES - 1 - frame) * FRAME_H);
-    document.getElementById('mcCompass').style.backgroundPosition = `0px ${offsetY}px`;
-}
-
-setCompassFrame(0);
-
-// ── Device Orientation ───────────────────────────────────────
-let currentHeading = 0;
-let lastBearing    = 0;
-
-window.addEventListener('deviceorientationabsolute', e => {
-    if (e.alpha != null) { currentHeading = 360 - e.alpha; updateCompassFrame(); }
-});
-window.addEventListener('deviceorientation', e => {
-    if (e.alpha != null && currentHeading === 0) { currentHeading = 360 - e.alpha; updateCompassFrame(); }
-});
-
-function updateCompassFrame() {
-    const rel = (lastBearing - currentHeading + 360) % 360;
-    setCompassFrame(bearingToFrame(rel));
-    document.getElementById('bearingValue').innerText   = Math.round(lastBearing) + '°';
-    document.getElementById('directionValue').innerText = getCardinalDirection(lastBearing);
-}
-
-// ── GPS ──────────────────────────────────────────────────────
-function getLocationAndAdd() {
-    navigator.geolocation.getCurrentPosition(pos => {
-        const name = prompt('Nama lokasi:');
-        if (!name) return;
-        fetch('/add_location', {
-            method: 'POST',
-            headers: {'Content-Type': 'application/json'},
-            body: JSON.stringify({ name, latitude: pos.coords.latitude, longitude: pos.coords.longitude })
-        }).then(() => location.reload());
-    }, err => alert('GPS Error: ' + err.message), { enableHighAccuracy: true });
-}
-
-function updateLocation() {
-    navigator.geolocation.watchPosition(sendLocation, err => {
-        console.warn('GPS Error:', err);
-        document.getElementById('distanceValue').innerText = 'Error';
-        document.getElementById('distanceValue').classList.remove('loading');
-    }, { enableHighAccuracy: true, maximumAge: 0, timeout: 5000 });
-}
-
-function sendLocation(pos) {
-    const lat = pos.coords.latitude;
-    const lon = pos.coords.longitude;
-    const id  = document.getElementById('locationSelect').value;
-
-    fetch('/update_location', {
-        method: 'POST',
-        headers: {'Content-Type': 'application/json'},
-        body: JSON.stringify({ latitude: lat, longitude: lon, location_id: id })
-    })
-    .then(r => r.json()).then(data => {
-        if (data.distance !== undefined) {
-            const el = document.getElementById('distanceValue');
-            el.innerText = formatDistance(data.distance);
-            el.classList.remove('loading');
-            fetch('/get_location_coords/' + id).then(r => r.json()).then(dest => {
-                lastBearing = calculate_bearing(lat, lon, dest.latitude, dest.longitude);
-                updateCompassFrame();
-            });
-        }
-    });
-}
-
-function formatDistance(m) {
-    return Math.round(m).toLocaleString('id-ID');
-}
-
-function calculate_bearing(lat1, lon1, lat2, lon2) {
-    const toRad = d => d * Math.PI / 180;
-    const toDeg = r => r * 180 / Math.PI;
-    const dLon  = toRad(lon2 - lon1);
-    const φ1 = toRad(lat1), φ2 = toRad(lat2);
-    const y = Math.sin(dLon) * Math.cos(φ2);
-    const x = Math.cos(φ1) * Math.sin(φ2) - Math.sin(φ1) * Math.cos(φ2) * Math.cos(dLon);
-    return (toDeg(Math.atan2(y, x)) + 360) % 360;
-}
-
-function getCardinalDirection(b) {
-    return ['N','NE','E','SE','S','SW','W','NW'][Math.round(b / 45) % 8];
-}
-
-// ── Google Maps ──────────────────────────────────────────────
-function openGoogleMaps(lat, lon) {
-    window.open(`https://www.google.com/maps/dir/?api=1&destination=${lat},${lon}&travelmode=driving`, '_blank');
-}
-
-function openGoogleMapsFromCompass() {
-    const id = document.getElementById('locationSelect').value;
-    fetch('/get_location_coords/' + id).then(r => r.json()).then(dest => {
-        window.open(`https://www.google.com/maps/dir/?api=1&destination=${dest.latitude},${dest.longitude}&travelmode=driving`, '_blank');
-    });
-}
-
-// ── Reveal Koordinat (Mobile) ────────────────────────────────
-function toggleReveal(id) {
-    const lat = document.getElementById('lat-' + id);
-    const lon = document.getElementById('lon-' + id);
-    const btn = document.getElementById('revealBtn-' + id);
-    const shown = lat.classList.toggle('revealed');
-    lon.classList.toggle('revealed');
-    btn.textContent = shown ? '🙈 Sembunyikan Koordinat' : '👁️ Perlihatkan Koordinat';
-}
-
-// ── Reveal Koordinat (Desktop Table) ────────────────────────
-function toggleTableReveal(id) {
-    const tlat = document.getElementById('tlat-' + id);
-    const tlon = document.getElementById('tlon-' + id);
-    const btn  = document.getElementById('treveal-' + id);
-    const shown = tlat.classList.toggle('revealed');
-    tlon.classList.toggle('revealed');
-    btn.textContent = shown ? '🙈' : '👁️';
-}
-
-// ── Filter ───────────────────────────────────────────────────
-function filterLocations() {
-    const input  = document.getElementById('searchInput').value.toLowerCase();
-    const select = document.getElementById('locationSelect');
-    const table  = document.getElementById('locationsTable');
-    const grid   = document.getElementById('locationsGrid');
-
-    for (let i = 0; i < select.options.length; i++) {
-        select.options[i].style.display = select.options[i].text.toLowerCase().includes(input) ? '' : 'none';
-    }
-    if (table && table.getElementsByTagName('tbody')[0]) {
-        for (let row of table.getElementsByTagName('tbody')[0].rows) {
-            row.style.display = row.cells[1].textContent.toLowerCase().includes(input) ? '' : 'none';
-        }
-    }
-    if (grid) {
-        for (let card of grid.getElementsByClassName('location-card')) {
-            card.style.display = card.querySelector('.location-name').textContent.toLowerCase().includes(input) ? '' : 'none';
-        }
-    }
-}
-
-// ── Edit Toggle ──────────────────────────────────────────────
-function toggleEdit(id) {
-    const card = document.getElementById('card-' + id);
-    if (card) card.classList.toggle('edit-mode');
-}
-
-// ── Init ─────────────────────────────────────────────────────
-window.onload = () => {
-    updateLocation();
-    if (typeof DeviceOrientationEvent !== 'undefined' && typeof DeviceOrientationEvent.requestPermission === 'function') {
-        DeviceOrientationEvent.requestPermission()
-            .then(r => { if (r === 'granted') console.log('Orientation granted'); })
-            .catch(console.error);
-    }
-};
-</script>
+<script src="{{ asset_url('offline.js') }}"></script>
+<script src="{{ asset_url('crud.js') }}"></script>
+<script src="{{ asset_url('live.js') }}"></script>
+<script src="{{ asset_url('fixrate.js') }}"></script>
+<script src="{{ asset_url('motion.js') }}"></script>
+<script src="{{ asset_url('map.js') }}"></script>
+<script src="{{ asset_url('app13.js') }}"></script>
 </body>
 </html>
 """
 
+app.jinja_env.trim_blocks = True
+app.jinja_env.lstrip_blocks = True
+PAGE = app.jinja_env.from_string(compact_html(HTML_TEMPLATE))
+
 @app.route('/')
 def index():
-    init_db()
     with sqlite3.connect('locations.db') as conn:
         c = conn.cursor()
         c.execute('SELECT id, name, latitude, longitude FROM locations')
         locations = c.fetchall()
-    return render_template_string(HTML_TEMPLATE, locations=locations)
+    # Streamed in ~64-event chunks so large pages start arriving (and
+    # compressing) before the whole document is rendered.
+    stream = PAGE.stream(locations=locations)
+    stream.enable_buffering(64)
+    return Response(stream, mimetype='text/html')
 
 @app.route('/kompas.png')
 def kompas_img():
-    return send_file('kompas.png', mimetype='image/png')
+    return assets.serve_unversioned('kompas.png')
+
+@app.route('/sw.js')
+def service_worker():
+    return assets.serve_unversioned('sw.js')
+
+@app.route('/locations')
+def list_locations():
+    with sqlite3.connect('locations.db') as conn:
+        c = conn.cursor()
+        version = current_version(conn)
+        c.execute('SELECT id, name, latitude, longitude FROM locations ORDER BY id')
+        rows = c.fetchall()
+    resp = jsonify(version=version, locations=[location_dict(r) for r in rows])
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.set_etag(f'v{version}')
+    return resp.make_conditional(request)
+
+@app.route('/locations/changes')
+def location_changes():
+    since = request.args.get('since', 0, type=int)
+    with sqlite3.connect('locations.db') as conn:
+        version, reset, upserts, deleted = changes_since(conn, since)
+    return jsonify(version=version, reset=reset, deleted=deleted,
+                   changes=[location_dict(r) for r in upserts])
+
+@app.route('/search')
+def search_locations():
+    q = request.args.get('q', '')
+    limit = max(1, min(request.args.get('limit', 20, type=int), 200))
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    with sqlite3.connect('locations.db') as conn:
+        found = search(conn, q, limit, lat, lon, distance=haversine)
+    return jsonify(results=found)
 
 @app.route('/update_location', methods=['POST'])
 def update_location():
+    if wire.is_compact(request.mimetype):
+        return update_location_compact()
     data = request.get_json()
     location_id = int(data.get('location_id', 1))
+    lat, lon = float(data['latitude']), float(data['longitude'])
+    session = sessions.resolve(request.headers.get(SESSION_HEADER))
+    outcome = sessions.check_fix(session, lat, lon, data.get('timestamp'), location_id,
+                                 **fix_extras(data))
+    if outcome != FIX_ACCEPTED and session.last_distance is not None:
+        # Repeat or overlapping stream: answer for the fix we already have.
+        resp = jsonify(distance=session.last_distance, dropped=outcome,
+                       advice=sessions.advice(session), motion=sessions.motion(session))
+    else:
+        if session.target_id != location_id or session.target is None:
+            with sqlite3.connect('locations.db') as conn:
+                watch_changes(conn)
+                locations_view.refresh(conn)
+            row = locations_view.coords(location_id)
+            if not row:
+                resp = jsonify(error="Location not found")
+                resp.status_code = 404
+                resp.headers[SESSION_HEADER] = session.id
+                return resp
+            session.target_id, session.target = location_id, row
+        if answer_fix(session):
+            # Within a cell of the last answer: the distance stays, but the
+            # page restarts its run-on from it with the current motion model.
+            resp = jsonify(distance=session.last_distance, unchanged=True,
+                           advice=sessions.advice(session), motion=sessions.motion(session))
+        else:
+            resp = jsonify(distance=session.last_distance, advice=sessions.advice(session),
+                           motion=sessions.motion(session))
+    resp.headers[SESSION_HEADER] = session.id
+    return resp
+
+@app.route('/tracking/stats')
+def tracking_stats():
+    return jsonify(dict(sessions.stats(), results=results.stats()))
+
+def answer_fix(session):
+    """Set ``session.last_distance`` for its last fix and target, through
+    the result cache. True, leaving the distance as it was, if the new one
+    is no meaningful change (``ResultCache.unchanged``)."""
+    key = results.key(session.target_id, *session.last_fix, session.accuracy)
+    cached = results.get(key)
+    if cached is not None and cached[0] == session.target:
+        distance = cached[1]
+    else:
+        distance = haversine(*session.last_fix, *session.target)
+        results.put(key, (session.target, distance))
+    unchanged = results.unchanged(session.last_cell, session.last_distance, key, distance)
+    session.last_cell = key
+    if not unchanged:
+        session.last_distance = distance
+    return unchanged
+
+def update_location_compact():
+    # Packed-struct / MessagePack fixes, optionally many per body (see wire.py).
+    try:
+        fixes, batched = wire.decode_fixes(request.mimetype, request.get_data())
+    except wire.WireError as e:
+        return jsonify(error=str(e)), 400
     with sqlite3.connect('locations.db') as conn:
-        c = conn.cursor()
-        c.execute('SELECT latitude, longitude FROM locations WHERE id = ?', (location_id,))
-        row = c.fetchone()
-    if not row:
+        locations_view.refresh(conn)
+    targets = {id: locations_view.coords(id) for id in {f[2] for f in fixes}}
+    targets = {id: row for id, row in targets.items() if row is not None}
+    distances = [haversine(lat, lon, *targets[id]) if id in targets else math.nan
+                 for lat, lon, id, _ in fixes]
+    if not batched and math.isnan(distances[0]):
         return jsonify(error="Location not found"), 404
-    lat2, lon2 = row
-    dist = haversine(data['latitude'], data['longitude'], lat2, lon2)
-    return jsonify(distance=dist)
+
+    mimetype = wire.reply_mimetype(request.accept_mimetypes, request.mimetype)
+    if mimetype == wire.JSON_TYPE:
+        values = [None if math.isnan(d) else d for d in distances]
+        return jsonify(distances=values) if batched else jsonify(distance=values[0])
+    return Response(wire.encode_distances(mimetype, distances, batched), mimetype=mimetype)
 
 @app.route('/get_location_coords/<int:id>')
 def get_location_coords(id):
@@ -874,6 +428,7 @@ def add_location():
         c = conn.cursor()
         c.execute('INSERT INTO locations(name, latitude, longitude) VALUES(?, ?, ?)', (name, lat, lon))
         conn.commit()
+        maybe_compact(conn)
     return redirect(url_for('index'))
 
 @app.route('/edit_location/<int:id>', methods=['POST'])
@@ -884,6 +439,8 @@ def edit_location(id):
         c = conn.cursor()
         c.execute('UPDATE locations SET name=?, latitude=?, longitude=? WHERE id=?', (name, lat, lon, id))
         conn.commit()
+        maybe_compact(conn)
+    results.invalidate(id)
     return redirect(url_for('index'))
 
 @app.route('/delete_location/<int:id>', methods=['POST'])
@@ -892,9 +449,376 @@ def delete_location(id):
         c = conn.cursor()
         c.execute('DELETE FROM locations WHERE id=?', (id,))
         conn.commit()
+        maybe_compact(conn)
+    results.invalidate(id)
     return redirect(url_for('index'))
 
+# ── JSON CRUD ────────────────────────────────────────────────
+# Same operations as the form routes above, but each reply carries only
+# the affected row and the new dataset version, so the page can patch
+# itself instead of reloading every location.
+
+def parse_location(d, current=None):
+    name = d.get('name', current[1] if current else None)
+    lat = d.get('latitude', current[2] if current else None)
+    lon = d.get('longitude', current[3] if current else None)
+    if not name or lat is None or lon is None:
+        raise ValueError('name, latitude and longitude are required')
+    return str(name), float(lat), float(lon)
+
+@app.route('/api/locations', methods=['POST'])
+def api_create_location():
+    try:
+        name, lat, lon = parse_location(request.get_json(force=True, silent=True) or {})
+    except (AttributeError, TypeError, ValueError) as e:
+        return jsonify(error=str(e)), 400
+    with sqlite3.connect('locations.db') as conn:
+        c = conn.cursor()
+        c.execute('INSERT INTO locations(name, latitude, longitude) VALUES(?, ?, ?)', (name, lat, lon))
+        row = (c.lastrowid, name, lat, lon)
+        conn.commit()
+        maybe_compact(conn)
+        version = current_version(conn)
+    return jsonify(location=location_dict(row), version=version), 201
+
+@app.route('/api/locations/<int:id>', methods=['PUT', 'PATCH'])
+def api_update_location(id):
+    with sqlite3.connect('locations.db') as conn:
+        c = conn.cursor()
+        c.execute('SELECT id, name, latitude, longitude FROM locations WHERE id=?', (id,))
+        current = c.fetchone()
+        if not current:
+            return jsonify(error="Location not found"), 404
+        data = request.get_json(force=True, silent=True) or {}
+        try:
+            name, lat, lon = parse_location(data, current if request.method == 'PATCH' else None)
+        except (AttributeError, TypeError, ValueError) as e:
+            return jsonify(error=str(e)), 400
+        c.execute('UPDATE locations SET name=?, latitude=?, longitude=? WHERE id=?', (name, lat, lon, id))
+        conn.commit()
+        maybe_compact(conn)
+        version = current_version(conn)
+    results.invalidate(id)
+    return jsonify(location=location_dict((id, name, lat, lon)), version=version)
+
+@app.route('/api/locations/<int:id>', methods=['DELETE'])
+def api_delete_location(id):
+    with sqlite3.connect('locations.db') as conn:
+        c = conn.cursor()
+        c.execute('DELETE FROM locations WHERE id=?', (id,))
+        if c.rowcount == 0:
+            return jsonify(error="Location not found"), 404
+        conn.commit()
+        maybe_compact(conn)
+        version = current_version(conn)
+    results.invalidate(id)
+    return jsonify(deleted=id, version=version)
+
+# ── Batch ────────────────────────────────────────────────────
+# {"atomic": false, "ops": [{"op": "insert", "name": ..., "latitude": ..., "longitude": ...},
+#                           {"op": "update", "id": 3, "name": ...},
+#                           {"op": "delete", "id": 4}]}
+# Ops are checked in order against the ids they touch, then consecutive
+# ops of the same kind go to the database with a single executemany, all
+# inside one transaction (one commit, one fsync). With "atomic": true any
+# failed op rolls the whole batch back.
+
+BATCH_SQL = {
+    'insert': 'INSERT INTO locations(id, name, latitude, longitude) VALUES(?, ?, ?, ?)',
+    'update': 'UPDATE locations SET name=COALESCE(?, name), latitude=COALESCE(?, latitude), '
+              'longitude=COALESCE(?, longitude) WHERE id=?',
+    'delete': 'DELETE FROM locations WHERE id=?',
+}
+
+def parse_batch_op(op, next_id, existing):
+    kind = op.get('op')
+    if kind == 'insert':
+        name, lat, lon = parse_location(op)
+        return kind, (next_id, name, lat, lon)
+    if kind not in ('update', 'delete'):
+        raise ValueError(f'unknown op {kind!r}')
+    id = int(op['id'])
+    if id not in existing:
+        raise LookupError('Location not found')
+    if kind == 'delete':
+        return kind, (id,)
+    name = op.get('name')
+    lat, lon = op.get('latitude'), op.get('longitude')
+    return kind, (None if name is None else str(name),
+                  None if lat is None else float(lat),
+                  None if lon is None else float(lon), id)
+
+@app.route('/locations/batch', methods=['POST'])
+def batch_locations():
+    body = request.get_json(force=True, silent=True) or {}
+    ops = body.get('ops') if isinstance(body, dict) else None
+    if not isinstance(ops, list):
+        return jsonify(error="ops must be a list"), 400
+    atomic = bool(body.get('atomic', False))
+
+    conn = sqlite3.connect('locations.db', isolation_level=None)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        touched = []
+        for op in ops:
+            try:
+                touched.append(int(op['id']))
+            except (KeyError, TypeError, ValueError):
+                pass
+        existing = {r[0] for r in conn.execute(
+            'SELECT id FROM locations WHERE id IN (SELECT value FROM json_each(?))',
+            (json.dumps(touched),))}
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'locations'").fetchone()
+        next_id = max(row[0] if row else 0,
+                      conn.execute('SELECT COALESCE(MAX(id), 0) FROM locations').fetchone()[0]) + 1
+
+        outcomes, runs = [], []
+        for op in ops:
+            try:
+                if not isinstance(op, dict):
+                    raise ValueError('op must be an object')
+                kind, params = parse_batch_op(op, next_id, existing)
+            except LookupError as e:
+                outcomes.append(dict(ok=False, error=str(e)))
+                continue
+            except (KeyError, TypeError, ValueError) as e:
+                outcomes.append(dict(ok=False, error=f'invalid op: {e}'))
+                continue
+            if kind == 'insert':
+                existing.add(next_id)
+                next_id += 1
+            elif kind == 'delete':
+                existing.discard(params[0])
+            id = params[0] if kind != 'update' else params[3]
+            outcomes.append(dict(ok=True, op=kind, id=id))
+            if runs and runs[-1][0] == kind:
+                runs[-1][1].append(params)
+            else:
+                runs.append((kind, [params]))
+
+        failed = sum(1 for r in outcomes if not r['ok'])
+        if atomic and failed:
+            conn.execute('ROLLBACK')
+            return jsonify(applied=0, failed=failed, results=outcomes,
+                           error="batch rolled back"), 400
+        for kind, params in runs:
+            conn.executemany(BATCH_SQL[kind], params)
+        conn.execute('COMMIT')
+        maybe_compact(conn)
+        version = current_version(conn)
+    except Exception:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+    return jsonify(version=version, applied=len(outcomes) - failed, failed=failed, results=outcomes)
+
+@app.route('/import', methods=['POST'])
+def import_locations():
+    # multipart upload "file" (.gpx, .kml, .kmz); werkzeug spools big files to disk
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify(error="file is required"), 400
+    try:
+        min_distance = float(request.form.get('min_distance', 10))
+    except ValueError:
+        return jsonify(error="min_distance must be a number"), 400
+    conn = sqlite3.connect('locations.db', isolation_level=None)
+    try:
+        stats = import_waypoints(conn, open_source(upload.stream, upload.filename), min_distance)
+    except (WaypointError, zipfile.BadZipFile) as e:
+        # batches before the broken part stay committed: say how far it got
+        partial = getattr(e, 'stats', None) or dict(imported=0, skipped=0, invalid=0)
+        return jsonify(error=str(e), version=current_version(conn),
+                       last_id=getattr(e, 'last_id', None), **partial), 400
+    finally:
+        version = current_version(conn)
+        conn.close()
+    return jsonify(version=version, **stats)
+
+# ── Background jobs ──────────────────────────────────────────
+# Run on a process pool (jobs.py) so they never hold this process's GIL.
+#   POST /jobs {"kind": "nearest", "points": [[lat, lon], ...]}
+#              {"kind": "matrix", "points": [...], "targets": [id, ...]}
+#        -> 202 {"id": 3, "status": "queued", ...}, Location: /jobs/3
+#        matrix without "targets" means every location, in id order
+#   GET    /jobs/3                              status and progress
+#   GET    /jobs/3/result?offset=0&limit=1000   rows, once done
+#   GET    /jobs/3/stream                       NDJSON rows as chunks finish, then the status
+#   DELETE /jobs/3                              cancel and drop the result
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    d = request.get_json(silent=True) or {}
+    try:
+        job = jobs.submit(d.get('kind'), d.get('points'), d.get('targets'))
+    except JobError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(job.status()), 202, {'Location': url_for('job_status', id=job.id)}
+
+@app.route('/jobs/<int:id>')
+def job_status(id):
+    job = jobs.get(id)
+    if job is None:
+        return jsonify(error="Job not found"), 404
+    return jsonify(job.status())
+
+@app.route('/jobs/<int:id>/result')
+def job_result(id):
+    job = jobs.get(id)
+    if job is None:
+        return jsonify(error="Job not found"), 404
+    if job.state != 'done':
+        return jsonify(job.status()), 409
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = min(max(1, int(request.args.get('limit', 1000))), 10000)
+    except ValueError:
+        return jsonify(error="offset and limit must be integers"), 400
+    return jsonify(dict(job.status(), offset=offset, target_ids=job.targets,
+                        rows=jobs.rows(job, offset, limit)))
+
+@app.route('/jobs/<int:id>/stream')
+def job_stream(id):
+    job = jobs.get(id)
+    if job is None:
+        return jsonify(error="Job not found"), 404
+    return Response((json.dumps(row) + '\n' for row in jobs.stream(job)), mimetype='application/x-ndjson')
+
+@app.route('/jobs/<int:id>', methods=['DELETE'])
+def delete_job(id):
+    job = jobs.get(id)
+    if job is None:
+        return jsonify(error="Job not found"), 404
+    jobs.delete(job)
+    return jsonify(job.status())
+
+# ── Live tracking (WebSocket) ────────────────────────────────
+# Needs the optional flask-sock package. Protocol, JSON text frames:
+#   client: {"type": "target", "location_id": 5}   once, or when switching
+#           [lat, lon, timestamp?, accuracy?, speed?]
+#           or  {"type": "fix", "latitude": .., "longitude": .., ...}
+#           {"type": "pong"}
+#   server: {"type": "hello", "session": 12, "version": 340}
+#           {"type": "distance", "location_id": 5, "distance": .., "bearing": ..,
+#            "advice": {"interval": 12.5, "min_distance": 9.0},
+#            "motion": {"lat": .., "lon": .., "speed": 1.3, "heading": 87.0,
+#                       "eta": 540, "horizon": 60.0}}
+#           {"type": "dataset", "version": 341}      after any location change
+#           {"type": "ping"}                          heartbeat
+# The werkzeug dev server spends a thread per socket; for thousands of
+# idle sessions run under gevent (e.g. gunicorn -k gevent).
+
+watched_version = None
+
+def watch_changes(conn):
+    # Baseline for push_dataset_changes; anything after this gets pushed.
+    global watched_version
+    if watched_version is None:
+        watched_version = current_version(conn)
+
+def distance_message(session, dropped=None):
+    # Unchanged answers still carry the current motion model: the page
+    # must stop running on along the old one once the device stops or turns.
+    # A dropped fix leaves the last answer as it was.
+    unchanged = dropped is None and answer_fix(session)
+    lat, lon = session.last_fix
+    tlat, tlon = session.target
+    msg = dict(type='distance', location_id=session.target_id,
+               distance=session.last_distance,
+               bearing=bearing(lat, lon, tlat, tlon),
+               advice=sessions.advice(session), motion=sessions.motion(session))
+    if unchanged:
+        msg['unchanged'] = True
+    if dropped:
+        msg['dropped'] = dropped
+    return json.dumps(msg)
+
+def handle_track_message(session, msg):
+    if isinstance(msg, list):
+        msg = dict(zip(('latitude', 'longitude', 'timestamp', 'accuracy', 'speed'), msg), type='fix')
+    kind = msg.get('type')
+    if kind == 'pong':
+        return None
+    if kind == 'target':
+        id = int(msg['location_id'])
+        with sqlite3.connect('locations.db') as conn:
+            row = conn.execute('SELECT latitude, longitude FROM locations WHERE id=?', (id,)).fetchone()
+        if not row:
+            return json.dumps(dict(type='error', error="Location not found", location_id=id))
+        session.target_id, session.target = id, row
+    elif kind == 'fix':
+        outcome = sessions.check_fix(session, float(msg['latitude']), float(msg['longitude']),
+                                     msg.get('timestamp'), **fix_extras(msg))
+        if outcome != FIX_ACCEPTED and session.last_distance is not None:
+            # Repeat or overlapping stream: answer for the fix we already have.
+            return distance_message(session, dropped=outcome)
+    else:
+        return json.dumps(dict(type='error', error=f"unknown message type {kind!r}"))
+    if session.target and session.last_fix:
+        return distance_message(session)
+    return None
+
+def push_dataset_changes(registry):
+    global watched_version
+    with sqlite3.connect('locations.db') as conn:
+        version = current_version(conn)
+        if watched_version is None or version == watched_version:
+            watched_version = version
+            return
+        _, reset, upserts, deleted = changes_since(conn, watched_version)
+    watched_version = version
+    changed = {id: (lat, lon) for id, _, lat, lon in upserts}
+    deleted = set(deleted)
+    if reset:
+        results.clear()
+    for id in changed.keys() | deleted:
+        results.invalidate(id)
+    note = json.dumps(dict(type='dataset', version=version))
+    for session in registry.snapshot():
+        session.send(note)
+        if session.target_id is None:
+            continue
+        if session.target_id in changed:
+            session.target = changed[session.target_id]
+            session.last_distance = None
+            if session.last_fix and session.has_transport:
+                session.send(distance_message(session))
+        elif session.target_id in deleted or reset:
+            session.target = session.last_distance = None
+            session.send(json.dumps(dict(type='error', error="Location deleted",
+                                         location_id=session.target_id)))
+
+sessions.on_poll = push_dataset_changes
+
+if Sock is not None:
+    sock = Sock(app)
+
+    @sock.route('/ws/track')
+    def track_ws(ws):
+        session = sessions.open(ws.send, ws.close)
+        try:
+            with sqlite3.connect('locations.db') as conn:
+                watch_changes(conn)
+                version = current_version(conn)
+            session.send(json.dumps(dict(type='hello', session=session.id, version=version)))
+            while not session.closed:
+                text = ws.receive(timeout=sessions.heartbeat_interval)
+                if text is None:
+                    continue
+                sessions.touch(session)
+                try:
+                    reply = handle_track_message(session, json.loads(text))
+                except (KeyError, TypeError, ValueError, IndexError, AttributeError) as e:
+                    reply = json.dumps(dict(type='error', error=f"bad message: {e}"))
+                if reply:
+                    session.send(reply)
+        except ConnectionClosed:
+            pass
+        finally:
+            sessions.discard(session)
+
 if __name__ == '__main__':
-    init_db()
     os.system("termux-open-url http://127.0.0.1:5000")
     app.run(debug=True, host='127.0.0.1', port=5000)
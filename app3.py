@@ -1,10 +1,13 @@
 from flask import Flask, render_template_string, request, jsonify, redirect, url_for
-import math
 import sqlite3
 from flask_cors import CORS
+from geo import haversine
+from assets import AssetStore
 
 app = Flask(__name__)
 CORS(app)
+assets = AssetStore()
+assets.init_app(app)
 
 def init_db():
     with sqlite3.connect('locations.db') as conn:
@@ -17,20 +20,12 @@ def init_db():
                 longitude REAL NOT NULL
             )
         ''')
-        c.execute('SELECT COUNT(*) FROM locations')                                                         if c.fetchone()[0] == 0:
+        c.execute('SELECT COUNT(*) FROM locations')
+        if c.fetchone()[0] == 0:
             c.execute('INSERT INTO locations (name, latitude, longitude) VALUES (?, ?, ?)',
                       ('Default Location', 0, 0))
         conn.commit()
 
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371000
-    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = math.sin(dlat / 2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
-
 HTML_TEMPLATE = """
 <!DOCTYPE html>
 <html>
@@ -38,7 +33,7 @@ HTML_TEMPLATE = """
 <meta charset="utf-8">
 <title>REAL-TIME GPS - FUTURISTIC</title>
 <meta name="viewport" content="width=device-width, initial-scale=1">
-<link href="https://fonts.googleapis.com/css2?family=Orbitron:wght@500&display=swap" rel="stylesheet">
+{% if 'fonts.css' in assets %}<link href="{{ asset_url('fonts.css') }}" rel="stylesheet">{% endif %}
 <style>
     body {
         margin: 0;
@@ -0,0 +1,228 @@
+"""Static asset serving with content-hashed URLs.
+
+Every file under ``static/`` is loaded once at startup and published as
+``/assets/<name>.<hash>.<ext>``. Because the URL changes whenever the
+content does, responses can be cached forever (``immutable``); ETag,
+Last-Modified and Range requests are still honoured for clients that
+revalidate or resume.
+
+CSS and JavaScript bundles are minified and pre-compressed (gzip, and
+brotli when the ``brotli`` package is installed) once at startup; the
+encoding is picked per request from ``Accept-Encoding``.
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+
+from flask import Response, abort, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+log = logging.getLogger('assets')
+
+CACHE_FOREVER = 'public, max-age=31536000, immutable'
+
+FONT_RE = re.compile(r'^(?P<family>[A-Za-z]+)-(?P<weight>\d{3})\.woff2$')
+CSS_URL_RE = re.compile(r"""url\((['"]?)([^'")]+)\1\)""")
+COMPRESSIBLE = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+
+def minify_css(text):
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    text = re.sub(r':\s+', ':', text)
+    return text.replace(';}', '}').strip()
+
+
+def minify_js(text):
+    # Line-preserving on purpose: keeps automatic semicolon insertion intact.
+    out = []
+    in_template = False
+    for line in text.split('\n'):
+        if in_template:
+            out.append(line)
+        else:
+            line = line.strip()
+            if line and not line.startswith('//'):
+                out.append(line)
+        if line.count('`') % 2:
+            in_template = not in_template
+    return '\n'.join(out)
+
+
+def compact_html(text):
+    # Indentation and blank lines account for most of a rendered page with
+    # many locations; none of the templates contain <pre> or <textarea>.
+    return '\n'.join(line.strip() for line in text.split('\n') if line.strip())
+
+
+def accepted_encoding(encodings):
+    if not encodings:
+        return None
+    best = request.accept_encodings.best_match(list(encodings) + ['identity'])
+    return None if best in (None, 'identity') else best
+
+
+class Asset:
+    __slots__ = ('name', 'data', 'mimetype', 'digest', 'mtime', 'hashed_name', 'encoded')
+
+    def __init__(self, name, data, mimetype, mtime):
+        self.name = name
+        self.data = data
+        self.mimetype = mimetype
+        self.mtime = mtime
+        self.digest = hashlib.sha256(data).hexdigest()[:12]
+        stem, ext = os.path.splitext(name)
+        self.hashed_name = f'{stem}.{self.digest}{ext}'
+        self.encoded = {}
+        if mimetype.startswith(COMPRESSIBLE):
+            self._precompress()
+
+    def _precompress(self):
+        candidates = {'gzip': gzip.compress(self.data, 9, mtime=0)}
+        if brotli is not None:
+            candidates['br'] = brotli.compress(self.data, quality=11)
+        # br first so it wins ties in Accept-Encoding negotiation.
+        for encoding in ('br', 'gzip'):
+            body = candidates.get(encoding)
+            if body is not None and len(body) < len(self.data):
+                self.encoded[encoding] = body
+
+
+class AssetStore:
+    def __init__(self, root=None, prefix='/assets'):
+        self.root = root or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+        self.prefix = prefix
+        self.assets = {}
+        self.by_hashed_name = {}
+
+    def __contains__(self, name):
+        return name in self.assets
+
+    def add(self, name, data, mimetype=None, mtime=None):
+        if mimetype is None:
+            mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        old = self.assets.get(name)
+        if old is not None:
+            self.by_hashed_name.pop(old.hashed_name, None)
+        asset = Asset(name, data, mimetype, mtime)
+        self.assets[name] = asset
+        self.by_hashed_name[asset.hashed_name] = asset
+        return asset
+
+    def add_file(self, name, path=None):
+        path = path or os.path.join(self.root, name)
+        with open(path, 'rb') as f:
+            data = f.read()
+        return self.add(name, data, mtime=int(os.path.getmtime(path)))
+
+    def add_bundle(self, name, path=None):
+        path = path or os.path.join(self.root, name)
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+        if name.endswith('.css'):
+            text = minify_css(self._rewrite_css_urls(text))
+        else:
+            text = minify_js(text)
+        return self.add(name, text.encode(), mtime=int(os.path.getmtime(path)))
+
+    def _rewrite_css_urls(self, text):
+        def repl(m):
+            target = m.group(2)
+            if target in self.assets:
+                return f"url('{self.url(target)}')"
+            return m.group(0)
+        return CSS_URL_RE.sub(repl, text)
+
+    def scan(self):
+        if not os.path.isdir(self.root):
+            return
+        bundles = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in sorted(filenames):
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, self.root).replace(os.sep, '/')
+                if name.endswith(('.css', '.js')):
+                    bundles.append((name, path))
+                else:
+                    self.add_file(name, path)
+        self._add_font_faces()
+        # Bundles last, so url() references inside CSS resolve to hashed names.
+        for name, path in bundles:
+            self.add_bundle(name, path)
+
+    def _add_font_faces(self):
+        # fonts/<Family>-<weight>.woff2 -> one fonts.css with @font-face rules,
+        # so the page never has to reach fonts.googleapis.com.
+        rules = []
+        for name in sorted(self.assets):
+            if not name.startswith('fonts/'):
+                continue
+            m = FONT_RE.match(name[len('fonts/'):])
+            if not m:
+                continue
+            rules.append(
+                "@font-face{font-family:'%s';font-style:normal;font-weight:%s;"
+                "font-display:swap;src:local('%s'),url(%s) format('woff2')}"
+                % (m['family'], m['weight'], m['family'], self.url(name)))
+        if rules:
+            self.add('fonts.css', '\n'.join(rules).encode(), 'text/css')
+
+    def url(self, name):
+        return f'{self.prefix}/{self.assets[name].hashed_name}'
+
+    def response(self, asset, cache_control=CACHE_FOREVER):
+        encoding = accepted_encoding(asset.encoded)
+        body = asset.encoded[encoding] if encoding else asset.data
+        resp = Response(body, mimetype=asset.mimetype)
+        resp.headers['Cache-Control'] = cache_control
+        if asset.encoded:
+            resp.vary.add('Accept-Encoding')
+        if encoding:
+            resp.headers['Content-Encoding'] = encoding
+            resp.set_etag(f'{asset.digest}-{encoding}')
+        else:
+            resp.set_etag(asset.digest)
+        if asset.mtime is not None:
+            resp.last_modified = asset.mtime
+        return resp.make_conditional(request, accept_ranges=True,
+                                     complete_length=len(body))
+
+    def serve(self, filename):
+        asset = self.by_hashed_name.get(filename)
+        if asset is None:
+            abort(404)
+        return self.response(asset)
+
+    def serve_unversioned(self, name):
+        # Legacy fixed URLs must revalidate, since their content can change.
+        asset = self.assets.get(name)
+        if asset is None:
+            abort(404)
+        return self.response(asset, cache_control='no-cache')
+
+    def _log_request(self, resp):
+        if request.path.startswith(self.prefix + '/'):
+            sent = 0 if resp.status_code == 304 else resp.content_length or 0
+            log.info('%s %s -> %d (%d bytes)', request.method, request.path,
+                     resp.status_code, sent)
+        return resp
+
+    def init_app(self, app):
+        self.scan()
+        app.add_url_rule(self.prefix + '/<path:filename>', 'assets', self.serve)
+        app.jinja_env.globals['asset_url'] = self.url
+        app.jinja_env.globals['assets'] = self
+        app.after_request(self._log_request)
+        if not log.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter('[assets] %(message)s'))
+            log.addHandler(handler)
+            log.setLevel(logging.INFO)
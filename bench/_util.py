@@ -0,0 +1,60 @@
+"""Shared helpers for the benchmark scripts in this folder."""
+import contextlib
+import importlib.util
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def load_app(filename='app13-v4.py'):
+    # App scripts are not importable by name (e.g. "app13-v4.py").
+    name = os.path.splitext(filename)[0].replace('-', '_')
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@contextlib.contextmanager
+def temp_workdir():
+    # The apps keep locations.db in the working directory.
+    old = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            yield tmp
+        finally:
+            os.chdir(old)
+
+
+def seed_locations(n, db='locations.db'):
+    import random
+    import sqlite3
+    rnd = random.Random(42)
+    with sqlite3.connect(db) as conn:
+        conn.execute('DELETE FROM locations')
+        conn.executemany(
+            'INSERT INTO locations (name, latitude, longitude) VALUES (?, ?, ?)',
+            ((f'Lokasi {i}', rnd.uniform(-8, -6), rnd.uniform(106, 112)) for i in range(n)))
+        conn.commit()
+
+
+def is_loopback(host):
+    import ipaddress
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def fmt_bytes(n):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(n) < 1024 or unit == 'GB':
+            return f'{n:.1f} {unit}' if unit != 'B' else f'{n} B'
+        n /= 1024
@@ -0,0 +1,58 @@
+"""Throughput of /locations/batch against the per-row routes.
+
+    python bench/bench_batch.py [ops]
+
+Each per-row request opens its own connection and commits (one fsync)
+per edit; the batch applies everything in one transaction.
+"""
+import sys
+import time
+
+from _util import load_app, seed_locations, temp_workdir
+
+
+def run(label, n, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f'  {label:<28} {elapsed * 1000:9.1f} ms  {n / elapsed:10.0f} ops/s')
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    with temp_workdir():
+        mod = load_app()
+        mod.init_db()
+        seed_locations(n)
+        client = mod.app.test_client()
+        ids = [loc['id'] for loc in client.get('/locations').json['locations']]
+        print(f'{n} renames/moves')
+
+        def form():
+            for i in ids:
+                client.post(f'/edit_location/{i}', data=dict(name=f'F{i}', latitude=-6.1, longitude=106.1))
+
+        def api():
+            for i in ids:
+                client.put(f'/api/locations/{i}', json=dict(name=f'A{i}', latitude=-6.2, longitude=106.2))
+
+        def batch(atomic):
+            ops = [dict(op='update', id=i, name=f'B{i}', latitude=-6.3, longitude=106.3) for i in ids]
+            resp = client.post('/locations/batch', json=dict(ops=ops, atomic=atomic))
+            assert resp.json['applied'] == n, resp.json
+
+        run('POST /edit_location/<id>', n, form)
+        run('PUT /api/locations/<id>', n, api)
+        run('POST /locations/batch', n, lambda: batch(False))
+        run('POST /locations/batch atomic', n, lambda: batch(True))
+
+        print(f'{n} inserts')
+        run('POST /api/locations', n, lambda: [
+            client.post('/api/locations', json=dict(name=f'N{i}', latitude=-6.0, longitude=106.0))
+            for i in range(n)])
+        run('POST /locations/batch', n, lambda: client.post('/locations/batch', json=dict(ops=[
+            dict(op='insert', name=f'M{i}', latitude=-6.0, longitude=106.0) for i in range(n)])))
+
+
+if __name__ == '__main__':
+    main()
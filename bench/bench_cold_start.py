@@ -0,0 +1,93 @@
+"""Cold start to the first answered target lookup, with and without the
+mmap snapshot.
+
+    python bench/bench_cold_start.py [N]
+
+Each case runs in a fresh interpreter against N locations (default 1M):
+
+``select``    build a LocationStore from ``SELECT`` (the in-memory index a
+              worker would otherwise rebuild), then answer one distance
+``snapshot``  map locations.snap and answer one distance
+``app``       import app13-v4.py and answer POST /update_location through
+              the test client (the app reads targets from the snapshot)
+
+"wall" includes interpreter start-up and imports. When the page cache
+can be dropped (root on Linux) every case starts cold; the "shared" RSS
+column is file-backed memory (the mapping), which a second worker would
+share instead of duplicating.
+"""
+import os
+import subprocess
+import sys
+import time
+
+from _util import ROOT, fmt_bytes, load_app, seed_locations, temp_workdir
+from snapshot import write_snapshot
+
+CHILD = r'''
+import sqlite3, sys, time
+t0 = time.perf_counter()
+sys.path[:0] = [{bench!r}, {root!r}]
+mode, target = sys.argv[1], int(sys.argv[2])
+from geo import haversine
+
+if mode == 'select':
+    from store import LocationStore
+    store = LocationStore.load(sqlite3.connect('locations.db'))
+    d = haversine(-7.0, 110.0, *store.coords(target))
+elif mode == 'snapshot':
+    from snapshot import Snapshot
+    snap = Snapshot('locations.snap')
+    s = snap.slot(target)
+    d = haversine(-7.0, 110.0, snap.lats[s], snap.lons[s])
+else:
+    from _util import load_app
+    mod = load_app()
+    r = mod.app.test_client().post('/update_location', json=dict(latitude=-7.0, longitude=110.0, location_id=target))
+    d = r.get_json()['distance']
+elapsed = time.perf_counter() - t0
+status = dict(line.split(':', 1) for line in open('/proc/self/status') if line.startswith('Rss'))
+kb = lambda k: int(status.get(k, '0 kB').split()[0]) * 1024
+print(elapsed, kb('RssAnon'), kb('RssFile'), d)
+'''
+
+
+def drop_caches():
+    try:
+        os.sync()
+        with open('/proc/sys/vm/drop_caches', 'w') as f:
+            f.write('3\n')
+        return True
+    except OSError:
+        return False
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    code = CHILD.format(bench=os.path.dirname(os.path.abspath(__file__)), root=ROOT)
+    with temp_workdir():
+        mod = load_app()
+        mod.init_db()
+        seed_locations(n)
+        with mod.sqlite3.connect('locations.db') as conn:
+            start = time.perf_counter()
+            write_snapshot(conn, 'locations.snap')
+            write_s = time.perf_counter() - start
+            target = conn.execute('SELECT MAX(id) FROM locations').fetchone()[0]
+        print(f'{n:,} locations; snapshot {fmt_bytes(os.path.getsize("locations.snap"))} '
+              f'written in {write_s:.2f} s; db {fmt_bytes(os.path.getsize("locations.db"))}')
+        cold = drop_caches()
+        print(f'page cache: {"dropped before each run" if cold else "warm (cannot drop caches)"}')
+        print(f'{"case":<9} {"wall s":>7} {"in-proc s":>9} {"private":>10} {"shared":>10}')
+        for mode in ('select', 'snapshot', 'app'):
+            drop_caches()
+            start = time.perf_counter()
+            out = subprocess.run([sys.executable, '-c', code, mode, str(target)],
+                                 capture_output=True, text=True, check=True).stdout.split()
+            wall = time.perf_counter() - start
+            inproc, anon, shared = float(out[0]), int(out[1]), int(out[2])
+            print(f'{mode:<9} {wall:>7.2f} {inproc:>9.3f} {fmt_bytes(anon):>10} {fmt_bytes(shared):>10}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Bytes on the wire and CPU time per response size for compression.py.
+
+    python bench/bench_compression.py
+
+Bodies are real index() pages rendered with N locations, plus the tiny
+update_location reply that must be skipped.
+"""
+import time
+
+from _util import fmt_bytes, load_app, seed_locations, temp_workdir
+
+from compression import COMPRESSORS, compress_body
+
+SIZES = (1, 10, 100, 1000, 5000)
+LEVELS = (1, 6, 9)
+
+
+def cpu_ms(fn, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - start) * 1000 / repeat
+
+
+def main():
+    with temp_workdir():
+        mod = load_app()
+        mod.init_db()
+        client = mod.app.test_client()
+        print(f'{"locations":>9} {"identity":>10} {"enc":>4} {"lvl":>3} {"wire":>10} {"ratio":>6} {"cpu ms":>8}')
+        for n in SIZES:
+            seed_locations(n)
+            body = client.get('/', headers={'Accept-Encoding': 'identity'}).data
+            repeat = max(1, 2_000_000 // len(body))
+            for encoding in COMPRESSORS:
+                for level in LEVELS:
+                    wire = len(compress_body(body, encoding, level))
+                    ms = cpu_ms(lambda: compress_body(body, encoding, level), repeat)
+                    print(f'{n:>9} {fmt_bytes(len(body)):>10} {encoding:>4} {level:>3} '
+                          f'{fmt_bytes(wire):>10} {len(body) / wire:>5.1f}x {ms:>8.3f}')
+
+        seed_locations(1)
+        resp = client.post('/update_location', json={'latitude': -6.2, 'longitude': 106.8, 'location_id': 1},
+                           headers={'Accept-Encoding': 'gzip, br'})
+        print(f'update_location reply: {len(resp.data)} B, '
+              f'Content-Encoding={resp.headers.get("Content-Encoding", "none")} (skipped below threshold)')
+
+
+if __name__ == '__main__':
+    main()
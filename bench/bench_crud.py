@@ -0,0 +1,44 @@
+"""Bytes transferred and server time per edit: form POST + reload vs JSON API.
+
+    python bench/bench_crud.py [edits]
+
+"form" is the old flow: POST /edit_location answers with a redirect and
+the browser reloads the whole page. "api" is PUT /api/locations/<id>,
+whose reply carries only the edited row and the new version.
+"""
+import sys
+import time
+
+from _util import fmt_bytes, load_app, seed_locations, temp_workdir
+
+HEADERS = {'Accept-Encoding': 'gzip'}
+
+
+def main():
+    edits = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    with temp_workdir():
+        mod = load_app()
+        mod.init_db()
+        client = mod.app.test_client()
+        print(f'{"locations":>9} {"flow":>5} {"bytes/edit":>12} {"ms/edit":>9}')
+        for n in (1_000, 10_000):
+            seed_locations(n)
+            ids = [loc['id'] for loc in client.get('/locations').json['locations'][:edits]]
+            for flow in ('form', 'api'):
+                sent = 0
+                start = time.perf_counter()
+                for i, id in enumerate(ids):
+                    fields = dict(name=f'Edit {i}', latitude=-6.2, longitude=106.8)
+                    if flow == 'form':
+                        r = client.post(f'/edit_location/{id}', data=fields, headers=HEADERS,
+                                        follow_redirects=True)
+                        sent += sum(len(h.data) for h in r.history) + len(r.data)
+                    else:
+                        r = client.put(f'/api/locations/{id}', json=fields, headers=HEADERS)
+                        sent += len(r.data)
+                ms = (time.perf_counter() - start) * 1000 / len(ids)
+                print(f'{n:>9} {flow:>5} {fmt_bytes(sent / len(ids)):>12} {ms:>9.2f}')
+
+
+if __name__ == '__main__':
+    main()
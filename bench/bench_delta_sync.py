@@ -0,0 +1,52 @@
+"""Bytes needed to bring a client up to date: full refetch vs delta.
+
+    python bench/bench_delta_sync.py [locations] [edits]
+
+Seeds N locations, records the version a client would hold, applies a
+few edits/deletes/inserts and compares /locations with
+/locations/changes?since=<version>.
+"""
+import gzip
+import json
+import sys
+import time
+
+from _util import fmt_bytes, load_app, seed_locations, temp_workdir
+
+
+def timed_get(client, url):
+    start = time.perf_counter()
+    resp = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    return resp, (time.perf_counter() - start) * 1000
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    edits = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    with temp_workdir():
+        mod = load_app()
+        mod.init_db()
+        seed_locations(n)
+        client = mod.app.test_client()
+        since = client.get('/locations/changes?since=0').json['version']
+
+        with mod.sqlite3.connect('locations.db') as conn:
+            ids = [r[0] for r in conn.execute('SELECT id FROM locations LIMIT ?', (edits,))]
+            for i in ids[: edits // 2]:
+                conn.execute('UPDATE locations SET name = name || ? WHERE id = ?', (' (edit)', i))
+            for i in ids[edits // 2:]:
+                conn.execute('DELETE FROM locations WHERE id = ?', (i,))
+            conn.execute("INSERT INTO locations (name, latitude, longitude) VALUES ('Baru', -6.2, 106.8)")
+
+        full, full_ms = timed_get(client, '/locations')
+        delta, delta_ms = timed_get(client, f'/locations/changes?since={since}')
+        body = json.loads(gzip.decompress(delta.data)) if delta.headers.get('Content-Encoding') \
+            else delta.json
+        print(f'{n} locations, {edits} edits/deletes + 1 insert since version {since}')
+        print(f'  full  /locations:         {fmt_bytes(len(full.data)):>10} on the wire, {full_ms:7.1f} ms')
+        print(f'  delta /locations/changes: {fmt_bytes(len(delta.data)):>10} on the wire, {delta_ms:7.1f} ms '
+              f'({len(body["changes"])} upserts, {len(body["deleted"])} tombstones)')
+
+
+if __name__ == '__main__':
+    main()
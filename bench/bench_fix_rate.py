@@ -0,0 +1,161 @@
+"""Replay GPS traces with and without fix-rate advice.
+
+    python bench/bench_fix_rate.py [--duration 1800]
+
+"every fix" is the old page: ``watchPosition`` with ``maximumAge: 0``
+posts each 1 Hz fix to ``/update_location``. "advised" follows
+static/fixrate.js (mirrored here in Python): readings are posted only
+once the advised interval has passed and the phone has moved the advised
+distance, and intervals of ``POLL_FROM_S`` and more swap the watcher for
+one timed reading per interval.
+
+GPS wakeups count the readings the receiver had to produce: every fix
+while watching, one per timed reading. "coarse" counts how many of them
+were network positioning only, with high accuracy off.
+
+At every second of the trace the distance on screen is checked two ways.
+"lag" is how far the distance of the fix last posted is from that of
+the latest fix: what skipping fixes costs. The advice promises that this
+stays within max(10 % of the distance, 5 m); the worst lag is shown as a
+share of that, along with how often it was exceeded, and the script
+fails if it ever was. The server's answer cache rounds to the accuracy
+on top of this, advised or not (see resultcache.py). "error" is the
+worst difference of the distance shown from the true distance within
+100 m of the target, so it includes both. The traces are generated
+twice from the same seed, with and without receiver noise, so the truth
+is known.
+"""
+import argparse
+import math
+import sys
+
+from _util import load_app, temp_workdir
+from traces import M_PER_DEG, driving, stationary, walking
+
+# static/fixrate.js
+POLL_FROM_S = 15
+COARSE_FROM_M = 100
+SLACK_S = 0.5
+SPEED_SMOOTHING = 0.5
+
+
+def scenarios(duration):
+    """``(name, fixes, true positions, (target lat, lon))``; targets sit
+    at the end of the trace, so the phone closes in, except for the
+    distant one."""
+    out = []
+    for name, profile, place in (('walking, closing in', walking, 'end'),
+                                 ('driving, closing in', driving, 'end'),
+                                 ('driving, 40 km out', driving, 'far'),
+                                 ('parked 20 m away', stationary, 'near')):
+        # The noise draws come from the same generator either way, so the
+        # noiseless run retraces the same path.
+        fixes, truth = list(profile(duration)), list(profile(duration, noise=0.0))
+        lat, lon = truth[-1].lat, truth[-1].lon
+        if place == 'far':
+            lat += 40_000 / M_PER_DEG
+        elif place == 'near':
+            lat += 20 / M_PER_DEG
+        out.append((name, fixes, truth, (lat, lon)))
+    return out
+
+
+class Page:
+    def __init__(self, client, target_id, advised):
+        self.client, self.target_id, self.advised = client, target_id, advised
+        self.session = None
+        self.advice = dict(interval=1.0, min_distance=0.0)
+        self.passed = self.speed = None
+        self.next_read = 0.0
+        self.requests = self.wakeups = self.coarse = 0
+        self.shown = None
+
+    @property
+    def polling(self):
+        return self.advised and self.advice['interval'] >= POLL_FROM_S
+
+    def reading(self, fix):
+        """One fix from the receiver, if it was awake for it."""
+        if self.polling:
+            if fix.t < self.next_read:
+                return
+            wait = self.advice['interval'] - (fix.t - self.passed.t)
+            self.next_read = fix.t + (wait if wait > 0 else self.advice['interval'])
+        self.wakeups += 1
+        self.coarse += self.advised and self.advice['min_distance'] >= COARSE_FROM_M
+        if self.advised and self.passed is not None:
+            dt = fix.t - self.passed.t
+            if dt + SLACK_S < self.advice['interval']:
+                return
+            d = math.hypot(fix.lat - self.passed.lat,
+                           (fix.lon - self.passed.lon) * math.cos(math.radians(self.passed.lat))) * M_PER_DEG
+            if d < self.advice['min_distance']:
+                return
+            v = max(0.0, d - fix.accuracy) / dt
+            self.speed = v if self.speed is None or v > self.speed else self.speed + SPEED_SMOOTHING * (v - self.speed)
+        self.passed = fix
+        self.send(fix)
+
+    def send(self, fix):
+        headers = {} if self.session is None else {'X-Tracking-Session': self.session}
+        resp = self.client.post('/update_location', headers=headers, json=dict(
+            latitude=fix.lat, longitude=fix.lon, timestamp=int(fix.t * 1000),
+            accuracy=fix.accuracy, speed=self.speed, location_id=self.target_id))
+        self.requests += 1
+        self.session = resp.headers['X-Tracking-Session']
+        self.shown = resp.json['distance']
+        if self.advised:
+            was_polling = self.polling
+            self.advice = resp.json['advice']
+            if self.polling and not was_polling:
+                self.next_read = fix.t + self.advice['interval']
+
+
+def replay(mod, client, fixes, truth, target, advised):
+    with mod.sqlite3.connect('locations.db') as conn:
+        conn.execute('DELETE FROM locations')
+        id = conn.execute('INSERT INTO locations (name, latitude, longitude) VALUES (?, ?, ?)',
+                          ('Tujuan', *target)).lastrowid
+    page = Page(client, id, advised)
+    worst = over = error = 0.0
+    for fix, true in zip(fixes, truth):
+        page.reading(fix)
+        current = mod.haversine(fix.lat, fix.lon, *target)
+        posted = mod.haversine(page.passed.lat, page.passed.lon, *target)
+        lag = abs(posted - current) / max(0.1 * current, 5.0)
+        worst = max(worst, lag)
+        over += lag > 1
+        actual = mod.haversine(true.lat, true.lon, *target)
+        if actual < 100:
+            error = max(error, abs(page.shown - actual))
+    return page, worst, over / len(fixes), error
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    p.add_argument('--duration', type=int, default=1800, help='seconds of 1 Hz fixes per trace')
+    args = p.parse_args()
+    with temp_workdir():
+        mod = load_app()
+        mod.init_db()
+        client = mod.app.test_client()
+        print(f'{"trace":<22} {"policy":<9} {"requests":>8} {"wakeups":>8} {"coarse":>7} '
+              f'{"lag/allowed":>11} {"over":>6} {"error":>8}')
+        broken = []
+        for name, fixes, truth, target in scenarios(args.duration):
+            start = mod.haversine(truth[0].lat, truth[0].lon, *target)
+            start = f'  {start / 1000:.1f} km at start' if start >= 1000 else f'  {start:.0f} m at start'
+            for advised in (False, True):
+                page, worst, over, error = replay(mod, client, fixes, truth, target, advised)
+                if worst > 1:
+                    broken.append(name)
+                print(f'{start if advised else name:<22} '
+                      f'{"advised" if advised else "every fix":<9} {page.requests:>8} {page.wakeups:>8} '
+                      f'{page.coarse:>7} {worst:>11.2f} {over:>6.1%} {error:>6.1f} m')
+        mod.jobs.shutdown()
+    if broken:
+        sys.exit(f'lag over max(10 % of the distance, 5 m): {", ".join(broken)}')
+
+
+if __name__ == '__main__':
+    main()
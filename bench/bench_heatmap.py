@@ -0,0 +1,111 @@
+"""Heatmap pipeline: ingest cost, tile drawing, and what a new minute redraws.
+
+    python bench/bench_heatmap.py [--devices 200] [--duration 1800]
+
+Replays ``--devices`` synthetic devices (walking, driving and parked,
+around Jakarta) second by second into ``heatmap.HeatGrid``, flushing
+every ``FLUSH_INTERVAL`` simulated seconds as the server would. Reports
+the time per fix to bin it, per flush to roll the buffer up to every
+zoom and write it, and the rows and tiles each flush touches.
+
+Then, for zooms 10 to 17, every tile with data is drawn once ("draw")
+and served again from the cache ("hit"). Finally one more minute of
+fixes is added and flushed, and every tile is served again: only the
+tiles with new data are drawn, the rest come from the cache.
+"""
+import argparse
+import random
+import statistics
+import time
+
+from _util import fmt_bytes, temp_workdir
+from traces import driving, stationary, walking
+
+import heatmap
+
+ZOOMS = (10, 13, 15, 17)
+
+
+def devices(count, duration):
+    rnd = random.Random(3)
+    profiles = (walking, driving, stationary)
+    for i in range(count):
+        profile = profiles[i % len(profiles)]
+        yield list(profile(duration, lat=-6.2 + rnd.uniform(-0.05, 0.05),
+                           lon=106.8 + rnd.uniform(-0.05, 0.05), seed=i))
+
+
+def replay(grid, traces, start, stop):
+    add = 0.0
+    flushes, touched, fixes = [], [], 0
+    for t in range(start, stop):
+        begin = time.perf_counter()
+        for fixes_of in traces:
+            if 0 < t < len(fixes_of):
+                prev, fix = fixes_of[t - 1], fixes_of[t]
+                grid.add(prev.lat, prev.lon, fix.t - prev.t)
+                fixes += 1
+        add += time.perf_counter() - begin
+        if (t + 1) % heatmap.FLUSH_INTERVAL == 0:
+            cells = len(grid.pending)
+            begin = time.perf_counter()
+            tiles = grid.flush()
+            flushes.append(time.perf_counter() - begin)
+            touched.append((cells, tiles))
+    return fixes, add, flushes, touched
+
+
+def tiles_with_data(grid, z):
+    with grid.connect() as conn:
+        return [(x, y) for x, y in conn.execute('SELECT tx, ty FROM heat_tiles WHERE z = ?', (z,))]
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    p.add_argument('--devices', type=int, default=200)
+    p.add_argument('--duration', type=int, default=1800, help='seconds of 1 Hz fixes per device')
+    args = p.parse_args()
+    traces = list(devices(args.devices, args.duration + 60))
+    with temp_workdir():
+        grid = heatmap.HeatGrid('heat.db')
+        # No flushes on wall-clock time; replay() flushes on simulated time.
+        grid.last_flush = float('inf')
+        fixes, add, flushes, touched = replay(grid, traces, 0, args.duration)
+        print(f'{args.devices} devices x {args.duration} s: {fixes} fixes, '
+              f'bin {add / fixes * 1e6:.1f} us per fix, '
+              f'flush every {heatmap.FLUSH_INTERVAL:g} s: {statistics.fmean(flushes) * 1e3:.1f} ms mean, '
+              f'{max(flushes) * 1e3:.1f} ms max, '
+              f'{statistics.fmean(c for c, _ in touched):.0f} new cells, '
+              f'{statistics.fmean(t for _, t in touched):.0f} tiles changed per flush')
+        stats = grid.stats()
+        print(f'{stats["cells"]} cells at zoom {heatmap.MAX_ZOOM}, {stats["seconds"] / 3600:.0f} device-hours')
+
+        print(f'{"zoom":>4} {"tiles":>6} {"draw":>9} {"hit":>8} {"png":>9}')
+        draw = {}
+        for z in ZOOMS:
+            view = tiles_with_data(grid, z)
+            start = time.perf_counter()
+            sizes = [len(grid.tile(z, x, y)[0]) for x, y in view]
+            draw[z] = (time.perf_counter() - start) / len(view)
+            start = time.perf_counter()
+            for x, y in view:
+                grid.tile(z, x, y)
+            hit = (time.perf_counter() - start) / len(view)
+            print(f'{z:>4} {len(view):>6} {draw[z] * 1e3:>6.2f} ms {hit * 1e6:>5.0f} us '
+                  f'{fmt_bytes(round(statistics.fmean(sizes))):>9}')
+
+        replay(grid, traces, args.duration, args.duration + 60)
+        grid.flush()
+        for z in ZOOMS:
+            view = tiles_with_data(grid, z)
+            before = grid.drawn
+            start = time.perf_counter()
+            for x, y in view:
+                grid.tile(z, x, y)
+            elapsed = time.perf_counter() - start
+            print(f'zoom {z:>2} after one more minute: {grid.drawn - before} of {len(view)} tiles drawn again, '
+                  f'all served in {elapsed * 1e3:.0f} ms (drawing all: {len(view) * draw[z] * 1e3:.0f} ms)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Import time of the geodesic core vs the app modules.
+
+    python bench/bench_import.py [RUNS]
+
+Each module is imported in a fresh interpreter RUNS times (default 7),
+after one untimed run that writes the bytecode cache (this is forced
+even when PYTHONDONTWRITEBYTECODE is set, because a real install has
+.pyc files). The median in-process import time is reported, along with how
+many modules the import pulled in. ``python -c pass`` is the floor
+every process pays anyway. App scripts are loaded the way the benches
+load them (they are not importable by name), which also builds their
+Flask app, templates and asset bundles.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from _util import ROOT
+
+CHILD = r'''
+import sys, time
+sys.path[:0] = [{bench!r}, {root!r}]
+before = set(sys.modules)
+t0 = time.perf_counter()
+target = sys.argv[1]
+if target.endswith('.py'):
+    from _util import load_app
+    load_app(target)
+else:
+    __import__(target)
+elapsed = time.perf_counter() - t0
+new = set(sys.modules) - before
+print(elapsed, len(new), int('flask' in new))
+'''
+
+TARGETS = ['geo', 'importer', 'jobs', 'app.py', 'app2.py', 'app3.py', 'app4.py', 'app13-v4.py']
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+    code = CHILD.format(bench=os.path.dirname(os.path.abspath(__file__)), root=ROOT)
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    floor = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'], env=env, check=True)
+        floor.append(time.perf_counter() - start)
+    print(f'interpreter start-up (python -c pass): {statistics.median(floor) * 1000:.1f} ms wall')
+    print(f'{"module":<14} {"import ms":>10} {"wall ms":>8} {"modules":>8} {"flask":>6}')
+    for target in TARGETS:
+        imports, walls = [], []
+        for i in range(runs + 1):
+            start = time.perf_counter()
+            out = subprocess.run([sys.executable, '-c', code, target], cwd=ROOT, env=env,
+                                 capture_output=True, text=True, check=True).stdout.split()
+            if i:
+                walls.append(time.perf_counter() - start)
+                imports.append(float(out[0]))
+        print(f'{target:<14} {statistics.median(imports) * 1000:>10.1f} {statistics.median(walls) * 1000:>8.1f} '
+              f'{out[1]:>8} {"yes" if out[2] == "1" else "no":>6}')
+
+
+if __name__ == '__main__':
+    main()
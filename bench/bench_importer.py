@@ -0,0 +1,88 @@
+"""GPX importer: throughput and peak memory, waypoints vs a long track.
+
+    python bench/bench_importer.py [--points 600000] [--max-rss 64]
+
+Writes two GPX files of ``--points`` points each: one of ``<wpt>``s
+(all imported) and one long ``<trk>`` with a handful of waypoints (the
+track points are parsed and thrown away). Each is imported into a fresh
+database by ``importer.import_waypoints`` in a child process, with
+dedupe off so the grid does not hide what the parser keeps. Reports the
+time, the points per second, the child's peak RSS and how much of it
+came after the import started, and fails if the track file adds more
+than ``--max-rss`` MB: the parser must not keep what it has read.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+
+from _util import ROOT, fmt_bytes, load_app, temp_workdir
+
+CHILD = r'''
+import json, resource, sqlite3, sys, time
+sys.path.insert(0, {root!r})
+import importer
+conn = sqlite3.connect('locations.db', isolation_level=None)
+base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+with open(sys.argv[1], 'rb') as f:
+    stats = importer.import_waypoints(conn, f, min_distance=0)
+elapsed = time.perf_counter() - start
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps(dict(stats, seconds=elapsed, peak=peak * 1024, rss=(peak - base) * 1024)))
+'''
+
+
+def write_gpx(path, points, track):
+    rnd = random.Random(7)
+    lat, lon = -6.2, 106.8
+    with open(path, 'w') as f:
+        f.write('<?xml version="1.0"?>\n<gpx version="1.1" xmlns="http://www.topografix.com/GPX/1/1">\n')
+        waypoints = 10 if track else points
+        for i in range(waypoints):
+            f.write(f'<wpt lat="{lat + rnd.uniform(-1, 1):.6f}" lon="{lon + rnd.uniform(-1, 1):.6f}">'
+                    f'<ele>12.0</ele><name>Titik {i}</name></wpt>\n')
+        if track:
+            f.write('<trk><name>Perjalanan</name><trkseg>\n')
+            for i in range(points):
+                lat += rnd.uniform(-1e-4, 1e-4)
+                lon += rnd.uniform(-1e-4, 1e-4)
+                f.write(f'<trkpt lat="{lat:.6f}" lon="{lon:.6f}"><ele>12.0</ele>'
+                        f'<time>2026-01-01T00:00:00Z</time></trkpt>\n')
+            f.write('</trkseg></trk>\n')
+        f.write('</gpx>\n')
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    p.add_argument('--points', type=int, default=600_000)
+    p.add_argument('--max-rss', type=float, default=64, help='MB the track file may add to the importer')
+    args = p.parse_args()
+    code = CHILD.format(root=ROOT)
+    over = False
+    with temp_workdir():
+        mod = load_app()
+        print(f'{"file":<10} {"size":>9} {"imported":>9} {"seconds":>8} {"points/s":>9} '
+              f'{"peak RSS":>9} {"growth":>9}')
+        for kind, track in (('waypoints', False), ('track', True)):
+            path = f'{kind}.gpx'
+            write_gpx(path, args.points, track)
+            if os.path.exists('locations.db'):
+                os.remove('locations.db')
+            mod.init_db()
+            out = json.loads(subprocess.run([sys.executable, '-c', code, path], check=True,
+                                            capture_output=True, text=True).stdout)
+            print(f'{kind:<10} {fmt_bytes(os.path.getsize(path)):>9} {out["imported"]:>9} '
+                  f'{out["seconds"]:>8.1f} {args.points / out["seconds"]:>9.0f} '
+                  f'{fmt_bytes(out["peak"]):>9} {fmt_bytes(out["rss"]):>9}')
+            if track and out['rss'] > args.max_rss * 2 ** 20:
+                over = True
+        mod.jobs.shutdown()
+    if over:
+        sys.exit(f'the track file took more than {args.max_rss:g} MB: the parser is keeping elements')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""Tracking latency while a heavy job runs: process pool vs in-request.
+
+    python bench/bench_jobs.py [--locations 100000] [--points 20000]
+                               [--devices 20] [--rate 2] [--duration 15]
+
+Starts the app in a child process and drives ``--devices`` phones
+against ``/update_location`` (loadgen.py's Device threads) through three
+phases of ``--duration`` seconds:
+
+``idle``     tracking only
+``pool``     a client keeps ``POST /jobs`` busy with nearest-target jobs
+             over ``--points`` track points, back to back
+``inline``   the same job run inside a request thread of the server
+             (``/bench/inline``, registered by this script only), the way
+             it would run without jobs.py
+
+and reports the fix latency for each phase, plus job throughput.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+from _util import ROOT, load_app, seed_locations, temp_workdir
+from loadgen import Device, HttpClient, Recorder, free_port, percentile, wait_for
+
+
+def serve(port, locations):
+    from flask import jsonify, request
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    import jobs
+    WSGIRequestHandler.protocol_version = 'HTTP/1.1'
+    with temp_workdir():
+        mod = load_app()
+        mod.init_db()
+        seed_locations(locations)
+
+        @mod.app.route('/bench/inline', methods=['POST'])
+        def inline_job():
+            # jobs.py's worker code, run in this request thread
+            points = request.get_json()['points']
+            name, n, _ = jobs.build_locations(os.path.abspath('locations.db'))
+            lats, lons = zip(*points)
+            shm_points = jobs._share(jobs.array('d', lats), jobs.array('d', lons))
+            out = jobs.SharedMemory(create=True, size=16 * len(points))
+            try:
+                jobs._nearest_chunk(name, n, shm_points.name, len(points), 0, len(points), out.name)
+            finally:
+                for shm in (shm_points, out):
+                    shm.close()
+                    shm.unlink()
+                jobs._attached.pop(name).close()
+                jobs.unlink_block(name)
+            return jsonify(done=len(points))
+
+        make_server('127.0.0.1', port, mod.app, threaded=True).serve_forever()
+
+
+def run_jobs(host, port, points, mode, stop_at, done):
+    http = HttpClient(host, port)
+    while time.monotonic() < stop_at:
+        if mode == 'inline':
+            status, _, _ = http.request('POST', '/bench/inline', dict(points=points))
+        else:
+            status, _, body = http.request('POST', '/jobs', dict(kind='nearest', points=points))
+            if status != 202:
+                raise SystemExit(f'POST /jobs answered {status}: {body[:200]}')
+            id = json.loads(body)['id']
+            while True:
+                time.sleep(0.2)
+                status, _, body = http.request('GET', f'/jobs/{id}')
+                if json.loads(body)['status'] != 'running':
+                    break
+            http.request('DELETE', f'/jobs/{id}')
+        done.append(time.monotonic())
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    p.add_argument('--locations', type=int, default=100_000)
+    p.add_argument('--points', type=int, default=20_000, help='track points per job')
+    p.add_argument('--devices', type=int, default=20)
+    p.add_argument('--rate', type=float, default=2.0)
+    p.add_argument('--duration', type=float, default=15.0)
+    p.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = p.parse_args()
+    if args.serve:
+        return serve(args.serve, args.locations)
+
+    host, port = '127.0.0.1', free_port()
+    child = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', str(port),
+                              '--locations', str(args.locations)], cwd=ROOT, stderr=subprocess.DEVNULL)
+    device_args = argparse.Namespace(trace=None, profile='walking', rate=args.rate, targets='fixed',
+                                     switch_every=30, crud=0.0, ws=0.0)
+    rnd = random.Random(7)
+    points = [[rnd.uniform(-8, -6), rnd.uniform(106, 112)] for _ in range(args.points)]
+    try:
+        wait_for(host, port)
+        _, _, body = HttpClient(host, port).request('GET', '/locations')
+        ids = [loc['id'] for loc in json.loads(body)['locations']]
+        print(f'{args.locations:,} locations, {args.points:,}-point nearest jobs, '
+              f'{args.devices} devices x {args.rate:g} Hz, {os.cpu_count()} CPU(s)')
+        # warm-up: first fixes open sessions and map the snapshot
+        warm = HttpClient(host, port)
+        for id in ids[:50]:
+            warm.request('POST', '/update_location', dict(latitude=-7.0, longitude=110.0, location_id=id))
+        print(f'{"phase":<8} {"fixes":>6} {"errors":>6} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} '
+              f'{"max ms":>8} {"jobs":>5} {"points/s":>9}')
+        for phase in ('idle', 'pool', 'inline'):
+            rec = Recorder()
+            start = time.monotonic() + 0.5
+            stop_at = start + args.duration
+            done = []
+            worker = None
+            if phase != 'idle':
+                worker = threading.Thread(target=run_jobs, args=(host, port, points, phase, stop_at, done),
+                                          daemon=True)
+                worker.start()
+            devices = [Device(n, device_args, host, port, ids, ids[0], rec, start, stop_at)
+                       for n in range(args.devices)]
+            for d in devices:
+                d.start()
+            for d in devices:
+                d.join()
+            if worker is not None:
+                worker.join()   # let the last job finish before the next phase
+            values = sorted(rec.latencies['update_location'])
+            elapsed = (done[-1] if done else stop_at) - start
+            rate = len(done) * args.points / elapsed if done else 0.0
+            print(f'{phase:<8} {len(values):>6} {rec.errors["update_location"]:>6} '
+                  + ' '.join(f'{percentile(values, q) * 1000:>8.1f}' for q in (50, 95, 99))
+                  + f' {values[-1] * 1000:>8.1f} {len(done):>5} {rate:>9.0f}')
+    finally:
+        child.terminate()
+        child.wait()
+
+
+if __name__ == '__main__':
+    main()
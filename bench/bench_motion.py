@@ -0,0 +1,113 @@
+"""Distance on screen between sparse fixes: hold vs run on the motion model.
+
+    python bench/bench_motion.py [--duration 1800]
+
+Replays walking and driving traces towards a target at the end of the
+trace, posting only every ``N``-th second's fix to ``/update_location``.
+Every second the page shows either the last answer ("hold", the old
+page) or the answer run on along the returned motion model ("run on",
+static/motion.js ``project``, mirrored here). Both are compared with
+the distance from the true position; the traces are generated again
+without receiver noise to get it. "jump" is how far the number on
+screen leaps when a new answer arrives (95th percentile).
+
+Also reports what ``tracking.Motion`` costs: time per ``add`` and memory
+per session with a full ring buffer.
+"""
+import argparse
+import math
+import statistics
+import time
+import tracemalloc
+
+from _util import load_app, temp_workdir
+from traces import driving, walking
+
+FIX_EVERY = (1, 5, 10, 20)
+
+
+def project(distance, bearing, model, seconds):
+    # static/motion.js project()
+    s = min(seconds, model['horizon']) * model['speed']
+    n = distance * math.cos(math.radians(bearing)) - s * math.cos(math.radians(model['heading']))
+    e = distance * math.sin(math.radians(bearing)) - s * math.sin(math.radians(model['heading']))
+    return math.hypot(n, e)
+
+
+def replay(mod, client, fixes, truth, target_id, target, every):
+    held, ran, jumps = [], [], {'hold': [], 'run on': []}
+    session = answer = None
+    for i, (fix, true) in enumerate(zip(fixes, truth)):
+        fresh = i % every == 0
+        if fresh:
+            headers = {} if session is None else {'X-Tracking-Session': session}
+            resp = client.post('/update_location', headers=headers, json=dict(
+                latitude=fix.lat, longitude=fix.lon, timestamp=int(fix.t * 1000),
+                accuracy=fix.accuracy, location_id=target_id))
+            session = resp.headers['X-Tracking-Session']
+            answer = (fix.t, resp.json['distance'], mod.bearing(fix.lat, fix.lon, *target), resp.json['motion'])
+        t0, distance, bearing, model = answer
+        actual = mod.haversine(true.lat, true.lon, *target)
+        held.append(abs(distance - actual))
+        shown = distance if model['horizon'] == 0 else project(distance, bearing, model, fix.t - t0)
+        if fresh and i:
+            jumps['hold'].append(abs(distance - last_held))
+            jumps['run on'].append(abs(shown - last_ran))
+        last_held, last_ran = distance, shown
+        ran.append(abs(shown - actual))
+    return held, ran, jumps
+
+
+def p95(values):
+    return sorted(values)[int(0.95 * (len(values) - 1))]
+
+
+def cost():
+    import tracking
+    motion = tracking.Motion()
+    n = 200_000
+    start = time.perf_counter()
+    for i in range(n):
+        motion.add(i, -6.2 + i * 1e-6, 106.8, 5.0)
+    per_add = (time.perf_counter() - start) / n
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    sessions = []
+    for _ in range(10_000):
+        session = tracking.TrackingSession(0)
+        for i in range(tracking.MOTION_FIXES):
+            session.motion.add(float(i), -6.2 + i * 1e-5, 106.8 + i * 1e-5)
+        sessions.append(session)
+    size = sum(s.size_diff for s in tracemalloc.take_snapshot().compare_to(before, 'filename'))
+    tracemalloc.stop()
+    print(f'Motion.add: {per_add * 1e6:.1f} us per fix; '
+          f'{size / len(sessions):.0f} B per whole session with {tracking.MOTION_FIXES} fixes buffered')
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    p.add_argument('--duration', type=int, default=1800, help='seconds of 1 Hz fixes per trace')
+    args = p.parse_args()
+    with temp_workdir():
+        mod = load_app()
+        mod.init_db()
+        client = mod.app.test_client()
+        print(f'{"trace":<8} {"fix every":>9} {"policy":>7} {"error mean":>11} {"error p95":>10} {"jump p95":>9}')
+        for name, profile in (('walking', walking), ('driving', driving)):
+            fixes, truth = list(profile(args.duration)), list(profile(args.duration, noise=0.0))
+            target = (truth[-1].lat, truth[-1].lon)
+            with mod.sqlite3.connect('locations.db') as conn:
+                conn.execute('DELETE FROM locations')
+                target_id = conn.execute('INSERT INTO locations (name, latitude, longitude) VALUES (?, ?, ?)',
+                                         ('Tujuan', *target)).lastrowid
+            for every in FIX_EVERY:
+                held, ran, jumps = replay(mod, client, fixes, truth, target_id, target, every)
+                for policy, errors in (('hold', held), ('run on', ran)):
+                    print(f'{name:<8} {every:>7} s {policy:>7} {statistics.fmean(errors):>9.1f} m '
+                          f'{p95(errors):>8.1f} m {p95(jumps[policy]):>7.1f} m')
+        mod.jobs.shutdown()
+    cost()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Replay a GPS trace and count server requests per fix.
+
+    python bench/bench_offline_replay.py [fixes]
+
+"online" is the old page: every fix POSTs /update_location and then
+GETs /get_location_coords. "offline" follows static/offline.js with no
+connection (online the page still posts each fix, but no longer needs
+/get_location_coords): one /locations/changes sync on load, a delta
+re-sync every five minutes, and distance/bearing computed on the client
+(mirrored here in Python).
+The trace is a 1 Hz walk; one target is edited halfway through, so one
+re-sync has to carry data.
+"""
+import sys
+from collections import Counter
+
+from _util import load_app, seed_locations, temp_workdir
+from traces import walking
+
+SYNC_INTERVAL_S = 5 * 60
+
+
+def main():
+    fixes = int(sys.argv[1]) if len(sys.argv) > 1 else 3600
+    with temp_workdir():
+        mod = load_app()
+        mod.init_db()
+        seed_locations(100)
+        hits = Counter()
+        mod.app.before_request(lambda: hits.update([mod.request.path]))
+        client = mod.app.test_client()
+        target = 1
+
+        def edit_midway(t):
+            if t == fixes // 2 + 7:
+                with mod.sqlite3.connect('locations.db') as conn:
+                    conn.execute('UPDATE locations SET latitude = latitude + 0.001 WHERE id = ?', (target,))
+
+        for mode in ('online', 'offline'):
+            seed_locations(100)
+            target = client.get('/locations').json['locations'][0]['id']
+            hits.clear()
+            synced = 0
+            local, version, last_sync, max_err = {}, 0, None, 0.0
+            for t, lat, lon, _ in walking(fixes):
+                edit_midway(t)
+                if mode == 'online':
+                    d = client.post('/update_location', json=dict(latitude=lat, longitude=lon, location_id=target)).json
+                    client.get(f'/get_location_coords/{target}')
+                    continue
+                if last_sync is None or t - last_sync >= SYNC_INTERVAL_S:
+                    data = client.get(f'/locations/changes?since={version}').json
+                    if data['version'] != version:
+                        local.update((row['id'], row) for row in data['changes'])
+                        version = data['version']
+                        synced += 1
+                    last_sync = t
+                dest = local[target]
+                d = mod.haversine(lat, lon, dest['latitude'], dest['longitude'])
+                ref = mod.haversine(lat, lon, *mod.sqlite3.connect('locations.db').execute(
+                    'SELECT latitude, longitude FROM locations WHERE id = ?', (target,)).fetchone())
+                max_err = max(max_err, abs(d - ref))
+            total = sum(hits.values())
+            tracking = total - hits['/locations/changes']
+            print(f'{mode:>7}: {fixes} fixes -> {total} requests, {tracking} of them per-fix '
+                  f'({tracking / fixes:.3f} per fix) {dict(hits)}')
+            if mode == 'offline':
+                print(f'         {synced} syncs carried data; worst distance lag vs server '
+                      f'{max_err:.1f} m (edit propagates within {SYNC_INTERVAL_S} s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""Measure the index page and its bundles with 100 (or N) locations.
+
+    python bench/bench_page_size.py [N]
+
+"before" approximates the page when CSS and JS were inlined in
+HTML_TEMPLATE and rendered verbatim: the uncompacted template plus both
+unminified sources.
+"""
+import os
+import sys
+
+import jinja2
+
+from _util import ROOT, fmt_bytes, load_app, seed_locations, temp_workdir
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    with temp_workdir():
+        for filename, bundle in (('app4.py', 'app4'), ('app13-v4.py', 'app13')):
+            mod = load_app(filename)
+            mod.init_db()
+            seed_locations(n)
+            client = mod.app.test_client()
+            html = client.get('/').data
+            env = jinja2.Environment()
+            env.globals.update(mod.app.jinja_env.globals)
+            verbatim = env.from_string(mod.HTML_TEMPLATE).render(
+                locations=mod.sqlite3.connect('locations.db').execute(
+                    'SELECT id, name, latitude, longitude FROM locations').fetchall())
+            raw = sum(os.path.getsize(os.path.join(ROOT, 'static', f'{bundle}.{ext}'))
+                      for ext in ('css', 'js'))
+            before = len(verbatim.encode()) + raw
+            print(f'{filename} with {n} locations')
+            print(f'  before (inline, verbatim): {fmt_bytes(before)}')
+            print(f'  html document now:         {fmt_bytes(len(html))} '
+                  f'({100 * (1 - len(html) / before):.0f}% smaller)')
+            for ext in ('css', 'js'):
+                asset = mod.assets.assets[f'{bundle}.{ext}']
+                sizes = ', '.join(f'{enc} {fmt_bytes(len(body))}' for enc, body in asset.encoded.items())
+                print(f'  {bundle}.{ext}: minified {fmt_bytes(len(asset.data))}; {sizes}')
+
+
+if __name__ == '__main__':
+    main()
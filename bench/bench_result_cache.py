@@ -0,0 +1,62 @@
+"""Result-cache hit rate and cost per fix for still and moving phones.
+
+    python bench/bench_result_cache.py [--duration 1800]
+
+Posts every 1 Hz fix of a trace to ``/update_location``, the way a page
+that ignores the fix-rate advice does, against app4.py (target read from
+the database on every miss) and app13-v4.py (target kept in the session),
+first with the result cache and then with it disabled (``size=0``).
+Reports the hit rate, how many answers said ``unchanged`` (the page skips
+the redraw), the worst difference from the exact distance, and the server
+time per fix.
+"""
+import argparse
+import time
+
+from _util import load_app, temp_workdir
+from traces import stationary, walking
+
+
+def replay(mod, fixes, target_id, target):
+    client = mod.app.test_client()
+    session, unchanged, worst = None, 0, 0.0
+    start = time.perf_counter()
+    for fix in fixes:
+        headers = {} if session is None else {'X-Tracking-Session': session}
+        resp = client.post('/update_location', headers=headers, json=dict(
+            latitude=fix.lat, longitude=fix.lon, timestamp=int(fix.t * 1000),
+            accuracy=fix.accuracy, location_id=target_id))
+        session = resp.headers['X-Tracking-Session']
+        unchanged += bool(resp.json.get('unchanged'))
+        worst = max(worst, abs(resp.json['distance'] - mod.haversine(fix.lat, fix.lon, *target)))
+    return (time.perf_counter() - start) / len(fixes), unchanged / len(fixes), worst
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    p.add_argument('--duration', type=int, default=1800, help='seconds of 1 Hz fixes per trace')
+    args = p.parse_args()
+    traces = [('stationary', list(stationary(args.duration))), ('walking', list(walking(args.duration)))]
+    with temp_workdir():
+        print(f'{"app":<12} {"trace":<11} {"cache":<6} {"hit rate":>8} {"unchanged":>9} {"worst err":>9} {"us/fix":>7}')
+        for filename in ('app4.py', 'app13-v4.py'):
+            mod = load_app(filename)
+            mod.init_db()
+            for name, fixes in traces:
+                target = (fixes[0].lat + 0.002, fixes[0].lon)
+                with mod.sqlite3.connect('locations.db') as conn:
+                    conn.execute('DELETE FROM locations')
+                    target_id = conn.execute('INSERT INTO locations (name, latitude, longitude) VALUES (?, ?, ?)',
+                                             ('Tujuan', *target)).lastrowid
+                for size in (50000, 0):
+                    mod.results = mod.ResultCache(size=size)
+                    per_fix, unchanged, worst = replay(mod, fixes, target_id, target)
+                    hit_rate = mod.results.stats()['hit_rate']
+                    print(f'{filename:<12} {name:<11} {"on" if size else "off":<6} {hit_rate:>8.1%} '
+                          f'{unchanged:>9.1%} {worst:>7.1f} m {per_fix * 1e6:>7.0f}')
+            if hasattr(mod, 'jobs'):
+                mod.jobs.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Memory per location: fetchall() tuples vs the array-backed LocationStore.
+
+    python bench/bench_store.py [N]
+
+Loads N locations (default 1M) from an in-memory SQLite table three ways
+and reports traced Python heap per location, load time and the cost of
+a full distance scan. Names are all distinct ("Lokasi 123"), the worst
+case for interning; "dup names" repeats 1,000 names.
+"""
+import gc
+import math
+import random
+import sqlite3
+import sys
+import time
+import tracemalloc
+
+from _util import fmt_bytes
+from store import LocationStore, numpy
+
+
+def make_db(n, distinct_names=True):
+    rnd = random.Random(42)
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE locations (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, '
+                 'latitude REAL NOT NULL, longitude REAL NOT NULL)')
+    conn.executemany('INSERT INTO locations (name, latitude, longitude) VALUES (?, ?, ?)',
+                     ((f'Lokasi {i if distinct_names else i % 1000}', rnd.uniform(-8, -6),
+                       rnd.uniform(106, 112)) for i in range(n)))
+    return conn
+
+
+def measure(build):
+    # timed and traced separately: tracemalloc slows allocation-heavy code
+    gc.collect()
+    start = time.perf_counter()
+    obj = build()
+    seconds = time.perf_counter() - start
+    del obj
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, size, seconds
+
+
+def scan(lats, lons, lat=-7.0, lon=109.0):
+    # equirectangular nearest search, the inner loop of a "closest target" query
+    k = math.cos(math.radians(lat))
+    best = min(range(len(lats)), key=lambda i: (lats[i] - lat) ** 2 + ((lons[i] - lon) * k) ** 2)
+    return best
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    print(f'{n:,} locations')
+    print(f'{"layout":<22} {"memory":>10} {"B/location":>11} {"load s":>7} {"scan s":>7}')
+    for distinct in (True, False):
+        conn = make_db(n, distinct)
+        label = '' if distinct else ', dup names'
+        layouts = (
+            ('fetchall() tuples', lambda: conn.execute(
+                'SELECT id, name, latitude, longitude FROM locations').fetchall()),
+            ('store float64', lambda: LocationStore.load(conn)),
+            ('store float32', lambda: LocationStore.load(conn, 'float32')),
+        )
+        for name, build in layouts:
+            obj, size, seconds = measure(build)
+            if isinstance(obj, list):
+                lats, lons = [r[2] for r in obj], [r[3] for r in obj]
+            else:
+                lats, lons = obj.lats, obj.lons
+            start = time.perf_counter()
+            scan(lats, lons)
+            scan_s = time.perf_counter() - start
+            print(f'{name + label:<22} {fmt_bytes(size):>10} {size / n:>11.1f} {seconds:>7.2f} {scan_s:>7.2f}')
+            del obj, lats, lons
+        conn.close()
+    if numpy is not None:
+        store = LocationStore.load(make_db(n))
+        _, lats, lons = store.numpy()
+        start = time.perf_counter()
+        k = math.cos(math.radians(-7.0))
+        int(numpy.argmin((lats + 7.0) ** 2 + ((lons - 109.0) * k) ** 2))
+        print(f'numpy scan over zero-copy views: {time.perf_counter() - start:.3f} s')
+    else:
+        print('numpy not installed: skipping the zero-copy scan')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""Map tile throughput: from the memory cache, from the MBTiles file, revalidated.
+
+    python bench/bench_tiles.py [--tiles 4096] [--requests 20000] [--threads 4]
+
+Writes a synthetic MBTiles file of ``--tiles`` PNG tiles at zoom 15
+(noisy 256x256 images of about 20 KB, like real map tiles) and serves it
+through ``tiles.TileServer`` in a bare Flask app:
+
+* cache  - every tile already in the memory cache
+* disk   - cache disabled, every tile read through the connection pool
+* no pool - a new read-only SQLite connection per tile, as without the pool
+* 304    - the browser revalidating with ``If-None-Match``
+
+Tiles are requested in random order across the whole set, by
+``--threads`` threads at once. "lookup" is the tile lookup alone (cache
+or SQLite, no HTTP), on one thread.
+"""
+import argparse
+import contextlib
+import os
+import random
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+
+from _util import fmt_bytes, temp_workdir
+from flask import Flask
+
+import tiles
+
+ZOOM = 15
+VARIANTS = 32
+
+
+def png(rnd):
+    # Greyscale 256x256: smooth bands plus noise, so zlib lands near real tiles.
+    rows = []
+    for y in range(256):
+        base = (y // 16) * 9
+        rows.append(b'\x00' + bytes((base + (x // 32) * 5 + (rnd.random() < 0.15) * rnd.randrange(64)) & 0xFF
+                                    for x in range(256)))
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', 256, 256, 8, 0, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(b''.join(rows), 6)) + chunk(b'IEND', b''))
+
+
+class Unpooled(tiles.ConnectionPool):
+    @contextlib.contextmanager
+    def connection(self):
+        conn = self._open()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+
+def build(path, count):
+    rnd = random.Random(42)
+    images = [png(rnd) for _ in range(VARIANTS)]
+    side = int(count ** 0.5)
+    x0, y0 = 26100, 17000     # around Jakarta at zoom 15
+    with sqlite3.connect(path) as conn:
+        conn.execute('CREATE TABLE metadata (name TEXT, value TEXT)')
+        conn.execute('CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)')
+        conn.execute('CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row)')
+        conn.executemany('INSERT INTO metadata VALUES (?, ?)',
+                         [('name', 'bench'), ('format', 'png'), ('minzoom', str(ZOOM)), ('maxzoom', str(ZOOM))])
+        conn.executemany('INSERT INTO tiles VALUES (?, ?, ?, ?)',
+                         ((ZOOM, x0 + i % side, (1 << ZOOM) - 1 - (y0 + i // side), images[i % VARIANTS])
+                          for i in range(side * side)))
+    coords = [(x0 + i % side, y0 + i // side) for i in range(side * side)]
+    return coords, sum(len(images[i % VARIANTS]) for i in range(len(coords)))
+
+
+def run(client_for, urls, threads, revalidate=False):
+    # With ``revalidate``, ``urls`` are (url, etag) pairs.
+    per_thread = [urls[i::threads] for i in range(threads)]
+    statuses = []
+
+    def work(part):
+        client = client_for()
+        for url in part:
+            if revalidate:
+                url, etag = url
+                statuses.append(client.get(url, headers={'If-None-Match': etag}).status_code)
+            else:
+                statuses.append(client.get(url).status_code)
+
+    workers = [threading.Thread(target=work, args=(part,)) for part in per_thread]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return len(urls) / (time.perf_counter() - start), set(statuses)
+
+
+def lookups(get, picks):
+    start = time.perf_counter()
+    for x, y in picks:
+        get(ZOOM, x, y)
+    return len(picks) / (time.perf_counter() - start)
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    p.add_argument('--tiles', type=int, default=4096, help='tiles in the file (rounded down to a square)')
+    p.add_argument('--requests', type=int, default=20000, help='tile requests per case')
+    p.add_argument('--threads', type=int, default=4, help='concurrent request threads')
+    args = p.parse_args()
+
+    with temp_workdir() as tmp:
+        os.mkdir('tiles')
+        coords, total = build('tiles/bench.mbtiles', args.tiles)
+        print(f'{len(coords)} tiles, {fmt_bytes(total)} ({fmt_bytes(total // len(coords))} per tile), '
+              f'{args.requests} requests on {args.threads} threads')
+
+        rnd = random.Random(1)
+        picks = [rnd.choice(coords) for _ in range(args.requests)]
+
+        def server(cache_bytes):
+            app = Flask(__name__)
+            app.config['TILES_DIR'] = os.path.join(tmp, 'tiles')
+            ts = tiles.TileServer(cache_bytes=cache_bytes)
+            ts.init_app(app)
+            version = ts.tilesets['bench'].version
+            urls = [f'/tiles/bench/{ZOOM}/{x}/{y}.png?v={version}' for x, y in picks]
+            return app, ts, urls, version
+
+        app, ts, urls, version = server(total * 2)
+        for x, y in coords:
+            app.test_client().get(f'/tiles/bench/{ZOOM}/{x}/{y}.png?v={version}')
+        print(f'{"case":<8} {"HTTP":>13} {"lookup":>15}  status')
+        rate, codes = run(app.test_client, urls, args.threads)
+        lookup = lookups(lambda z, x, y: ts.cache.get(('bench', version, z, x, y)), picks)
+        print(f'{"cache":<8} {rate:>7.0f} tile/s {lookup:>9.0f} tile/s  {codes}')
+
+        app, ts, urls, _ = server(0)
+        tileset = ts.tilesets['bench']
+        rate, codes = run(app.test_client, urls, args.threads)
+        lookup = lookups(tileset.tile, picks)
+        print(f'{"disk":<8} {rate:>7.0f} tile/s {lookup:>9.0f} tile/s  {codes}  '
+              f'pool of {tileset.pool.opened} connections')
+
+        # Same server, but a fresh connection for every tile.
+        tileset.pool = Unpooled(tileset.path)
+        rate, codes = run(app.test_client, urls, args.threads)
+        lookup = lookups(tileset.tile, picks)
+        print(f'{"no pool":<8} {rate:>7.0f} tile/s {lookup:>9.0f} tile/s  {codes}')
+
+        app, ts, urls, _ = server(total * 2)
+        etags = [f'"{version}-{ZOOM}-{x}-{y}"' for x, y in picks]
+        rate, codes = run(app.test_client, list(zip(urls, etags)), args.threads, revalidate=True)
+        print(f'{"304":<8} {rate:>7.0f} tile/s {"":>16} {codes}')
+
+
+if __name__ == '__main__':
+    main()
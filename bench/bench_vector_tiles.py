@@ -0,0 +1,93 @@
+"""Vector tiles of the locations: encode time and size at several densities.
+
+    python bench/bench_vector_tiles.py [--sizes 1000,10000,100000] [--samples 20]
+
+Seeds the database with ``N`` locations spread over Java (as
+``seed_locations`` does) and, for zooms 6 to 16, encodes the distinct
+tiles that contain one of ``--samples`` random locations. For each zoom
+it reports the features per tile (clusters below zoom 15), the mean time to read and
+encode a tile with the R*Tree prefilter ("encode") and with a range scan
+("no index"), the time ``VectorTileCache.tile`` takes for a tile not yet
+cached ("miss", with connecting, writing the file) and for one on disk
+("hit"), and the tile size raw and gzipped. "JSON" is what
+``/locations`` sends for the same dataset.
+"""
+import argparse
+import json
+import sqlite3
+import statistics
+import time
+import zlib
+
+from _util import fmt_bytes, load_app, seed_locations, temp_workdir
+
+import vectortiles
+
+ZOOMS = (6, 10, 13, 16)
+
+
+def sample_tiles(conn, z, count):
+    rows = conn.execute('SELECT latitude, longitude FROM locations ORDER BY random() LIMIT ?', (count,)).fetchall()
+    # Distinct tiles: at low zooms most samples fall in the same one.
+    return sorted({tuple(int(v) for v in vectortiles.tile_xy(lat, lon, z)) for lat, lon in rows})
+
+
+def timed_encode(conn, z, tiles, scan=False):
+    has_rtree = vectortiles.has_rtree
+    if scan:
+        vectortiles.has_rtree = lambda conn: False
+    try:
+        times, sizes = [], []
+        for x, y in tiles:
+            start = time.perf_counter()
+            data = vectortiles.encode_tile(conn, z, x, y)
+            times.append(time.perf_counter() - start)
+            sizes.append(data)
+        return statistics.fmean(times), sizes
+    finally:
+        vectortiles.has_rtree = has_rtree
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    p.add_argument('--sizes', default='1000,10000,100000', help='comma separated location counts')
+    p.add_argument('--samples', type=int, default=20, help='tiles per zoom')
+    args = p.parse_args()
+    with temp_workdir():
+        mod = load_app()
+        mod.init_db()
+        cache = mod.vector_tiles
+        print(f'{"locations":>9} {"zoom":>4} {"features":>8} {"encode":>9} {"no index":>9} '
+              f'{"miss":>9} {"hit":>8} {"raw":>9} {"gzip":>9}')
+        for n in (int(s) for s in args.sizes.split(',')):
+            seed_locations(n)
+            with sqlite3.connect('locations.db') as conn:
+                cache.sync(conn)
+                rows = conn.execute('SELECT id, name, latitude, longitude FROM locations').fetchall()
+                as_json = json.dumps(dict(version=0, locations=[mod.location_dict(r) for r in rows])).encode()
+                for z in ZOOMS:
+                    tiles = sample_tiles(conn, z, args.samples)
+                    encode, data = timed_encode(conn, z, tiles)
+                    scan, _ = timed_encode(conn, z, tiles, scan=True)
+                    cache.clear()
+                    start = time.perf_counter()
+                    for x, y in tiles:
+                        cache.tile(z, x, y)
+                    miss = (time.perf_counter() - start) / len(tiles)
+                    start = time.perf_counter()
+                    for x, y in tiles:
+                        cache.tile(z, x, y)
+                    hit = (time.perf_counter() - start) / len(tiles)
+                    features = statistics.fmean(len(vectortiles.points(
+                        vectortiles.locations_in_tile(conn, z, x, y), z, x, y)) for x, y in tiles)
+                    raw = round(statistics.fmean(len(d) for d in data))
+                    gz = round(statistics.fmean(len(zlib.compress(d, 6)) for d in data))
+                    print(f'{n:>9} {z:>4} {features:>8.0f} {encode * 1e3:>6.2f} ms {scan * 1e3:>6.2f} ms '
+                          f'{miss * 1e3:>6.2f} ms {hit * 1e6:>5.0f} us {fmt_bytes(raw):>9} {fmt_bytes(gz):>9}')
+            print(f'{n:>9} JSON /locations: {fmt_bytes(len(as_json))}, '
+                  f'gzip {fmt_bytes(len(zlib.compress(as_json, 6)))}')
+        mod.jobs.shutdown()
+
+
+if __name__ == '__main__':
+    main()
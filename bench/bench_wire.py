@@ -0,0 +1,87 @@
+"""Parsing throughput and body size: JSON vs packed struct vs MessagePack.
+
+    python bench/bench_wire.py
+
+"decode/s" is the bare decoder on bytes (json.loads vs wire.decode_fixes).
+"request/s" builds a fresh Flask request per parse, so JSON goes through
+request.get_json() exactly as update_location does. "e2e req/s" is full
+/update_location round trips through the test client.
+"""
+import json
+import math
+import time
+
+from _util import load_app, seed_locations, temp_workdir
+
+import wire
+
+
+def per_second(fn, seconds=0.5):
+    n, start = 0, time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        fn()
+        n += 1
+    return n / (time.perf_counter() - start)
+
+
+def main():
+    with temp_workdir():
+        mod = load_app()
+        mod.init_db()
+        seed_locations(100)
+        app, request = mod.app, mod.request
+        client = app.test_client()
+        target = client.get('/locations').json['locations'][0]['id']
+        fix = (-6.2, 106.8, target, 5.0)
+
+        single = {
+            'json': (json.dumps(dict(latitude=fix[0], longitude=fix[1], location_id=fix[2])).encode(),
+                     'application/json'),
+            'struct': (wire.FIX.pack(*fix), wire.FIX_TYPE),
+        }
+        batch = {
+            'json': (json.dumps([dict(latitude=fix[0], longitude=fix[1], location_id=fix[2])] * 100).encode(),
+                     'application/json'),
+            'struct': (wire.FIX.pack(*fix) * 100, wire.FIX_BATCH_TYPE),
+        }
+        if wire.msgpack is not None:
+            single['msgpack'] = (wire.msgpack.packb(list(fix)), 'application/msgpack')
+            batch['msgpack'] = (wire.msgpack.packb([list(fix)] * 100), 'application/msgpack')
+        else:
+            print('(msgpack not installed; skipping it)')
+
+        def decoder(body, content_type):
+            if content_type == 'application/json':
+                return lambda: json.loads(body)
+            return lambda: wire.decode_fixes(content_type, body)
+
+        def in_request(body, content_type):
+            def parse():
+                with app.test_request_context('/update_location', method='POST',
+                                              data=body, content_type=content_type):
+                    if content_type == 'application/json':
+                        return request.get_json()
+                    return wire.decode_fixes(request.mimetype, request.get_data())
+            return parse
+
+        print(f'{"format":>8} {"kind":>10} {"bytes":>6} {"decode/s":>10} {"fixes/s":>10} '
+              f'{"request/s":>10} {"e2e req/s":>10}')
+        for kind, bodies, per_body in (('single', single, 1), ('batch×100', batch, 100)):
+            for name, (body, content_type) in bodies.items():
+                raw = per_second(decoder(body, content_type))
+                req = per_second(in_request(body, content_type))
+                e2e = ''
+                if kind == 'single':
+                    e2e = f'{per_second(lambda: client.post("/update_location", data=body, content_type=content_type)):10.0f}'
+                print(f'{name:>8} {kind:>10} {len(body):>6} {raw:>10.0f} {raw * per_body:>10.0f} '
+                      f'{req:>10.0f} {e2e:>10}')
+
+        reply = client.post('/update_location', data=single['struct'][0], content_type=wire.FIX_TYPE)
+        json_reply = client.post('/update_location', data=single['json'][0], content_type='application/json')
+        print(f'reply bytes: json {len(json_reply.data)}, packed {len(reply.data)} '
+              f'(distance {wire.DISTANCE.unpack(reply.data)[0]:.1f} m)')
+        assert math.isclose(wire.DISTANCE.unpack(reply.data)[0], json_reply.json['distance'])
+
+
+if __name__ == '__main__':
+    main()
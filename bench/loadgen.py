@@ -0,0 +1,286 @@
+"""Simulate a fleet of phones against a local server and report latency.
+
+    python bench/loadgen.py [--devices 50] [--rate 1] [--duration 30]
+                            [--profile walking|driving|stationary|mixed] [--trace FILE]
+                            [--targets fixed|hot|switch] [--crud 0.01] [--ws 0.0]
+                            [--url http://127.0.0.1:5000] [--app app13-v4.py]
+
+Without ``--url`` the app is started in a child process on a free
+127.0.0.1 port with a fresh database of ``--locations`` rows, so the
+generator and the server do not share a GIL. ``--url`` must point at a
+loopback address; this tool never sends traffic anywhere else.
+
+Each device is a thread replaying its own GPS trace (``--profile``
+walking/driving/stationary/mixed from ``traces.py``, or a GPX/NMEA file
+given with ``--trace``) at ``--rate`` fixes per second, over HTTP
+(``/update_location``) or, for the ``--ws`` fraction of devices, over
+the ``/ws/track`` socket. Target selection:
+
+``fixed``   every device picks one random location and keeps it
+``hot``     all devices track the same location
+``switch``  a device picks a new random target every ``--switch-every`` fixes
+
+``--crud`` is the chance per fix that the device also edits a random
+location through ``PATCH /api/locations/<id>``.
+
+Latency is measured from the time a request was *scheduled*, not sent, so
+a device that falls behind shows up as latency instead of silently
+sending fewer requests.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from collections import Counter, defaultdict
+
+from _util import ROOT, is_loopback, load_app, seed_locations, temp_workdir
+from traces import PROFILES, read_trace
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+
+    def record(self, endpoint, seconds, ok=True):
+        with self.lock:
+            self.latencies[endpoint].append(seconds)
+            if not ok:
+                self.errors[endpoint] += 1
+
+
+def percentile(values, p):
+    # nearest rank, values sorted
+    if not values:
+        return float('nan')
+    k = max(0, min(len(values) - 1, round(p / 100 * len(values) + 0.5) - 1))
+    return values[k]
+
+
+def report(rec, elapsed):
+    print(f'{"endpoint":<16} {"requests":>9} {"errors":>7} {"req/s":>8} '
+          f'{"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8}')
+    total = Counter()
+    for endpoint in sorted(rec.latencies):
+        values = sorted(rec.latencies[endpoint])
+        total['n'] += len(values)
+        total['err'] += rec.errors[endpoint]
+        print(f'{endpoint:<16} {len(values):>9} {rec.errors[endpoint]:>7} {len(values) / elapsed:>8.1f} '
+              + ' '.join(f'{percentile(values, p) * 1000:>8.1f}' for p in (50, 95, 99)))
+    rate = total['err'] / total['n'] if total['n'] else 0.0
+    print(f'{"total":<16} {total["n"]:>9} {total["err"]:>7} {total["n"] / elapsed:>8.1f}   '
+          f'error rate {rate:.2%}')
+
+
+class HttpClient:
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.conn = http.client.HTTPConnection(host, port, timeout=10)
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        try:
+            self.conn.request(method, path, data, headers)
+            r = self.conn.getresponse()
+            payload = r.read()
+            return r.status, r.headers, payload
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=10)
+            return None, {}, b''
+
+
+class Device(threading.Thread):
+    def __init__(self, n, args, host, port, ids, hot, rec, start_at, stop_at):
+        super().__init__(daemon=True)
+        self.n, self.args, self.host, self.port = n, args, host, port
+        self.ids, self.hot, self.rec = ids, hot, rec
+        self.start_at, self.stop_at = start_at, stop_at
+        self.rnd = random.Random(n)
+        self.use_ws = self.rnd.random() < args.ws
+
+    def trace(self):
+        # Endless (lat, lon) stream; a file trace loops, starting at a
+        # different point per device.
+        if self.args.trace:
+            skip = self.rnd.randrange(1000)
+            while True:
+                for j, fix in enumerate(read_trace(self.args.trace)):
+                    if j >= skip:
+                        yield fix.lat, fix.lon
+                skip = 0
+        profile = self.args.profile
+        if profile == 'mixed':
+            profile = self.rnd.choice(sorted(PROFILES))
+        for fix in PROFILES[profile](lat=self.rnd.uniform(-8, -6), lon=self.rnd.uniform(106, 112),
+                                     interval=1 / self.args.rate, seed=self.n):
+            yield fix.lat, fix.lon
+
+    def pick_target(self):
+        return self.hot if self.args.targets == 'hot' else self.rnd.choice(self.ids)
+
+    def run(self):
+        http = HttpClient(self.host, self.port)
+        session = None
+        target = self.pick_target()
+        ws = self.connect_ws(target) if self.use_ws else None
+        # Spread devices over one period so they do not fire in lockstep.
+        period = 1 / self.args.rate
+        due = self.start_at + self.rnd.uniform(0, period)
+        for i, (lat, lon) in enumerate(self.trace()):
+            if due >= self.stop_at:
+                break
+            time.sleep(max(0.0, due - time.monotonic()))
+            if self.args.targets == 'switch' and i and i % self.args.switch_every == 0:
+                target = self.pick_target()
+                if ws is not None and not self.ws_call(ws, dict(type='target', location_id=target)):
+                    ws = self.connect_ws(target)
+            stamp = int((self.start_at + i * period) * 1000)
+            if ws is not None:
+                ok = self.ws_call(ws, [lat, lon, stamp])
+                self.rec.record('ws fix', time.monotonic() - due, ok)
+                if not ok:
+                    ws = self.connect_ws(target)
+            else:
+                headers = {'X-Tracking-Session': session} if session else {}
+                status, h, _ = http.request('POST', '/update_location', dict(
+                    latitude=lat, longitude=lon, timestamp=stamp, location_id=target), headers)
+                session = h.get('X-Tracking-Session') or session
+                self.rec.record('update_location', time.monotonic() - due, status == 200)
+            if self.rnd.random() < self.args.crud:
+                edited = self.rnd.choice(self.ids)
+                sent = time.monotonic()
+                status, _, _ = http.request('PATCH', f'/api/locations/{edited}', dict(
+                    latitude=-7 + self.rnd.uniform(-1, 1), longitude=109 + self.rnd.uniform(-3, 3)))
+                self.rec.record('crud PATCH', time.monotonic() - sent, status == 200)
+            due += period
+        if ws is not None:
+            ws.close()
+
+    def connect_ws(self, target):
+        import simple_websocket
+        try:
+            ws = simple_websocket.Client(f'ws://{self.host}:{self.port}/ws/track')
+            ws.receive(timeout=5)  # hello
+        except Exception:
+            self.rec.record('ws connect', 0.0, False)
+            return None
+        # No fix yet, so the target is acknowledged silently.
+        ws.send(json.dumps(dict(type='target', location_id=target)))
+        return ws
+
+    def ws_call(self, ws, message):
+        # Waits for the distance that answers ``message``; a target switch is
+        # answered too, because the session already has a fix.
+        try:
+            ws.send(json.dumps(message))
+            while True:
+                text = ws.receive(timeout=10)
+                if text is None:
+                    return False
+                msg = json.loads(text)
+                if msg['type'] == 'ping':
+                    ws.send('{"type":"pong"}')
+                elif msg['type'] in ('distance', 'error'):
+                    return msg['type'] == 'distance'
+        except Exception:
+            return False
+
+
+def serve(port, app_file, locations):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    WSGIRequestHandler.protocol_version = 'HTTP/1.1'  # keep-alive per device
+    with temp_workdir():
+        mod = load_app(app_file)
+        mod.init_db()
+        seed_locations(locations)
+        make_server('127.0.0.1', port, mod.app, threaded=True).serve_forever()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise SystemExit(f'server on {host}:{port} did not come up')
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    p.add_argument('--devices', type=int, default=50)
+    p.add_argument('--rate', type=float, default=1.0, help='fixes per second per device')
+    p.add_argument('--duration', type=float, default=30.0, help='seconds')
+    p.add_argument('--profile', choices=sorted(PROFILES) + ['mixed'], default='walking')
+    p.add_argument('--trace', help='GPX/NMEA file every device replays instead of --profile')
+    p.add_argument('--targets', choices=('fixed', 'hot', 'switch'), default='fixed')
+    p.add_argument('--switch-every', type=int, default=30)
+    p.add_argument('--crud', type=float, default=0.0, help='chance per fix of an edit')
+    p.add_argument('--ws', type=float, default=0.0, help='fraction of devices on /ws/track')
+    p.add_argument('--url', help='running server (loopback only)')
+    p.add_argument('--app', default='app13-v4.py')
+    p.add_argument('--locations', type=int, default=1000)
+    p.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = p.parse_args()
+
+    if args.serve:
+        return serve(args.serve, args.app, args.locations)
+
+    child = None
+    if args.url:
+        url = urllib.parse.urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+        if not is_loopback(host):
+            raise SystemExit(f'refusing to load-test {host}: only loopback addresses are allowed')
+    else:
+        host, port = '127.0.0.1', free_port()
+        child = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', str(port),
+                                  '--app', args.app, '--locations', str(args.locations)],
+                                 cwd=ROOT, stderr=subprocess.DEVNULL)
+    try:
+        wait_for(host, port)
+        status, _, body = HttpClient(host, port).request('GET', '/locations')
+        if status != 200:
+            raise SystemExit(f'GET /locations answered {status}')
+        data = json.loads(body)
+        ids = [loc['id'] for loc in (data['locations'] if isinstance(data, dict) else data)]
+        rec = Recorder()
+        start = time.monotonic() + 0.5
+        devices = [Device(n, args, host, port, ids, ids[0], rec, start, start + args.duration)
+                   for n in range(args.devices)]
+        for d in devices:
+            d.start()
+        for d in devices:
+            d.join()
+        elapsed = time.monotonic() - start
+        print(f'{args.devices} devices x {args.rate:g} Hz for {args.duration:g} s '
+              f'(trace={args.trace or args.profile}, targets={args.targets}, crud={args.crud:g}, ws={args.ws:g}) against {args.app if child else args.url}')
+        report(rec, elapsed)
+    finally:
+        if child is not None:
+            child.terminate()
+            child.wait()
+
+
+if __name__ == '__main__':
+    main()
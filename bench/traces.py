@@ -0,0 +1,361 @@
+"""Synthetic GPS traces and GPX/NMEA replay.
+
+    python bench/traces.py generate walking|driving|stationary [--duration 3600]
+                           [--noise 4] [--format gpx|nmea] [--out FILE]
+    python bench/traces.py replay FILE [--speed 10] [--location 1]
+                           [--url http://127.0.0.1:5000] [--ws]
+
+Every trace is an iterator of ``Fix(t, lat, lon, accuracy)``: ``t`` in
+seconds (Unix time for files, from 0 for generated traces), ``accuracy``
+the 1-sigma error in metres the phone would report. Generators, readers
+and writers all stream, so a ten-hour trace costs no more memory than a
+ten-second one.
+
+Position noise is correlated from fix to fix (first-order
+autoregressive), like real receivers whose error drifts instead of
+jumping; ``noise`` is its standard deviation in metres. The README's
+1-10 m offline error is the default accuracy range.
+"""
+import argparse
+import calendar
+import collections
+import itertools
+import json
+import math
+import random
+import sys
+import time
+import urllib.parse
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+
+M_PER_DEG = 111_320
+GPX_NS = 'http://www.topografix.com/GPX/1/1'
+NMEA_UERE = 5.0  # metres per unit of HDOP, a common receiver rule of thumb
+
+Fix = collections.namedtuple('Fix', 't lat lon accuracy')
+
+
+# ── Generators ───────────────────────────────────────────────
+
+class _Noise:
+    """Correlated position error in metres (north, east)."""
+
+    def __init__(self, rnd, sigma, correlation=0.9):
+        self.rnd, self.sigma, self.a = rnd, sigma, correlation
+        self.b = math.sqrt(1 - correlation ** 2)
+        self.n = rnd.gauss(0, sigma)
+        self.e = rnd.gauss(0, sigma)
+
+    def step(self):
+        self.n = self.a * self.n + self.b * self.rnd.gauss(0, self.sigma)
+        self.e = self.a * self.e + self.b * self.rnd.gauss(0, self.sigma)
+        return self.n, self.e
+
+
+def _offset(lat, lon, north, east):
+    return lat + north / M_PER_DEG, lon + east / (M_PER_DEG * math.cos(math.radians(lat)))
+
+
+def _trace(moves, lat, lon, duration, interval, noise, accuracy, rnd):
+    # moves: iterator of (north, east) metres travelled per interval
+    err = _Noise(rnd, noise)
+    lo, hi = accuracy
+    steps = itertools.count() if duration is None else range(int(duration / interval))
+    for i, (north, east) in zip(steps, moves):
+        lat, lon = _offset(lat, lon, north, east)
+        n, e = err.step()
+        flat, flon = _offset(lat, lon, n, e)
+        acc = min(hi, max(lo, math.hypot(n, e) * rnd.uniform(0.8, 1.5)))
+        yield Fix(i * interval, flat, flon, round(acc, 1))
+
+
+def walking(duration=None, lat=-6.2000, lon=106.8000, interval=1.0, speed=1.4,
+            noise=4.0, accuracy=(1.0, 10.0), seed=1):
+    """A pedestrian wandering at about ``speed`` m/s, pausing now and then."""
+    rnd = random.Random(seed)
+
+    def moves():
+        heading = rnd.uniform(0, 2 * math.pi)
+        pause = 0
+        while True:
+            if pause:
+                pause -= 1
+                yield 0.0, 0.0
+                continue
+            if rnd.random() < 0.005:
+                pause = int(rnd.uniform(5, 60) / interval)  # crossing, shop window
+            heading += rnd.gauss(0, 0.1)
+            d = max(0.0, rnd.gauss(speed, 0.2)) * interval
+            yield d * math.cos(heading), d * math.sin(heading)
+
+    return _trace(moves(), lat, lon, duration, interval, noise, accuracy, rnd)
+
+
+def driving(duration=None, lat=-6.2000, lon=106.8000, interval=1.0, cruise=12.0,
+            noise=4.0, accuracy=(1.0, 10.0), seed=1):
+    """A car on a street grid: accelerates to ``cruise`` m/s, stops at
+    junctions and sometimes turns 90 degrees there."""
+    rnd = random.Random(seed)
+
+    def moves():
+        heading = rnd.choice((0, 0.5, 1, 1.5)) * math.pi
+        speed, block, stopped = 0.0, rnd.uniform(100, 400), 0
+        while True:
+            if stopped:
+                stopped -= 1
+                yield 0.0, 0.0
+                continue
+            target = cruise if block > speed * 3 else 2.0
+            speed += max(-3.0, min(2.0, target - speed)) * interval
+            d = speed * interval
+            block -= d
+            if block <= 0:
+                if rnd.random() < 0.4:
+                    stopped = int(rnd.uniform(10, 45) / interval)  # red light
+                    speed = 0.0
+                if rnd.random() < 0.3:
+                    heading += rnd.choice((-1, 1)) * math.pi / 2
+                block = rnd.uniform(100, 400)
+            h = heading + rnd.gauss(0, 0.01)
+            yield d * math.cos(h), d * math.sin(h)
+
+    return _trace(moves(), lat, lon, duration, interval, noise, accuracy, rnd)
+
+
+def stationary(duration=None, lat=-6.2000, lon=106.8000, interval=1.0,
+               noise=4.0, accuracy=(1.0, 10.0), seed=1):
+    """A phone lying still; only the receiver error moves."""
+    rnd = random.Random(seed)
+    return _trace(itertools.repeat((0.0, 0.0)), lat, lon, duration, interval, noise, accuracy, rnd)
+
+
+PROFILES = {'walking': walking, 'driving': driving, 'stationary': stationary}
+
+
+# ── Readers ──────────────────────────────────────────────────
+
+def _iso_time(text):
+    return datetime.fromisoformat(text.strip()).timestamp()
+
+
+def read_gpx(f):
+    """Stream ``<trkpt>``/``<rtept>`` fixes from a GPX 1.0/1.1 file."""
+    open_elements = []
+    for event, el in ET.iterparse(f, events=('start', 'end')):
+        if event == 'start':
+            open_elements.append(el)
+            continue
+        open_elements.pop()
+        if el.tag.rsplit('}', 1)[-1] not in ('trkpt', 'rtept'):
+            continue
+        t = hdop = None
+        for child in el:
+            name = child.tag.rsplit('}', 1)[-1]
+            if name == 'time' and child.text:
+                t = _iso_time(child.text)
+            elif name == 'hdop' and child.text:
+                hdop = float(child.text)
+        yield Fix(t, float(el.get('lat')), float(el.get('lon')),
+                  None if hdop is None else hdop * NMEA_UERE)
+        # Detach the parsed point so memory stays flat on long tracks.
+        if open_elements:
+            open_elements[-1].remove(el)
+
+
+def _nmea_checksum(body):
+    c = 0
+    for ch in body.encode('ascii', 'replace'):
+        c ^= ch
+    return c
+
+
+def _nmea_coord(value, hemi, degree_digits):
+    if not value:
+        return None
+    deg = float(value[:degree_digits]) + float(value[degree_digits:]) / 60
+    return -deg if hemi in ('S', 'W') else deg
+
+
+def read_nmea(f):
+    """Stream fixes from NMEA 0183 ``RMC`` sentences; ``GGA`` supplies HDOP
+    for the next fix. Sentences with a bad checksum are skipped."""
+    hdop = None
+    for line in f:
+        if isinstance(line, bytes):
+            line = line.decode('ascii', 'replace')
+        line = line.strip()
+        if not line.startswith('$') or '*' not in line:
+            continue
+        body, _, checksum = line[1:].partition('*')
+        try:
+            if int(checksum[:2], 16) != _nmea_checksum(body):
+                continue
+        except ValueError:
+            continue
+        fields = body.split(',')
+        kind = fields[0][2:]
+        if kind == 'GGA' and len(fields) > 8 and fields[8]:
+            hdop = float(fields[8])
+        elif kind == 'RMC' and len(fields) > 9 and fields[2] == 'A':
+            hms, dmy = fields[1], fields[9]
+            t = calendar.timegm((2000 + int(dmy[4:6]), int(dmy[2:4]), int(dmy[0:2]),
+                                 int(hms[0:2]), int(hms[2:4]), 0)) + float(hms[4:])
+            lat = _nmea_coord(fields[3], fields[4], 2)
+            lon = _nmea_coord(fields[5], fields[6], 3)
+            if lat is not None and lon is not None:
+                yield Fix(t, lat, lon, None if hdop is None else hdop * NMEA_UERE)
+
+
+def read_trace(path):
+    """Open a ``.gpx`` or ``.nmea``/``.txt``/``.log`` file and stream its fixes."""
+    if path.lower().endswith('.gpx'):
+        with open(path, 'rb') as f:
+            yield from read_gpx(f)
+    else:
+        with open(path, encoding='ascii', errors='replace') as f:
+            yield from read_nmea(f)
+
+
+# ── Writers ──────────────────────────────────────────────────
+
+def _utc(t):
+    return datetime.fromtimestamp(t, timezone.utc)
+
+
+def write_gpx(fixes, out, start=None):
+    """Write fixes as one GPX track; generated times are offset from ``start``."""
+    start = time.time() if start is None else start
+    out.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+              f'<gpx version="1.1" creator="traces.py" xmlns="{GPX_NS}"><trk><trkseg>\n')
+    for fix in fixes:
+        stamp = _utc(start + fix.t).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        hdop = '' if fix.accuracy is None else f'<hdop>{fix.accuracy / NMEA_UERE:.1f}</hdop>'
+        out.write(f'<trkpt lat="{fix.lat:.7f}" lon="{fix.lon:.7f}"><time>{stamp}</time>{hdop}</trkpt>\n')
+    out.write('</trkseg></trk></gpx>\n')
+
+
+def _nmea_sentence(body):
+    return f'${body}*{_nmea_checksum(body):02X}\n'
+
+
+def _nmea_fields(value, hemis, degree_digits):
+    deg = int(abs(value))
+    minutes = (abs(value) - deg) * 60
+    return f'{deg:0{degree_digits}d}{minutes:07.4f}', hemis[value < 0]
+
+
+def write_nmea(fixes, out, start=None):
+    """Write a GGA + RMC sentence pair per fix."""
+    start = time.time() if start is None else start
+    for fix in fixes:
+        ts = _utc(start + fix.t)
+        hms = ts.strftime('%H%M%S.') + f'{ts.microsecond // 10000:02d}'
+        lat, ns = _nmea_fields(fix.lat, 'NS', 2)
+        lon, ew = _nmea_fields(fix.lon, 'EW', 3)
+        hdop = '' if fix.accuracy is None else f'{fix.accuracy / NMEA_UERE:.1f}'
+        out.write(_nmea_sentence(f'GPGGA,{hms},{lat},{ns},{lon},{ew},1,08,{hdop},0.0,M,0.0,M,,'))
+        out.write(_nmea_sentence(f'GPRMC,{hms},A,{lat},{ns},{lon},{ew},,,{ts.strftime("%d%m%y")},,,A'))
+
+
+# ── Replay ───────────────────────────────────────────────────
+
+def replay(fixes, speed=1.0, clock=time.monotonic, sleep=time.sleep):
+    """Yield fixes paced by their timestamps, ``speed`` times faster than
+    recorded; ``speed=0`` replays as fast as possible. Fixes without a
+    timestamp are spaced one second apart."""
+    first = start = None
+    last_t = None
+    for fix in fixes:
+        t = fix.t if fix.t is not None else (0.0 if last_t is None else last_t + 1.0)
+        last_t = t
+        if speed:
+            if first is None:
+                first, start = t, clock()
+            delay = start + (t - first) / speed - clock()
+            if delay > 0:
+                sleep(delay)
+        yield fix
+
+
+def post_fixes(fixes, url, location_id, use_ws=False):
+    """Send fixes to ``/update_location`` (or ``/ws/track``) of a loopback
+    server and yield ``(fix, distance)``."""
+    from _util import is_loopback
+    parts = urllib.parse.urlsplit(url)
+    if not is_loopback(parts.hostname):
+        raise SystemExit(f'refusing to replay into {parts.hostname}: only loopback addresses are allowed')
+    if use_ws:
+        import simple_websocket
+        ws = simple_websocket.Client(f'ws://{parts.netloc}/ws/track')
+        ws.receive(timeout=5)
+        ws.send(json.dumps(dict(type='target', location_id=location_id)))
+        try:
+            for fix in fixes:
+                ws.send(json.dumps([fix.lat, fix.lon, int((fix.t or 0) * 1000)]))
+                while True:
+                    msg = json.loads(ws.receive(timeout=10))
+                    if msg['type'] in ('distance', 'error'):
+                        break
+                yield fix, msg.get('distance')
+        finally:
+            ws.close()
+        return
+    import http.client
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=10)
+    session = None
+    for fix in fixes:
+        headers = {'Content-Type': 'application/json'}
+        if session:
+            headers['X-Tracking-Session'] = session
+        body = dict(latitude=fix.lat, longitude=fix.lon, location_id=location_id)
+        if fix.t is not None:
+            body['timestamp'] = int(fix.t * 1000)
+        conn.request('POST', '/update_location', json.dumps(body), headers)
+        r = conn.getresponse()
+        session = r.getheader('X-Tracking-Session') or session
+        yield fix, json.loads(r.read()).get('distance')
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    sub = p.add_subparsers(dest='command', required=True)
+    g = sub.add_parser('generate')
+    g.add_argument('profile', choices=sorted(PROFILES))
+    g.add_argument('--duration', type=float, default=3600, help='seconds')
+    g.add_argument('--interval', type=float, default=1.0)
+    g.add_argument('--noise', type=float, default=4.0, help='metres, 1 sigma')
+    g.add_argument('--accuracy', type=float, nargs=2, default=(1.0, 10.0), metavar=('MIN', 'MAX'))
+    g.add_argument('--lat', type=float, default=-6.2)
+    g.add_argument('--lon', type=float, default=106.8)
+    g.add_argument('--seed', type=int, default=1)
+    g.add_argument('--format', choices=('gpx', 'nmea'), default='gpx')
+    g.add_argument('--out', help='file (default stdout)')
+    r = sub.add_parser('replay')
+    r.add_argument('file')
+    r.add_argument('--speed', type=float, default=1.0, help='0 = as fast as possible')
+    r.add_argument('--url', default='http://127.0.0.1:5000')
+    r.add_argument('--location', type=int, default=1)
+    r.add_argument('--ws', action='store_true', help='send over /ws/track')
+    args = p.parse_args()
+
+    if args.command == 'generate':
+        fixes = PROFILES[args.profile](args.duration, lat=args.lat, lon=args.lon, interval=args.interval,
+                                       noise=args.noise, accuracy=tuple(args.accuracy), seed=args.seed)
+        write = write_gpx if args.format == 'gpx' else write_nmea
+        if args.out:
+            with open(args.out, 'w') as out:
+                write(fixes, out)
+        else:
+            write(fixes, sys.stdout)
+        return
+
+    n = 0
+    for fix, distance in post_fixes(replay(read_trace(args.file), args.speed), args.url,
+                                    args.location, args.ws):
+        n += 1
+        print(f'{n:>6} {fix.lat:.6f} {fix.lon:.6f} acc={fix.accuracy} -> {distance}')
+
+
+if __name__ == '__main__':
+    main()
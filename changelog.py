@@ -0,0 +1,110 @@
+"""Versioned change log for the ``locations`` table.
+
+Triggers append one row per insert/update/delete to ``location_changes``;
+its AUTOINCREMENT key is the dataset version and never goes backwards,
+even after compaction. The log only records *which* location changed;
+current values are joined from ``locations`` when a delta is requested,
+and a change whose location no longer exists is a tombstone.
+
+Compaction keeps only the newest entry per location and drops tombstones
+older than ``TOMBSTONE_TTL``. Clients whose ``since`` is older than the
+oldest dropped tombstone get ``reset: true`` and the full dataset.
+"""
+import time
+
+TOMBSTONE_TTL = 30 * 24 * 3600
+COMPACT_INTERVAL = 3600
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS location_changes (
+    version INTEGER PRIMARY KEY AUTOINCREMENT,
+    location_id INTEGER NOT NULL,
+    changed_at REAL NOT NULL DEFAULT ((julianday('now') - 2440587.5) * 86400.0)
+);
+CREATE INDEX IF NOT EXISTS location_changes_location_id ON location_changes(location_id);
+CREATE TABLE IF NOT EXISTS changelog_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS locations_log_insert AFTER INSERT ON locations BEGIN
+    INSERT INTO location_changes (location_id) VALUES (new.id);
+END;
+CREATE TRIGGER IF NOT EXISTS locations_log_update AFTER UPDATE ON locations BEGIN
+    INSERT INTO location_changes (location_id) VALUES (new.id);
+END;
+CREATE TRIGGER IF NOT EXISTS locations_log_delete AFTER DELETE ON locations BEGIN
+    INSERT INTO location_changes (location_id) VALUES (old.id);
+END;
+'''
+
+_last_compact = 0.0
+
+
+def init_changelog(conn):
+    conn.executescript(SCHEMA)
+    # Rows written before the triggers existed still need a version.
+    conn.execute('''
+        INSERT INTO location_changes (location_id)
+        SELECT id FROM locations
+        WHERE id NOT IN (SELECT location_id FROM location_changes)
+    ''')
+    conn.commit()
+
+
+def current_version(conn):
+    # sqlite_sequence, not MAX(version): compaction may delete the newest row.
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'location_changes'").fetchone()
+    return row[0] if row else 0
+
+
+def floor_version(conn):
+    row = conn.execute("SELECT value FROM changelog_meta WHERE key = 'floor'").fetchone()
+    return row[0] if row else 0
+
+
+def changes_since(conn, since):
+    """Return ``(version, reset, upserts, deleted_ids)`` for a client at ``since``."""
+    version = current_version(conn)
+    # since > version: the client synced against a different database.
+    if since < floor_version(conn) or since > version:
+        rows = conn.execute('SELECT id, name, latitude, longitude FROM locations ORDER BY id').fetchall()
+        return version, True, rows, []
+    rows = conn.execute('''
+        SELECT c.location_id, l.name, l.latitude, l.longitude
+        FROM (SELECT DISTINCT location_id FROM location_changes WHERE version > ?) c
+        LEFT JOIN locations l ON l.id = c.location_id
+        ORDER BY c.location_id
+    ''', (since,)).fetchall()
+    upserts = [r for r in rows if r[1] is not None]
+    deleted = [r[0] for r in rows if r[1] is None]
+    return version, False, upserts, deleted
+
+
+def compact(conn, now=None):
+    now = time.time() if now is None else now
+    conn.execute('''
+        DELETE FROM location_changes
+        WHERE version NOT IN (SELECT MAX(version) FROM location_changes GROUP BY location_id)
+    ''')
+    expired = conn.execute('''
+        SELECT MAX(version) FROM location_changes
+        WHERE changed_at < ? AND location_id NOT IN (SELECT id FROM locations)
+    ''', (now - TOMBSTONE_TTL,)).fetchone()[0]
+    if expired is not None:
+        conn.execute('''
+            DELETE FROM location_changes
+            WHERE version <= ? AND location_id NOT IN (SELECT id FROM locations)
+        ''', (expired,))
+        conn.execute('''
+            INSERT INTO changelog_meta (key, value) VALUES ('floor', ?)
+            ON CONFLICT (key) DO UPDATE SET value = MAX(value, excluded.value)
+        ''', (expired,))
+    conn.commit()
+
+
+def maybe_compact(conn):
+    global _last_compact
+    now = time.time()
+    if now - _last_compact >= COMPACT_INTERVAL:
+        _last_compact = now
+        compact(conn, now)
@@ -0,0 +1,100 @@
+"""Response compression for dynamic routes (HTML pages, JSON lists).
+
+Static bundles are pre-compressed by ``assets.AssetStore``; this covers
+everything rendered per request. Small bodies (for example the per-fix
+``update_location`` reply) are passed through untouched before any
+compressor is created, so they cost nothing.
+
+Settings, read from ``app.config``:
+
+``COMPRESS_MIN_SIZE``  bodies shorter than this are sent as-is (500)
+``COMPRESS_LEVEL``     gzip level 1-9 (6); brotli uses the same number
+``COMPRESS_MIMETYPES`` content types eligible for compression
+"""
+import zlib
+
+from assets import accepted_encoding, brotli
+
+DEFAULT_MIMETYPES = (
+    'text/html',
+    'text/plain',
+    'text/css',
+    'application/json',
+    'application/javascript',
+    'image/svg+xml',
+    'application/vnd.mapbox-vector-tile',
+)
+
+
+def gzip_compressor(level):
+    # wbits=31 -> gzip container
+    c = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return c.compress, c.flush
+
+
+def brotli_compressor(level):
+    c = brotli.Compressor(quality=min(level, 11))
+    return c.process, c.finish
+
+
+def compress_body(data, encoding, level):
+    compress, finish = COMPRESSORS[encoding](level)
+    return compress(data) + finish()
+
+
+def compress_stream(chunks, encoding, level):
+    compress, finish = COMPRESSORS[encoding](level)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        out = compress(chunk)
+        if out:
+            yield out
+    yield finish()
+
+
+COMPRESSORS = {'gzip': gzip_compressor}
+if brotli is not None:
+    COMPRESSORS['br'] = brotli_compressor
+
+
+class Compress:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+        app.config.setdefault('COMPRESS_LEVEL', 6)
+        app.config.setdefault('COMPRESS_MIMETYPES', DEFAULT_MIMETYPES)
+        self.config = app.config
+        app.after_request(self.after_request)
+
+    def after_request(self, resp):
+        cfg = self.config
+        if (resp.status_code != 200
+                or resp.direct_passthrough
+                or 'Content-Encoding' in resp.headers
+                or resp.mimetype not in cfg['COMPRESS_MIMETYPES']):
+            return resp
+        length = resp.content_length
+        if length is not None and length < cfg['COMPRESS_MIN_SIZE']:
+            return resp
+        resp.vary.add('Accept-Encoding')
+        encoding = accepted_encoding(COMPRESSORS)
+        if encoding is None:
+            return resp
+
+        level = cfg['COMPRESS_LEVEL']
+        if resp.is_streamed:
+            resp.response = compress_stream(resp.response, encoding, level)
+            resp.headers.pop('Content-Length', None)
+        else:
+            resp.set_data(compress_body(resp.get_data(), encoding, level))
+        resp.headers['Content-Encoding'] = encoding
+        etag = resp.get_etag()[0]
+        if etag:
+            # Same convention as nginx: the encoded body gets a weak ETag, so
+            # If-None-Match (weak comparison) still matches the route's ETag.
+            resp.set_etag(etag, weak=True)
+        return resp
@@ -0,0 +1,142 @@
+"""Geodesic math shared by the apps, the importer and the job workers.
+
+Distances are great-circle distances on a sphere of radius
+``EARTH_RADIUS`` (the haversine formula). That is within 0.5 % of the
+WGS-84 ellipsoid, far below phone GPS noise at tracking distances.
+
+Importing the module loads only ``math``, so a CLI or worker that
+only needs distances does not pay for Flask (``bench/bench_import.py``
+measures this). NumPy is used only when NumPy arrays are passed in, and
+is never imported otherwise.
+
+The functions come in three shapes:
+
+scalar   ``haversine``, ``bearing``
+arrays   ``haversine_many``, ``bearing_many``, ``nearest``: one point
+         against columns of coordinates (lists, ``array``s, memoryviews,
+         NumPy arrays); ``haversine_pairs``, ``bearing_pairs``: row by
+         row over two sets of columns
+streams  ``distances_to``: live fixes against a fixed target;
+         ``path_lengths``: running length along a track
+"""
+from __future__ import annotations
+
+from math import asin, atan2, cos, inf, pi, sin, sqrt
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator, Sequence
+
+EARTH_RADIUS = 6371000.0   # metres
+RAD = pi / 180
+
+
+def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distance in metres between two points given in degrees."""
+    φ1, φ2 = lat1 * RAD, lat2 * RAD
+    a = sin((φ2 - φ1) / 2) ** 2 + cos(φ1) * cos(φ2) * sin((lon2 - lon1) * RAD / 2) ** 2
+    return 2 * EARTH_RADIUS * asin(sqrt(min(a, 1.0)))   # min() keeps NaN
+
+
+def bearing(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Initial compass bearing from point 1 to point 2, degrees in [0, 360)."""
+    φ1, φ2 = lat1 * RAD, lat2 * RAD
+    dλ = (lon2 - lon1) * RAD
+    y = sin(dλ) * cos(φ2)
+    x = cos(φ1) * sin(φ2) - sin(φ1) * cos(φ2) * cos(dλ)
+    return (atan2(y, x) / RAD + 360) % 360
+
+
+def _is_numpy(values) -> bool:
+    return type(values).__module__ == 'numpy'
+
+
+def haversine_many(lat: float, lon: float, lats: Sequence[float], lons: Sequence[float]):
+    """Distances in metres from ``(lat, lon)`` to each ``(lats[i], lons[i])``.
+
+    NumPy arrays give a NumPy array; any other sequences give an
+    ``array('d')``."""
+    if _is_numpy(lats) or _is_numpy(lons):
+        import numpy
+        φ2 = numpy.radians(lats)
+        a = (numpy.sin((φ2 - lat * RAD) / 2) ** 2
+             + cos(lat * RAD) * numpy.cos(φ2) * numpy.sin((numpy.radians(lons) - lon * RAD) / 2) ** 2)
+        return 2 * EARTH_RADIUS * numpy.arcsin(numpy.sqrt(numpy.minimum(a, 1.0)))
+    from array import array   # here, not at the top: it pulls in collections.abc
+    φ1, λ1 = lat * RAD, lon * RAD
+    cos1 = cos(φ1)
+    return array('d', [2 * EARTH_RADIUS * asin(sqrt(min(
+        sin((b * RAD - φ1) / 2) ** 2 + cos1 * cos(b * RAD) * sin((l * RAD - λ1) / 2) ** 2, 1.0)))
+        for b, l in zip(lats, lons)])
+
+
+def bearing_many(lat: float, lon: float, lats: Sequence[float], lons: Sequence[float]):
+    """Bearings from ``(lat, lon)`` to each ``(lats[i], lons[i])``; same
+    return types as ``haversine_many``."""
+    if _is_numpy(lats) or _is_numpy(lons):
+        import numpy
+        φ1, φ2 = lat * RAD, numpy.radians(lats)
+        dλ = numpy.radians(lons) - lon * RAD
+        y = numpy.sin(dλ) * numpy.cos(φ2)
+        x = cos(φ1) * numpy.sin(φ2) - sin(φ1) * numpy.cos(φ2) * numpy.cos(dλ)
+        return (numpy.degrees(numpy.arctan2(y, x)) + 360) % 360
+    from array import array
+    return array('d', [bearing(lat, lon, b, l) for b, l in zip(lats, lons)])
+
+
+def haversine_pairs(lats1: Sequence[float], lons1: Sequence[float],
+                    lats2: Sequence[float], lons2: Sequence[float]):
+    """Distance from each ``(lats1[i], lons1[i])`` to ``(lats2[i], lons2[i])``."""
+    if _is_numpy(lats1) or _is_numpy(lats2):
+        import numpy
+        φ1, φ2 = numpy.radians(lats1), numpy.radians(lats2)
+        a = (numpy.sin((φ2 - φ1) / 2) ** 2
+             + numpy.cos(φ1) * numpy.cos(φ2) * numpy.sin(numpy.radians(numpy.subtract(lons2, lons1)) / 2) ** 2)
+        return 2 * EARTH_RADIUS * numpy.arcsin(numpy.sqrt(numpy.minimum(a, 1.0)))
+    from array import array
+    return array('d', map(haversine, lats1, lons1, lats2, lons2))
+
+
+def bearing_pairs(lats1: Sequence[float], lons1: Sequence[float],
+                  lats2: Sequence[float], lons2: Sequence[float]):
+    """Bearing from each ``(lats1[i], lons1[i])`` to ``(lats2[i], lons2[i])``."""
+    if _is_numpy(lats1) or _is_numpy(lats2):
+        import numpy
+        φ1, φ2 = numpy.radians(lats1), numpy.radians(lats2)
+        dλ = numpy.radians(numpy.subtract(lons2, lons1))
+        y = numpy.sin(dλ) * numpy.cos(φ2)
+        x = numpy.cos(φ1) * numpy.sin(φ2) - numpy.sin(φ1) * numpy.cos(φ2) * numpy.cos(dλ)
+        return (numpy.degrees(numpy.arctan2(y, x)) + 360) % 360
+    from array import array
+    return array('d', map(bearing, lats1, lons1, lats2, lons2))
+
+
+def nearest(lat: float, lon: float, lats: Sequence[float], lons: Sequence[float]) -> tuple[int, float]:
+    """``(index, distance)`` of the point closest to ``(lat, lon)``;
+    ``(-1, inf)`` when there are none. A linear scan: for repeated
+    queries over many points see ``jobs.py``."""
+    distances = haversine_many(lat, lon, lats, lons)
+    if not len(distances):
+        return -1, inf
+    if _is_numpy(distances):
+        i = int(distances.argmin())
+    else:
+        i = min(range(len(distances)), key=distances.__getitem__)
+    return i, float(distances[i])
+
+
+def distances_to(lat: float, lon: float, fixes: Iterable[tuple[float, float]]) -> Iterator[tuple[float, float]]:
+    """Yield ``(distance, bearing)`` from each ``(lat, lon, ...)`` fix to the
+    target, as the fixes arrive."""
+    for fix in fixes:
+        yield haversine(fix[0], fix[1], lat, lon), bearing(fix[0], fix[1], lat, lon)
+
+
+def path_lengths(fixes: Iterable[tuple[float, float]]) -> Iterator[float]:
+    """Yield the distance travelled so far at each ``(lat, lon, ...)`` fix."""
+    total, last = 0.0, None
+    for fix in fixes:
+        if last is not None:
+            total += haversine(last[0], last[1], fix[0], fix[1])
+        last = fix
+        yield total
@@ -0,0 +1,404 @@
+"""Batch distances over CSV or Parquet files, outside the web app.
+
+    python geobatch.py pairs   IN [--out OUT]
+    python geobatch.py many    IN (--target LAT,LON [--target ...] | --locations) [--db locations.db]
+    python geobatch.py nearest IN [--db locations.db]
+
+``pairs``    one-to-one: distance and bearing from (lat1, lon1) to (lat2,
+             lon2) on each row
+``many``     one-to-many: each row's point against every ``--target``, or
+             every stored location with ``--locations``; one output row
+             per pair
+``nearest``  each row's point and its nearest stored location
+
+Output rows are the input rows with ``distance`` (metres) and
+``bearing`` (degrees, from the row's point) appended, after a
+``target`` (``--target`` index) or ``location_id`` column for
+``many``/``nearest``. Rows whose coordinates do not parse get empty
+fields and are counted as invalid.
+
+Input is read ``--chunk-rows`` at a time and at most two chunks per
+worker are in flight, so memory stays flat whatever the file size;
+output is written in input order as chunks finish. CSV chunks go to the
+worker processes as text, so parsing, the ``geo`` kernels and formatting
+all run there, and the parent only moves lines; a CSV record must fit on
+one line. Stored locations are shared with the workers through a
+``jobs.build_locations`` shared-memory block, which also serves the
+nearest search. With NumPy installed the ``geo`` kernels run vectorised
+over each chunk's columns. Parquet (input and output) needs ``pyarrow``.
+
+Columns are found by name (lat/latitude, lon/lng/longitude; lat1, lon1,
+lat2, lon2 for ``pairs``) unless given with --lat/--lon/--lat2/--lon2.
+Progress and rows per second go to stderr.
+"""
+import argparse
+import collections
+import csv
+import os
+import sys
+import time
+from concurrent.futures import Future
+
+import geo
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+POINT_COLUMNS = {
+    'lat': ('lat', 'latitude'),
+    'lon': ('lon', 'lng', 'long', 'longitude'),
+}
+PAIR_COLUMNS = {
+    'lat': ('lat1', 'latitude1', 'from_lat'),
+    'lon': ('lon1', 'lng1', 'longitude1', 'from_lon'),
+    'lat2': ('lat2', 'latitude2', 'to_lat'),
+    'lon2': ('lon2', 'lng2', 'longitude2', 'to_lon'),
+}
+
+# ── worker side ─────────────────────────────────────────────
+
+_config = None
+
+
+def _init_worker(config):
+    global _config
+    _config = config
+
+
+def _floats(values):
+    try:
+        floats = [float(v) for v in values]
+    except (TypeError, ValueError):
+        return None
+    lat, lon = floats[0], floats[1]
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    if len(floats) == 4 and not (-90 <= floats[2] <= 90 and -180 <= floats[3] <= 180):
+        return None
+    return floats
+
+
+def _column(values):
+    """A float64 array when NumPy is installed, so the ``geo`` kernels take
+    their vectorised branch; the list as it is otherwise. Always a copy:
+    shared-memory views must stay releasable."""
+    return values if numpy is None else numpy.array(values, dtype=float)
+
+
+def _values(column):
+    # back to Python floats: cheaper to pickle and to format than numpy scalars
+    return column.tolist() if numpy is not None and isinstance(column, numpy.ndarray) else column
+
+
+def _compute(rows):
+    """For each row of raw coordinate fields, a list of ``(label, distance,
+    bearing)``; empty for an invalid row."""
+    cfg = _config
+    parsed = [_floats(r) for r in rows]
+    valid = [p for p in parsed if p is not None]
+    lats = [p[0] for p in valid]
+    lons = [p[1] for p in valid]
+    mode = cfg['mode']
+    if mode == 'pairs':
+        lats, lons = _column(lats), _column(lons)
+        lats2, lons2 = _column([p[2] for p in valid]), _column([p[3] for p in valid])
+        found = zip([None] * len(valid), _values(geo.haversine_pairs(lats, lons, lats2, lons2)),
+                    _values(geo.bearing_pairs(lats, lons, lats2, lons2)))
+        per_row = ([r] for r in found)
+    elif mode == 'nearest':
+        import jobs
+        ids, tlats, tlons, distances = jobs.nearest_many(*cfg['block'], lats, lons)
+        bearings = geo.bearing_pairs(_column(lats), _column(lons), _column(tlats), _column(tlons))
+        per_row = ([r] for r in zip(ids, distances, _values(bearings)))
+    else:
+        per_row = iter(list(_many(lats, lons)))
+    results = []
+    for p in parsed:
+        results.append(next(per_row) if p is not None else [])
+    return results
+
+
+def _many(lats, lons):
+    cfg = _config
+    if cfg['targets'] is not None:
+        labels, tlats, tlons = cfg['targets']
+        yield from _against(labels, _column(tlats), _column(tlons), lats, lons)
+        return
+    import jobs
+    with jobs.locations_columns(*cfg['block']) as (ids, tlats, tlons):
+        yield from _against(ids, _column(tlats), _column(tlons), lats, lons)
+
+
+def _against(labels, tlats, tlons, lats, lons):
+    # one row against every target: vectorised over the targets
+    for lat, lon in zip(lats, lons):
+        yield list(zip(labels, _values(geo.haversine_many(lat, lon, tlats, tlons)),
+                       _values(geo.bearing_many(lat, lon, tlats, tlons))))
+
+
+def _csv_chunk(text):
+    """CSV lines in, CSV lines out: ``(text, rows_out, invalid)``."""
+    cfg = _config
+    lines = text.splitlines()
+    columns, delimiter = cfg['columns'], cfg['delimiter']
+    rows = []
+    for fields in csv.reader(lines, delimiter=delimiter):
+        try:
+            rows.append([fields[c] for c in columns])
+        except IndexError:
+            rows.append([None] * len(columns))
+    labelled = cfg['mode'] != 'pairs'
+    out, invalid = [], 0
+    for line, results in zip(lines, _compute(rows)):
+        if not results:
+            invalid += 1
+            out.append(line + delimiter * (3 if labelled else 2))
+            continue
+        for label, distance, bearing in results:
+            extra = f'{distance:.3f}{delimiter}{bearing:.2f}'
+            out.append(f'{line}{delimiter}{label}{delimiter}{extra}' if labelled else f'{line}{delimiter}{extra}')
+    out.append('')
+    return '\n'.join(out), len(out) - 1, invalid
+
+
+def _columns_chunk(columns):
+    """Parquet path: coordinate columns in; ``(index, labels, distances,
+    bearings, invalid)`` out, ``index`` being the input row of each output
+    row."""
+    index, labels, distances, bearings, invalid = [], [], [], [], 0
+    for i, results in enumerate(_compute(list(zip(*columns)))):
+        if not results:
+            invalid += 1
+            results = [(None, None, None)]
+        for label, distance, bearing in results:
+            index.append(i)
+            labels.append(label)
+            distances.append(distance)
+            bearings.append(bearing)
+    return index, labels, distances, bearings, invalid
+
+
+# ── driver ──────────────────────────────────────────────────
+
+class _Inline:
+    """Executor stand-in for --workers 1: runs each chunk on submit."""
+
+    def __init__(self, config):
+        _init_worker(config)
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+    def shutdown(self):
+        pass
+
+
+class Progress:
+    def __init__(self, quiet=False):
+        self.start = self.last = time.perf_counter()
+        self.rows_in = self.rows_out = self.invalid = 0
+        self.quiet = quiet
+
+    def add(self, rows_in, rows_out, invalid):
+        self.rows_in += rows_in
+        self.rows_out += rows_out
+        self.invalid += invalid
+        now = time.perf_counter()
+        if not self.quiet and now - self.last >= 1:
+            self.last = now
+            sys.stderr.write(f'\r{self.rows_in:,} rows in, {self.rows_out:,} out, '
+                             f'{self.rows_in / (now - self.start):,.0f} rows/s')
+
+    def done(self):
+        elapsed = time.perf_counter() - self.start
+        sys.stderr.write(f'\r{self.rows_in:,} rows in, {self.rows_out:,} out, {self.invalid:,} invalid '
+                         f'in {elapsed:.2f} s: {self.rows_in / elapsed if elapsed else 0:,.0f} rows/s in, '
+                         f'{self.rows_out / elapsed if elapsed else 0:,.0f} rows/s out\n')
+
+
+def _pipeline(pool, fn, chunks, write, workers):
+    # in order, at most 2 chunks per worker in flight
+    pending = collections.deque()
+    for chunk, rows in chunks:
+        pending.append((pool.submit(fn, chunk), chunk, rows))
+        if len(pending) >= 2 * workers:
+            future, chunk, rows = pending.popleft()
+            write(future.result(), chunk, rows)
+    while pending:
+        future, chunk, rows = pending.popleft()
+        write(future.result(), chunk, rows)
+
+
+def find_columns(header, args):
+    defaults = PAIR_COLUMNS if args.mode == 'pairs' else POINT_COLUMNS
+    lowered = [h.strip().lower() for h in header]
+    columns = []
+    for name, candidates in defaults.items():
+        wanted = getattr(args, name)
+        if wanted:
+            candidates = (wanted.lower(),)
+        match = next((lowered.index(c) for c in candidates if c in lowered), None)
+        if match is None:
+            raise SystemExit(f'no {name} column in {header}; name it with --{name}')
+        columns.append(match)
+    return columns
+
+
+def run_csv(args, config, pool, progress):
+    src = sys.stdin if args.input == '-' else open(args.input, newline='', encoding='utf-8-sig')
+    out = sys.stdout if args.out == '-' else open(args.out, 'w', newline='', encoding='utf-8')
+    header_line = src.readline().rstrip('\r\n')
+    header = next(csv.reader([header_line], delimiter=args.delimiter))
+    config['columns'] = find_columns(header, args)
+    pool = pool(config)
+    extra = ['distance', 'bearing']
+    if args.mode != 'pairs':
+        extra.insert(0, 'target' if config.get('targets') else 'location_id')
+    out.write(args.delimiter.join([header_line] + extra) + '\n')
+
+    def chunks():
+        while True:
+            lines = [line for _, line in zip(range(args.chunk_rows), src)]
+            if not lines:
+                return
+            yield ''.join(lines), len(lines)
+
+    def write(result, chunk, rows):
+        text, rows_out, invalid = result
+        out.write(text)
+        progress.add(rows, rows_out, invalid)
+
+    try:
+        _pipeline(pool, _csv_chunk, chunks(), write, args.workers)
+    finally:
+        pool.shutdown()
+        if out is not sys.stdout:
+            out.close()
+
+
+def run_parquet(args, config, pool, progress):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit('Parquet files need pyarrow (pip install pyarrow)')
+    if args.out == '-' or not args.out.endswith('.parquet'):
+        raise SystemExit('Parquet input needs a .parquet --out')
+    source = pq.ParquetFile(args.input)
+    names = source.schema_arrow.names
+    columns = [names[i] for i in find_columns(names, args)]
+    pool = pool(config)
+    writer = None
+
+    def chunks():
+        for batch in source.iter_batches(batch_size=args.chunk_rows):
+            yield [batch.column(name).to_pylist() for name in columns], batch
+
+    def write(result, chunk, batch):
+        nonlocal writer
+        index, labels, distances, bearings, invalid = result
+        table = pa.Table.from_batches([batch])
+        if len(index) != batch.num_rows:
+            table = table.take(pa.array(index))
+        if args.mode != 'pairs':
+            table = table.append_column('target' if config.get('targets') else 'location_id',
+                                        pa.array(labels, pa.int64()))
+        table = table.append_column('distance', pa.array(distances, pa.float64()))
+        table = table.append_column('bearing', pa.array(bearings, pa.float64()))
+        if writer is None:
+            writer = pq.ParquetWriter(args.out, table.schema)
+        writer.write_table(table)
+        progress.add(batch.num_rows, len(index), invalid)
+
+    try:
+        _pipeline(pool, _columns_chunk, chunks(), write, args.workers)
+    finally:
+        pool.shutdown()
+        if writer is not None:
+            writer.close()
+
+
+def parse_target(text):
+    try:
+        lat, lon = (float(v) for v in text.split(','))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'expected LAT,LON, got {text!r}')
+    return lat, lon
+
+
+def glue_targets(argv):
+    """``--target -7,107`` as ``--target=-7,107``: argparse takes a value
+    starting with ``-`` for an option unless it is a plain number."""
+    out = []
+    for arg in argv:
+        if out and out[-1] == '--target' and arg.startswith('-') and ',' in arg:
+            out[-1] = f'--target={arg}'
+        else:
+            out.append(arg)
+    return out
+
+
+def main(argv=None):
+    from concurrent.futures import ProcessPoolExecutor
+    import jobs
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    p.add_argument('mode', choices=('pairs', 'many', 'nearest'))
+    p.add_argument('input', help='CSV file (or - for stdin) or .parquet file')
+    p.add_argument('--out', default='-', help='output file (default stdout)')
+    p.add_argument('--target', action='append', type=parse_target, metavar='LAT,LON',
+                   help='many: a target point (repeatable)')
+    p.add_argument('--locations', action='store_true', help='many: every stored location')
+    p.add_argument('--db', default='locations.db')
+    for name in ('lat', 'lon', 'lat2', 'lon2'):
+        p.add_argument(f'--{name}', help=f'name of the {name} column')
+    p.add_argument('--delimiter', default=',')
+    p.add_argument('--chunk-rows', type=int, default=50_000)
+    p.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    p.add_argument('--quiet', action='store_true', help='only the final summary on stderr')
+    args = p.parse_args(glue_targets(sys.argv[1:] if argv is None else argv))
+
+    config = dict(mode=args.mode, delimiter=args.delimiter, targets=None, block=None)
+    block = None
+    if args.mode == 'many':
+        if bool(args.target) == args.locations:
+            p.error('many needs either --target LAT,LON (repeatable) or --locations')
+        if args.target:
+            config['targets'] = (list(range(len(args.target))), [t[0] for t in args.target],
+                                 [t[1] for t in args.target])
+    elif args.target or args.locations:
+        p.error('--target and --locations only apply to many')
+    if args.mode == 'nearest' or args.locations:
+        if not os.path.exists(args.db):
+            raise SystemExit(f'{args.db} not found')
+        name, count, _ = block = jobs.build_locations(os.path.abspath(args.db))
+        if not count:
+            jobs.unlink_block(name)
+            raise SystemExit(f'{args.db} has no locations')
+        config['block'] = (name, count)
+    # a row fans out to this many output rows in many mode
+    fan_out = len(args.target) if args.target else (block[1] if args.locations else 1)
+    args.chunk_rows = max(1, args.chunk_rows // fan_out)
+
+    def pool(config):
+        if args.workers <= 1:
+            return _Inline(config)
+        return ProcessPoolExecutor(args.workers, initializer=_init_worker, initargs=(config,))
+
+    progress = Progress(args.quiet)
+    try:
+        if args.input.endswith('.parquet'):
+            run_parquet(args, config, pool, progress)
+        else:
+            run_csv(args, config, pool, progress)
+    finally:
+        if block is not None:
+            jobs.unlink_block(block[0])
+    progress.done()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+"""Density heatmap of where devices spend time.
+
+Every accepted fix credits the seconds since the device's previous fix
+(at most ``MAX_DWELL``) to the previous position, so the map shows time
+spent rather than fixes sent: a parked phone that reports once a minute
+(see ``tracking.advise``) weighs as much as one reporting every second.
+
+The grid has a level for every zoom up to ``MAX_ZOOM``. A cell is
+``CELL_PX`` screen pixels of a map tile at that zoom, so a tile covers
+``CELLS`` x ``CELLS`` cells, about 5 m across at zoom 17 on Java and a
+few kilometres at zoom 8. Cells live in ``heat_cells`` in their own
+database (``HEAT_DB``, default ``heat.db``), away from the locations
+table's write lock.
+
+Incremental: fixes are binned at the finest level in memory. Every
+``FLUSH_INTERVAL`` seconds, or before a tile is drawn, the buffer is
+rolled up to every level and added to ``heat_cells`` in one
+transaction. Each tile that got new data (or whose neighbour did, next
+to their shared edge, because of the blur) gets a new generation in
+``heat_tiles``.
+
+``/heat/<z>/<x>/<y>.png`` draws a tile from its cells and the ring
+around it: 3x3 blur, log scale saturating at ``SATURATION`` seconds per
+cell at ``MAX_ZOOM`` and twice that per zoom out, 8-bit palette PNG.
+Drawn tiles are kept in memory by generation, so only tiles with new
+data are drawn again; the generation is also the ETag.
+"""
+import math
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+
+from flask import Response, jsonify, request
+
+from tiles import TileCache
+
+MAX_ZOOM = 17
+CELL_PX = 4
+CELLS = 256 // CELL_PX
+MAX_DWELL = 120.0       # seconds; a longer gap is more likely lost signal than standing still
+SATURATION = 3600.0     # seconds in one MAX_ZOOM cell for full colour
+FLUSH_INTERVAL = 5.0
+MAX_PENDING = 50000     # buffered cells that force a flush
+MAX_LAT = 85.0511287798
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS heat_cells (
+    z INTEGER NOT NULL, tx INTEGER NOT NULL, ty INTEGER NOT NULL,
+    cx INTEGER NOT NULL, cy INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    fixes INTEGER NOT NULL,
+    PRIMARY KEY (z, tx, ty, cx, cy)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS heat_tiles (
+    z INTEGER NOT NULL, tx INTEGER NOT NULL, ty INTEGER NOT NULL,
+    generation INTEGER NOT NULL,
+    PRIMARY KEY (z, tx, ty)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS heat_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+'''
+
+
+def _palette():
+    # Index 0 transparent, then blue -> cyan -> green -> yellow -> red, more opaque as it heats up.
+    stops = [(0.0, (0, 0, 255)), (0.25, (0, 255, 255)), (0.5, (0, 255, 0)),
+             (0.75, (255, 255, 0)), (1.0, (255, 0, 0))]
+    rgb, alpha = bytearray(3), bytearray(1)
+    for i in range(1, 256):
+        t = i / 255
+        for (t0, c0), (t1, c1) in zip(stops, stops[1:]):
+            if t <= t1:
+                f = (t - t0) / (t1 - t0)
+                rgb += bytes(round(a + (b - a) * f) for a, b in zip(c0, c1))
+                break
+        alpha.append(round(90 + 130 * t))
+    return bytes(rgb), bytes(alpha)
+
+
+PLTE, TRNS = _palette()
+
+
+def _chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def encode_png(rows):
+    """256x256 palette PNG from ``CELLS`` rows of ``CELLS`` palette indexes."""
+    lines = []
+    for row in rows:
+        line = b'\x00' + b''.join(bytes((i,)) * CELL_PX for i in row)
+        lines.extend([line] * CELL_PX)
+    return (b'\x89PNG\r\n\x1a\n'
+            + _chunk(b'IHDR', struct.pack('>IIBBBBB', 256, 256, 8, 3, 0, 0, 0))
+            + _chunk(b'PLTE', PLTE) + _chunk(b'tRNS', TRNS)
+            + _chunk(b'IDAT', zlib.compress(b''.join(lines), 6)) + _chunk(b'IEND', b''))
+
+
+EMPTY_PNG = encode_png([[0] * CELLS] * CELLS)
+
+
+def cell_of(lat, lon):
+    """Global cell ``(gx, gy)`` at ``MAX_ZOOM``."""
+    scale = CELLS << MAX_ZOOM
+    s = math.sin(math.radians(min(max(lat, -MAX_LAT), MAX_LAT)))
+    gx = int((lon + 180.0) / 360.0 * scale)
+    gy = int((0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)) * scale)
+    return min(max(gx, 0), scale - 1), min(max(gy, 0), scale - 1)
+
+
+class HeatGrid:
+    def __init__(self, db=None, prefix='/heat', cache_bytes=16 << 20):
+        self.db = db
+        self.prefix = prefix
+        self.pending = {}       # (gx, gy) at MAX_ZOOM -> [seconds, fixes]
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.last_flush = time.monotonic()
+        self.cache = TileCache(cache_bytes)
+        self.schema_ready = False
+        self.flushes = self.drawn = 0
+
+    def connect(self):
+        conn = sqlite3.connect(self.db)
+        if not self.schema_ready:
+            conn.executescript(SCHEMA)
+            self.schema_ready = True
+        return conn
+
+    def add(self, lat, lon, seconds):
+        """Credit ``seconds`` at a position (``SessionRegistry.on_fix``)."""
+        key = cell_of(lat, lon)
+        with self.lock:
+            cell = self.pending.get(key)
+            if cell is None:
+                self.pending[key] = [min(seconds, MAX_DWELL), 1]
+            else:
+                cell[0] += min(seconds, MAX_DWELL)
+                cell[1] += 1
+            due = (len(self.pending) >= MAX_PENDING
+                   or time.monotonic() - self.last_flush >= FLUSH_INTERVAL)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Roll the buffered cells up to every level and write them out;
+        returns the number of tiles that changed."""
+        with self.flush_lock:
+            with self.lock:
+                pending, self.pending = self.pending, {}
+                self.last_flush = time.monotonic()
+            if not pending:
+                return 0
+            rows, touched = [], set()
+            level = pending
+            for z in range(MAX_ZOOM, -1, -1):
+                if z < MAX_ZOOM:
+                    coarser = {}
+                    for (gx, gy), (seconds, fixes) in level.items():
+                        cell = coarser.get((gx >> 1, gy >> 1))
+                        if cell is None:
+                            coarser[gx >> 1, gy >> 1] = [seconds, fixes]
+                        else:
+                            cell[0] += seconds
+                            cell[1] += fixes
+                    level = coarser
+                last = (1 << z) - 1
+                for (gx, gy), (seconds, fixes) in level.items():
+                    tx, cx = divmod(gx, CELLS)
+                    ty, cy = divmod(gy, CELLS)
+                    rows.append((z, tx, ty, cx, cy, seconds, fixes))
+                    # The blur reaches one cell into the neighbouring tiles.
+                    xs = (tx - (cx == 0), tx, tx + (cx == CELLS - 1))
+                    ys = (ty - (cy == 0), ty, ty + (cy == CELLS - 1))
+                    touched.update((z, x, y) for x in xs for y in ys if 0 <= x <= last and 0 <= y <= last)
+            with self.connect() as conn:
+                # Write lock first: two processes must not hand out the same generation.
+                conn.execute('BEGIN IMMEDIATE')
+                generation = conn.execute(
+                    "SELECT value FROM heat_meta WHERE key = 'generation'").fetchone()
+                generation = (generation[0] if generation else 0) + 1
+                conn.execute("INSERT OR REPLACE INTO heat_meta (key, value) VALUES ('generation', ?)",
+                             (generation,))
+                conn.executemany('''
+                    INSERT INTO heat_cells (z, tx, ty, cx, cy, seconds, fixes) VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (z, tx, ty, cx, cy)
+                    DO UPDATE SET seconds = seconds + excluded.seconds, fixes = fixes + excluded.fixes
+                ''', rows)
+                conn.executemany('INSERT OR REPLACE INTO heat_tiles (z, tx, ty, generation) VALUES (?, ?, ?, ?)',
+                                 ((z, x, y, generation) for z, x, y in touched))
+            self.flushes += 1
+            return len(touched)
+
+    def generation(self, conn, z, x, y):
+        row = conn.execute('SELECT generation FROM heat_tiles WHERE z = ? AND tx = ? AND ty = ?',
+                           (z, x, y)).fetchone()
+        return row[0] if row else None
+
+    def draw(self, conn, z, x, y):
+        # Cells of the tile plus a one-cell ring from its neighbours, for the blur.
+        size = CELLS + 2
+        grid = [[0.0] * size for _ in range(size)]
+        for dx in (-1, 0, 1):
+            for ty, cx, cy, seconds in conn.execute('''
+                SELECT ty, cx, cy, seconds FROM heat_cells
+                WHERE z = ? AND tx = ? AND ty BETWEEN ? AND ?
+            ''', (z, x + dx, y - 1, y + 1)):
+                gx = dx * CELLS + cx + 1
+                gy = (ty - y) * CELLS + cy + 1
+                if 0 <= gx < size and 0 <= gy < size:
+                    grid[gy][gx] = seconds
+        scale = 1 / math.log1p(SATURATION * 2 ** (MAX_ZOOM - z))
+        log1p = math.log1p
+        rows = []
+        for j in range(1, size - 1):
+            above, here, below = grid[j - 1], grid[j], grid[j + 1]
+            row = []
+            for i in range(1, size - 1):
+                v = (above[i - 1] + 2 * above[i] + above[i + 1]
+                     + 2 * here[i - 1] + 4 * here[i] + 2 * here[i + 1]
+                     + below[i - 1] + 2 * below[i] + below[i + 1]) / 16
+                row.append(0 if v <= 0 else min(255, 1 + int(254 * log1p(v) * scale)))
+            rows.append(row)
+        return encode_png(rows)
+
+    def tile(self, z, x, y):
+        """``(png, generation)``; generation is None for a tile without data."""
+        self.flush()
+        with self.connect() as conn:
+            generation = self.generation(conn, z, x, y)
+            if generation is None:
+                return EMPTY_PNG, None
+            key = (z, x, y, generation)
+            data = self.cache.get(key)
+            if data is None:
+                data = self.draw(conn, z, x, y)
+                self.drawn += 1
+                self.cache.put(key, data)
+        return data, generation
+
+    def stats(self):
+        with self.connect() as conn:
+            cells = conn.execute('SELECT COUNT(*), SUM(seconds), SUM(fixes) FROM heat_cells WHERE z = ?',
+                                 (MAX_ZOOM,)).fetchone()
+        return dict(cells=cells[0], seconds=cells[1] or 0, fixes=cells[2] or 0,
+                    pending=len(self.pending), flushes=self.flushes, drawn=self.drawn,
+                    cache=self.cache.stats())
+
+    def serve(self, z, x, y):
+        if not (0 <= z <= MAX_ZOOM and 0 <= x < 1 << z and 0 <= y < 1 << z):
+            return Response('Tile out of range', status=404)
+        data, generation = self.tile(z, x, y)
+        resp = Response(data, mimetype='image/png')
+        resp.headers['Cache-Control'] = 'no-cache'
+        resp.set_etag(f'{z}-{x}-{y}-{generation or 0}')
+        return resp.make_conditional(request)
+
+    def init_app(self, app):
+        if self.db is None:
+            self.db = app.config.get('HEAT_DB', 'heat.db')
+        app.add_url_rule(self.prefix, 'heat_stats', lambda: jsonify(dict(self.stats(), maxzoom=MAX_ZOOM)))
+        app.add_url_rule(self.prefix + '/<int:z>/<int:x>/<int:y>.png', 'heat_tile', self.serve)
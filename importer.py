@@ -0,0 +1,243 @@
+"""Import target locations from GPX waypoints and KML/KMZ placemarks.
+
+    python importer.py FILE [FILE ...] [--db locations.db] [--min-distance 10]
+
+Files are parsed incrementally (``iterparse``) and every element is
+dropped from the tree once closed (a waypoint once read), so a file of
+hundreds of MB, tracks included, needs only a few KB of parser state. Rows go into ``locations`` in batches of
+``BATCH_SIZE``, each batch in its own transaction, so the change log and
+search index triggers fire as usual and a crash keeps what was done; a
+file that turns out broken halfway reports how much it committed.
+
+A point closer than ``min_distance`` metres to an existing location, or
+to one imported earlier from the same file, is skipped. Lookups use a
+grid of ``min_distance``-sized cells, so the check stays O(1) per point.
+"""
+import argparse
+import math
+import os
+import sys
+import xml.etree.ElementTree as ET
+import zipfile
+
+from geo import haversine
+
+BATCH_SIZE = 1000
+M_PER_DEG = 111_320
+
+
+class WaypointError(ValueError):
+    """Unreadable input. Raised by ``import_waypoints`` it carries the
+    ``stats`` so far and the ``last_id`` committed: earlier batches stay."""
+
+    def __init__(self, message, stats=None, last_id=None):
+        super().__init__(message)
+        self.stats = stats
+        self.last_id = last_id
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _text(el, name):
+    for child in el:
+        if _local(child.tag) == name:
+            return (child.text or '').strip()
+    return ''
+
+
+def _waypoint(el, n):
+    kind = _local(el.tag)
+    if kind == 'wpt':
+        try:
+            lat, lon = float(el.get('lat')), float(el.get('lon'))
+        except (TypeError, ValueError):
+            return None
+        return _text(el, 'name') or f'Waypoint {n}', lat, lon
+    # KML Placemark: only <Point>s are targets; tracks and polygons are not.
+    point = next((c for c in el.iter() if _local(c.tag) == 'Point'), None)
+    if point is None:
+        return None
+    coords = _text(point, 'coordinates').split(',')
+    try:
+        lon, lat = float(coords[0]), float(coords[1])
+    except (IndexError, ValueError):
+        return None
+    return _text(el, 'name') or f'Placemark {n}', lat, lon
+
+
+def read_waypoints(f):
+    """Yield ``(name, lat, lon)`` or ``None`` for an unusable entry, from a
+    GPX or KML stream."""
+    open_elements = []
+    inside = 0      # open <wpt>/<Placemark>s: their children are still needed
+    n = 0
+    try:
+        for event, el in ET.iterparse(f, events=('start', 'end')):
+            is_point = _local(el.tag) in ('wpt', 'Placemark')
+            if event == 'start':
+                open_elements.append(el)
+                inside += is_point
+                continue
+            open_elements.pop()
+            if is_point:
+                inside -= 1
+                n += 1
+                yield _waypoint(el, n)
+            elif inside:
+                continue
+            # Everything else (<trkpt>s, <LineString>s, ...) goes as soon as it
+            # is closed too, or a track-heavy file is kept whole in memory.
+            el.clear()
+            if open_elements:
+                open_elements[-1].remove(el)
+    except ET.ParseError as e:
+        raise WaypointError(f'not a GPX/KML file: {e}')
+
+
+class Counting:
+    """File wrapper counting bytes read, for progress reports."""
+
+    def __init__(self, f):
+        self.f = f
+        self.read_bytes = 0
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.read_bytes += len(data)
+        return data
+
+
+class Grid:
+    """Points bucketed by ``cell`` metres; answers "anything within cell?"."""
+
+    def __init__(self, cell):
+        self.cell = cell
+        self.cells = {}
+
+    def _yx(self, lat, lon):
+        return int(math.floor(lat * M_PER_DEG / self.cell)), int(math.floor(lon * M_PER_DEG / self.cell))
+
+    def add(self, lat, lon):
+        # int keys and flat [lat, lon, lat, lon, ...] cells: no tuples per point
+        y, x = self._yx(lat, lon)
+        self.cells.setdefault((y << 32) + x, []).extend((lat, lon))
+
+    def near(self, lat, lon):
+        y, x = self._yx(lat, lon)
+        # A degree of longitude shrinks with latitude, so scan wider in x.
+        reach = int(math.ceil(1 / max(math.cos(math.radians(lat)), 0.01)))
+        for dy in (-1, 0, 1):
+            for dx in range(-reach, reach + 1):
+                points = self.cells.get(((y + dy) << 32) + x + dx, ())
+                for i in range(0, len(points), 2):
+                    if haversine(lat, lon, points[i], points[i + 1]) <= self.cell:
+                        return True
+        return False
+
+
+def import_waypoints(conn, f, min_distance=10.0, progress=None):
+    """Import one GPX/KML stream into ``locations``; return counts of
+    ``imported``, ``skipped`` (duplicates) and ``invalid`` entries.
+
+    ``conn`` must be in autocommit mode (``isolation_level=None``).
+    ``progress(stats)`` is called after every committed batch.
+    """
+    grid = None
+    if min_distance > 0:
+        grid = Grid(min_distance)
+        for lat, lon in conn.execute('SELECT latitude, longitude FROM locations'):
+            grid.add(lat, lon)
+    stats = dict(imported=0, skipped=0, invalid=0)
+    batch = []
+    last_id = None
+
+    def flush():
+        nonlocal last_id
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany('INSERT INTO locations(name, latitude, longitude) VALUES(?, ?, ?)', batch)
+            id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        last_id = id
+        stats['imported'] += len(batch)
+        batch.clear()
+        if progress:
+            progress(stats)
+
+    try:
+        for point in read_waypoints(f):
+            if point is None or not (-90 <= point[1] <= 90 and -180 <= point[2] <= 180):
+                stats['invalid'] += 1
+                continue
+            name, lat, lon = point
+            if grid is not None:
+                if grid.near(lat, lon):
+                    stats['skipped'] += 1
+                    continue
+                grid.add(lat, lon)
+            batch.append((name, lat, lon))
+            if len(batch) >= BATCH_SIZE:
+                flush()
+    except (WaypointError, zipfile.BadZipFile) as e:
+        # the pending batch is dropped, the committed ones stay
+        raise WaypointError(str(e), stats, last_id) from e
+    if batch:
+        flush()
+    return stats
+
+
+def open_source(path_or_file, filename=None):
+    """Return a binary stream of the XML document; KMZ archives are opened
+    at their first ``.kml`` member without extracting to disk."""
+    if isinstance(path_or_file, str):
+        name, f = filename or path_or_file, open(path_or_file, 'rb')
+    else:
+        name, f = filename or getattr(path_or_file, 'name', ''), path_or_file
+    name = (name or '').lower()
+    if name.endswith('.kmz'):
+        archive = zipfile.ZipFile(f)
+        member = next((m for m in archive.namelist() if m.lower().endswith('.kml')), None)
+        if member is None:
+            raise WaypointError('KMZ archive has no .kml document')
+        return archive.open(member)
+    return f
+
+
+def main():
+    import sqlite3
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    p.add_argument('files', nargs='+')
+    p.add_argument('--db', default='locations.db')
+    p.add_argument('--min-distance', type=float, default=10.0,
+                   help='skip points closer than this many metres to a known one (0 = keep all)')
+    args = p.parse_args()
+    conn = sqlite3.connect(args.db, isolation_level=None)
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'locations'").fetchone():
+        raise SystemExit(f'{args.db} has no locations table; start the app once to create it')
+    for path in args.files:
+        size = os.path.getsize(path)
+        src = Counting(open_source(path))
+        name = os.path.basename(path)
+
+        def report(stats, final=False):
+            done = src.read_bytes / size * 100 if size and not path.lower().endswith('.kmz') else None
+            pct = f'{done:5.1f}% ' if done is not None else ''
+            sys.stderr.write(f'\r{name}: {pct}{stats["imported"]} imported, '
+                             f'{stats["skipped"]} duplicates, {stats["invalid"]} invalid'
+                             + ('\n' if final else ''))
+
+        try:
+            stats = import_waypoints(conn, src, args.min_distance, report)
+        except (WaypointError, zipfile.BadZipFile) as e:
+            sys.stderr.write(f'\n{name}: {e}\n')
+            continue
+        report(stats, final=True)
+
+
+if __name__ == '__main__':
+    main()
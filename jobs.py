@@ -0,0 +1,552 @@
+"""Heavy geodesic jobs on a process pool.
+
+Distance matrices and nearest-target joins over every location are
+pure-Python loops of millions of haversines. Run inside a request they
+would hold the GIL for seconds and stall every tracking route in the
+server. ``JobManager`` runs them in worker processes instead:
+
+* Coordinates go through ``multiprocessing.shared_memory``, never
+  pickles. A worker copies ``locations`` into a shared block once per
+  dataset version, and every worker maps that block by name. A job's
+  input points and its results are shared blocks too. The only things
+  pickled are block names and index ranges.
+* A job is split into about ``CHUNKS_PER_WORKER`` ranges per core, and
+  each chunk writes its slice of the result in place.
+* The server process only submits chunks and counts them as they
+  finish, so it barely touches the GIL while a job runs. Workers run at
+  ``JOB_NICE``, and by default one core is left to the server, so
+  requests also win when they compete for CPU.
+
+Clients get a job id. They can poll ``Job.status()``, page through
+``JobManager.rows()`` once the job is done, or follow
+``JobManager.stream()``, which yields rows as chunks complete.
+
+Kinds:
+
+``nearest``  for each point (e.g. a recorded track), the nearest location
+             and its distance
+``matrix``   distance from each point to each of ``targets`` (location
+             ids, default every location in id order)
+
+Workers come from the ``forkserver`` start method because the server is
+multi-threaded, and ``fork()`` would copy whatever locks its other
+threads hold. Each worker imports the main script once when it starts.
+"""
+import bisect
+import contextlib
+import functools
+import itertools
+import math
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+from changelog import current_version
+from geo import EARTH_RADIUS as R, haversine
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+CELL = 0.01                 # degrees; row height of the spatial sort
+SEARCH_RADIUS = 1000.0      # metres, first ring of the nearest search
+CHUNKS_PER_WORKER = 4
+MAX_MATRIX_CELLS = 5_000_000
+JOB_TTL = 600               # seconds a finished job's result is kept
+JOB_NICE = 10               # workers yield the CPU to the web server
+KINDS = ('nearest', 'matrix')
+
+# Locations block for n rows, every column 8 bytes per row:
+#   ids int64 (ascending), lats, lons float64,
+#   order int64: slots sorted by (cell row, lon),
+#   cells int64 / slons float64: cell row and lon of order[k]
+LOCATION_CODES = 'qddqqd'
+
+
+class JobError(ValueError):
+    pass
+
+
+# ── worker side ─────────────────────────────────────────────
+
+_attached = {}   # locations blocks mapped in this worker, newest last
+
+
+def _init_worker(server):
+    if hasattr(os, 'nice'):
+        os.nice(JOB_NICE)
+    # A server killed without shutting the pool down leaves its workers
+    # blocked on the task queue for good; go down with it instead.
+    threading.Thread(target=_watch_server, args=(server,), daemon=True).start()
+
+
+def _watch_server(pid):
+    while True:
+        time.sleep(1)
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            os._exit(0)
+        except PermissionError:
+            pass
+
+
+def _views(buf, n, codes):
+    return [buf[i * 8 * n:(i + 1) * 8 * n].cast(code) for i, code in enumerate(codes)]
+
+
+@contextlib.contextmanager
+def _columns(name, n, codes, keep=False):
+    # keep=True caches the mapping (locations blocks, reused by every
+    # chunk); per-job blocks are unmapped again after the chunk.
+    shm = _attached.pop(name, None) or SharedMemory(name)
+    views = _views(shm.buf, n, codes)
+    try:
+        yield views
+    finally:
+        for view in views:
+            view.release()
+        if keep:
+            _attached[name] = shm
+            while len(_attached) > 2:
+                _attached.pop(next(iter(_attached))).close()
+        else:
+            shm.close()
+
+
+def build_locations(db):
+    """Copy ``locations`` into a new shared block; return
+    ``(name, count, version)``. The caller owns (and unlinks) the block."""
+    conn = sqlite3.connect(db)
+    try:
+        conn.execute('BEGIN')   # rows and version from one snapshot
+        version = current_version(conn)
+        ids, lats, lons = array('q'), array('d'), array('d')
+        for id, lat, lon in conn.execute('SELECT id, latitude, longitude FROM locations ORDER BY id'):
+            ids.append(id)
+            lats.append(lat)
+            lons.append(lon)
+        conn.execute('COMMIT')
+    finally:
+        conn.close()
+    n = len(ids)
+    rows = [math.floor(lat / CELL) for lat in lats]
+    order = array('q', sorted(range(n), key=lambda s: (rows[s], lons[s])))
+    cells = array('q', (rows[s] for s in order))
+    slons = array('d', (lons[s] for s in order))
+    shm = SharedMemory(create=True, size=max(1, 48 * n))
+    for i, column in enumerate((ids, lats, lons, order, cells, slons)):
+        shm.buf[i * 8 * n:(i + 1) * 8 * n] = memoryview(column).cast('B')
+    name = shm.name
+    shm.close()
+    return name, n, version
+
+
+def _lon_ranges(lon, dlon):
+    if dlon >= 180:
+        return ((-math.inf, math.inf),)
+    ranges = [(lon - dlon, lon + dlon)]
+    if lon - dlon < -180:
+        ranges.append((lon - dlon + 360, math.inf))
+    if lon + dlon > 180:
+        ranges.append((-math.inf, lon + dlon - 360))
+    return ranges
+
+
+def _nearest(lat, lon, lats, lons, order, cells, slons):
+    """Slot of the location nearest to ``(lat, lon)`` and its distance.
+
+    Searches the bounding box of a circle, widening it 4x until the box
+    holds a location within the radius (and so the nearest one)."""
+    n = len(order)
+    radius = SEARCH_RADIUS
+    while True:
+        dlat = math.degrees(radius / R)
+        if abs(lat) + dlat >= 90:
+            dlon = 180.0
+        else:
+            # widest longitude span of the circle (spherical cap)
+            dlon = math.degrees(math.asin(min(1.0, math.sin(radius / R) / math.cos(math.radians(lat)))))
+        best, best_d = -1, radius
+        first, last = math.floor((lat - dlat) / CELL), math.floor((lat + dlat) / CELL)
+        for lo, hi in _lon_ranges(lon, dlon):
+            k = bisect.bisect_left(cells, first)
+            while k < n and cells[k] <= last:
+                end = bisect.bisect_right(cells, cells[k], k)
+                a = bisect.bisect_left(slons, lo, k, end)
+                for j in range(a, bisect.bisect_right(slons, hi, a, end)):
+                    s = order[j]
+                    d = haversine(lat, lon, lats[s], lons[s])
+                    if d <= best_d:
+                        best, best_d = s, d
+                k = end
+        if best >= 0 or dlat >= 180:
+            return best, best_d
+        radius *= 4
+
+
+def locations_columns(name, n):
+    """``(ids, lats, lons)`` of a block made by ``build_locations``, as a
+    context manager; the mapping stays cached in this process."""
+    return _columns(name, n, 'qdd', keep=True)
+
+
+def nearest_many(locations, n, lats, lons):
+    """``(ids, lats, lons, distances)`` lists: the location nearest to each
+    point, searched in a block made by ``build_locations``."""
+    found = ([], [], [], [])
+    with _columns(locations, n, LOCATION_CODES, keep=True) as (ids, tlats, tlons, order, cells, slons):
+        for lat, lon in zip(lats, lons):
+            s, d = _nearest(lat, lon, tlats, tlons, order, cells, slons)
+            found[0].append(ids[s])
+            found[1].append(tlats[s])
+            found[2].append(tlons[s])
+            found[3].append(d)
+    return found
+
+
+def _nearest_chunk(locations, n, points, p, start, stop, out):
+    with _columns(locations, n, LOCATION_CODES, keep=True) as (ids, lats, lons, order, cells, slons), \
+            _columns(points, p, 'dd') as (plats, plons), \
+            _columns(out, p, 'qd') as (found, distances):
+        for i in range(start, stop):
+            s, d = _nearest(plats[i], plons[i], lats, lons, order, cells, slons)
+            found[i], distances[i] = ids[s], d
+
+
+def _matrix_chunk(locations, n, points, p, targets, q, start, stop, out):
+    with _columns(locations, n, 'qdd', keep=True) as (ids, lats, lons), \
+            _columns(points, p, 'dd') as (plats, plons):
+        origins = [(math.radians(plats[i]), math.radians(plons[i])) for i in range(start, stop)]
+        if targets is None:
+            tlats, tlons = array('d', lats), array('d', lons)
+        else:
+            with _columns(targets, q, 'q') as (tids,):
+                slots = [bisect.bisect_left(ids, id) for id in tids]
+                slots = [s if s < n and ids[s] == id else -1 for s, id in zip(slots, tids)]
+            # unknown ids come out as NaN
+            tlats = array('d', (lats[s] if s >= 0 else math.nan for s in slots))
+            tlons = array('d', (lons[s] if s >= 0 else math.nan for s in slots))
+    with _columns(out, p * q, 'd') as (result,):
+        if numpy is not None:
+            φ2, λ2 = numpy.radians(numpy.frombuffer(tlats)), numpy.radians(numpy.frombuffer(tlons))
+            cos2 = numpy.cos(φ2)
+            rows = numpy.frombuffer(result, numpy.float64).reshape(p, q)
+            for i, (φ1, λ1) in enumerate(origins, start):
+                a = numpy.sin((φ2 - φ1) / 2) ** 2 + math.cos(φ1) * cos2 * numpy.sin((λ2 - λ1) / 2) ** 2
+                rows[i] = 2 * R * numpy.arcsin(numpy.sqrt(numpy.minimum(a, 1.0)))
+            del rows
+            return
+        sin, cos, asin, sqrt = math.sin, math.cos, math.asin, math.sqrt
+        φ2 = [math.radians(lat) for lat in tlats]
+        λ2 = [math.radians(lon) for lon in tlons]
+        cos2 = [cos(φ) for φ in φ2]
+        missing = [j for j, lat in enumerate(tlats) if lat != lat]
+        for i, (φ1, λ1) in enumerate(origins, start):
+            cos1 = cos(φ1)
+            row = array('d', (2 * R * asin(sqrt(min(1.0, sin((b - φ1) / 2) ** 2 + cos1 * c * sin((l - λ1) / 2) ** 2)))
+                              for b, l, c in zip(φ2, λ2, cos2)))
+            for j in missing:
+                row[j] = math.nan
+            result[i * q:(i + 1) * q] = row
+
+
+# ── server side ─────────────────────────────────────────────
+
+def _share(*columns):
+    # equal-length 8-byte arrays -> one new shared block
+    n = len(columns[0])
+    shm = SharedMemory(create=True, size=max(1, 8 * n * len(columns)))
+    for i, column in enumerate(columns):
+        shm.buf[i * 8 * n:(i + 1) * 8 * n] = memoryview(column).cast('B')
+    return shm
+
+
+def unlink_block(name):
+    try:
+        shm = SharedMemory(name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+class LocationsBlock:
+    def __init__(self, name, count, version):
+        self.name, self.count, self.version = name, count, version
+        self.users = 0
+        self.retired = False
+
+
+class Job:
+    def __init__(self, id, kind, lats, lons, targets, version):
+        self.id, self.kind = id, kind
+        self.count = len(lats)
+        self.targets = targets       # matrix: location ids, None = all
+        self.width = len(targets) if targets else None
+        self.version = version       # dataset version the job needs at least
+        self.state = 'queued'
+        self.error = None
+        self.points = _share(lats, lons)
+        self.target_block = _share(array('q', targets)) if targets else None
+        self.out = None
+        self.results = None          # memoryviews over out
+        self.locations = None
+        self.chunks = 0
+        self.futures = []
+        self.completed = []          # (start, stop) in completion order
+        self.done = 0
+        self.created = time.time()
+        self.finished = None
+
+    @property
+    def running(self):
+        return self.state in ('queued', 'running')
+
+    def status(self):
+        elapsed = (self.finished or time.time()) - self.created
+        return dict(id=self.id, kind=self.kind, status=self.state, points=self.count,
+                    targets=self.width, done=self.done,
+                    progress=round(self.done / self.count, 4), error=self.error,
+                    version=self.locations.version if self.locations else None,
+                    elapsed=round(elapsed, 3))
+
+
+class JobManager:
+    """Jobs keyed by id. All state changes happen under ``lock``; chunk
+    callbacks run on the executor's management thread."""
+
+    def __init__(self, db='locations.db', workers=None, ttl=JOB_TTL):
+        self.db = db
+        self.workers = workers or max(1, (os.cpu_count() or 1) - 1)
+        self.ttl = ttl
+        self.lock = threading.RLock()   # re-entered by callbacks of futures already done
+        self.changed = threading.Condition(self.lock)
+        self.jobs = {}
+        self.ids = itertools.count(1)
+        self.pool = None
+        self.locations = None
+        self.building = None            # future of a locations block build
+        self.waiting = []
+
+    def _executor(self):
+        if self.pool is None:
+            ctx = None
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                ctx = multiprocessing.get_context('forkserver')
+                ctx.set_forkserver_preload(['jobs'])
+            self.pool = ProcessPoolExecutor(self.workers, mp_context=ctx,
+                                            initializer=_init_worker, initargs=(os.getpid(),))
+        return self.pool
+
+    def submit(self, kind, points, targets=None):
+        """Start a job; ``points`` is a list of ``[lat, lon]``. Raises
+        ``JobError`` for bad input."""
+        if kind not in KINDS:
+            raise JobError(f"kind must be one of {', '.join(KINDS)}")
+        if not points:
+            raise JobError("points must be a non-empty list of [lat, lon]")
+        lats, lons = array('d'), array('d')
+        try:
+            for lat, lon in points:
+                lat, lon = float(lat), float(lon)
+                if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                    raise JobError(f"point out of range: [{lat}, {lon}]")
+                lats.append(lat)
+                lons.append(lon)
+            if targets is not None:
+                if kind != 'matrix':
+                    raise JobError("targets only apply to matrix jobs")
+                targets = [int(id) for id in targets]
+        except (TypeError, ValueError) as e:
+            if isinstance(e, JobError):
+                raise
+            raise JobError(f"bad points or targets: {e}")
+        if targets is not None and len(lats) * len(targets) > MAX_MATRIX_CELLS:
+            raise JobError(f"matrix larger than {MAX_MATRIX_CELLS:,} cells")
+        with sqlite3.connect(self.db) as conn:
+            version = current_version(conn)
+        with self.lock:
+            self._expire()
+            job = Job(next(self.ids), kind, lats, lons, targets or None, version)
+            self.jobs[job.id] = job
+            self._with_locations(job)
+        return job
+
+    def _with_locations(self, job):
+        block = self.locations
+        if block is not None and block.version >= job.version:
+            return self._start(job, block)
+        self.waiting.append(job)
+        if self.building is None:
+            self.building = self._executor().submit(build_locations, os.path.abspath(self.db))
+            self.building.add_done_callback(self._built)
+
+    def _built(self, future):
+        with self.lock:
+            self.building = None
+            waiting, self.waiting = self.waiting, []
+            try:
+                name, count, version = future.result()
+            except Exception as e:
+                for job in waiting:
+                    self._finish(job, 'failed', f"loading locations failed: {e!r}")
+                return
+            self._retire(self.locations)
+            self.locations = LocationsBlock(name, count, version)
+            for job in waiting:
+                if job.running:
+                    self._with_locations(job)
+
+    def _retire(self, block):
+        if block is None:
+            return
+        block.retired = True
+        if block.users == 0:
+            unlink_block(block.name)
+
+    def _start(self, job, block):
+        job.locations = block
+        block.users += 1
+        p = job.count
+        if block.count == 0:
+            return self._finish(job, 'failed', "there are no locations")
+        if job.kind == 'matrix':
+            job.width = q = job.width or block.count
+            if p * q > MAX_MATRIX_CELLS:
+                return self._finish(job, 'failed', f"matrix larger than {MAX_MATRIX_CELLS:,} cells")
+            job.out = SharedMemory(create=True, size=8 * p * q)
+            job.results = [job.out.buf[:8 * p * q].cast('d')]
+        else:
+            job.out = SharedMemory(create=True, size=16 * p)
+            job.results = _views(job.out.buf, p, 'qd')
+        job.state = 'running'
+        size = max(1, math.ceil(p / (self.workers * CHUNKS_PER_WORKER)))
+        starts = range(0, p, size)
+        job.chunks = len(starts)   # before submitting: callbacks may run at once
+        pool = self._executor()
+        for start in starts:
+            stop = min(p, start + size)
+            if job.kind == 'nearest':
+                future = pool.submit(_nearest_chunk, block.name, block.count, job.points.name, p,
+                                     start, stop, job.out.name)
+            else:
+                future = pool.submit(_matrix_chunk, block.name, block.count, job.points.name, p,
+                                     job.target_block.name if job.target_block else None, job.width,
+                                     start, stop, job.out.name)
+            job.futures.append(future)
+            future.add_done_callback(functools.partial(self._chunk_done, job, start, stop))
+
+    def _chunk_done(self, job, start, stop, future):
+        with self.lock:
+            if not job.running or future.cancelled():
+                return
+            error = future.exception()
+            if error is not None:
+                return self._finish(job, 'failed', repr(error))
+            job.completed.append((start, stop))
+            job.done += stop - start
+            if len(job.completed) == job.chunks:
+                self._finish(job, 'done')
+            self.changed.notify_all()
+
+    def _finish(self, job, state, error=None):
+        # Inputs go now; results stay until the job expires or is deleted.
+        job.state, job.error, job.finished = state, error, time.time()
+        for future in job.futures:
+            future.cancel()
+        for block in (job.points, job.target_block):
+            if block is not None:
+                block.close()
+                block.unlink()
+        job.points = job.target_block = None
+        block = job.locations
+        if block is not None:
+            block.users -= 1
+            if block.retired and block.users == 0:
+                unlink_block(block.name)
+        if state != 'done':
+            self._release(job)
+        self.changed.notify_all()
+
+    def _release(self, job):
+        for view in job.results or ():
+            view.release()
+        job.results = None
+        if job.out is not None:
+            job.out.close()
+            job.out.unlink()
+            job.out = None
+
+    def _expire(self):
+        now = time.time()
+        for job in [j for j in self.jobs.values() if j.finished and now - j.finished > self.ttl]:
+            self._release(job)
+            del self.jobs[job.id]
+
+    def get(self, id):
+        with self.lock:
+            self._expire()
+            return self.jobs.get(id)
+
+    def cancel(self, job):
+        with self.lock:
+            if job.running:
+                self._finish(job, 'cancelled')
+
+    def delete(self, job):
+        with self.lock:
+            self.cancel(job)
+            self._release(job)
+            self.jobs.pop(job.id, None)
+
+    def _rows(self, job, start, stop):
+        if job.results is None:
+            return []
+        if job.kind == 'nearest':
+            found, distances = job.results
+            return [dict(index=i, location_id=found[i], distance=distances[i]) for i in range(start, stop)]
+        (result,), q = job.results, job.width
+        rows = []
+        for i in range(start, stop):
+            row = result[i * q:(i + 1) * q].tolist()
+            if job.targets:
+                row = [None if d != d else d for d in row]   # NaN: unknown id
+            rows.append(dict(index=i, distances=row))
+        return rows
+
+    def rows(self, job, offset=0, limit=1000):
+        """Result rows ``offset .. offset+limit`` of a finished job."""
+        with self.lock:
+            return self._rows(job, offset, min(job.count, offset + limit))
+
+    def stream(self, job, timeout=30.0):
+        """Yield result rows as chunks finish, then the final status."""
+        sent = 0
+        while True:
+            with self.lock:
+                while sent == len(job.completed) and job.running:
+                    self.changed.wait(timeout)
+                ranges, sent = job.completed[sent:], len(job.completed)
+                final = not job.running
+                rows = [row for start, stop in ranges for row in self._rows(job, start, stop)]
+            yield from rows
+            if final:
+                yield job.status()
+                return
+
+    def shutdown(self):
+        with self.lock:
+            for job in list(self.jobs.values()):
+                self.delete(job)
+            self._retire(self.locations)
+            self.locations = None
+            pool, self.pool = self.pool, None
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
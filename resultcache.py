@@ -0,0 +1,100 @@
+"""Distance answers cached by target and position cell.
+
+A phone lying on a table still reports a fix every second, each a few
+metres from the last because of receiver noise. Positions are snapped
+to a grid whose cell is the reported accuracy rounded down to a power
+of two (between ``min_cell`` and ``max_cell`` metres), and the answer
+for a ``(target id, cell)`` pair is computed once. Two fixes in the same
+cell are closer together than the receiver can tell apart, so the cached
+answer is off by at most a cell diagonal, about 1.4 times the accuracy.
+
+Entries are kept in least-recently-used order up to ``size``.
+``invalidate(target_id)`` drops every entry for one target in time
+proportional to their number; call it when the target is edited or
+deleted.
+
+``unchanged`` tells whether a new distance is a meaningful change from
+the last answer. While it stays within one cell, the last distance is
+kept, so receiver noise does not make the number on screen jitter.
+"""
+import collections
+import threading
+from math import cos, floor, log2, radians
+
+from geo import EARTH_RADIUS
+
+M_PER_DEG = radians(1) * EARTH_RADIUS
+
+
+class ResultCache:
+    def __init__(self, size=50000, min_cell=2.0, max_cell=128.0):
+        self.size = size
+        self.min_cell = min_cell
+        self.max_cell = max_cell
+        self.entries = collections.OrderedDict()    # key -> value, oldest first
+        self.by_target = collections.defaultdict(set)
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.invalidated = 0
+
+    def key(self, target_id, lat, lon, accuracy=None):
+        """``(target_id, cell, row, col)`` for a fix; without an accuracy the
+        smallest cell is used."""
+        size = min(max(accuracy or 0.0, self.min_cell), self.max_cell)
+        cell = 2.0 ** floor(log2(size))
+        row = floor(lat * M_PER_DEG / cell)
+        # Columns are as wide as the cells are tall, measured at the row.
+        col = floor(lon * M_PER_DEG * cos(radians(row * cell / M_PER_DEG)) / cell)
+        return target_id, cell, row, col
+
+    @staticmethod
+    def unchanged(last_key, last_distance, key, distance):
+        """True if ``distance`` (for ``key``) is no meaningful change from
+        the answer on screen: same target, and less than a cell apart."""
+        return (last_key is not None and last_distance is not None
+                and last_key[0] == key[0] and abs(distance - last_distance) < key[1])
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            if key not in self.entries:
+                self.by_target[key[0]].add(key)
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                old, _ = self.entries.popitem(last=False)
+                self._unindex(old)
+
+    def _unindex(self, key):
+        keys = self.by_target[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self.by_target[key[0]]
+
+    def invalidate(self, target_id):
+        with self.lock:
+            keys = self.by_target.pop(target_id, ())
+            for key in keys:
+                del self.entries[key]
+            self.invalidated += len(keys)
+
+    def clear(self):
+        with self.lock:
+            self.invalidated += len(self.entries)
+            self.entries.clear()
+            self.by_target.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return dict(entries=len(self.entries), hits=self.hits, misses=self.misses,
+                        hit_rate=round(self.hits / lookups, 3) if lookups else None,
+                        invalidated=self.invalidated)
@@ -0,0 +1,121 @@
+"""Location name search backed by an FTS5 trigram index.
+
+``locations_fts`` is an external-content index over ``locations.name``,
+kept in sync by triggers, so every write path (form routes, JSON API,
+batch, importers) updates it without extra code.
+
+Ranking, best first:
+  1. names starting with the query,
+  2. names containing the query (trigram phrase match, ordered by bm25),
+  3. fuzzy matches sharing some of the query's trigrams (typos).
+Within a tier an optional proximity boost from the current GPS fix
+reorders results. Queries shorter than three characters cannot use
+trigrams and fall back to a LIKE prefix scan; so does a SQLite build
+without FTS5.
+"""
+import sqlite3
+
+PROXIMITY_WEIGHT = 1.0
+CANDIDATES_PER_RESULT = 5
+
+SCHEMA = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS locations_fts USING fts5(
+    name, content='locations', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS locations_fts_insert AFTER INSERT ON locations BEGIN
+    INSERT INTO locations_fts (rowid, name) VALUES (new.id, new.name);
+END;
+CREATE TRIGGER IF NOT EXISTS locations_fts_delete AFTER DELETE ON locations BEGIN
+    INSERT INTO locations_fts (locations_fts, rowid, name) VALUES ('delete', old.id, old.name);
+END;
+CREATE TRIGGER IF NOT EXISTS locations_fts_update AFTER UPDATE OF name ON locations BEGIN
+    INSERT INTO locations_fts (locations_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    INSERT INTO locations_fts (rowid, name) VALUES (new.id, new.name);
+END;
+'''
+
+
+def init_search(conn):
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'locations_fts'").fetchone()
+    if exists:
+        return True
+    try:
+        conn.executescript(SCHEMA)
+    except sqlite3.OperationalError:
+        return False  # no FTS5 in this SQLite build
+    conn.execute("INSERT INTO locations_fts (locations_fts) VALUES ('rebuild')")
+    conn.commit()
+    return True
+
+
+def has_fts(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'locations_fts'").fetchone() is not None
+
+
+def _phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _like_prefix(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def _candidates(conn, q, limit):
+    # -> {id: (tier, bm25, name, lat, lon)}
+    found = {}
+    n = limit * CANDIDATES_PER_RESULT
+    if len(q) < 3 or not has_fts(conn):
+        rows = conn.execute('''
+            SELECT id, name, latitude, longitude FROM locations
+            WHERE name LIKE ? ESCAPE '\\' ORDER BY length(name) LIMIT ?
+        ''', (_like_prefix(q), n))
+        for id, name, lat, lon in rows:
+            found[id] = (0, 0.0, name, lat, lon)
+        return found
+
+    prefix = q.lower()
+    rows = conn.execute('''
+        SELECT l.id, l.name, l.latitude, l.longitude, bm25(locations_fts)
+        FROM locations_fts JOIN locations l ON l.id = locations_fts.rowid
+        WHERE locations_fts MATCH ? ORDER BY bm25(locations_fts) LIMIT ?
+    ''', (_phrase(q), n))
+    for id, name, lat, lon, score in rows:
+        found[id] = (0 if name.lower().startswith(prefix) else 1, score, name, lat, lon)
+
+    if len(found) < limit and len(q) > 3:
+        grams = {q[i:i + 3] for i in range(len(q) - 2)}
+        rows = conn.execute('''
+            SELECT l.id, l.name, l.latitude, l.longitude, bm25(locations_fts)
+            FROM locations_fts JOIN locations l ON l.id = locations_fts.rowid
+            WHERE locations_fts MATCH ? ORDER BY bm25(locations_fts) LIMIT ?
+        ''', (' OR '.join(_phrase(g) for g in sorted(grams)), n))
+        # Keep only names sharing at least half of the query's trigrams.
+        need = max(1, len(grams) // 2)
+        for id, name, lat, lon, score in rows:
+            lowered = name.lower()
+            if sum(g.lower() in lowered for g in grams) >= need:
+                found.setdefault(id, (2, score, name, lat, lon))
+    return found
+
+
+def search(conn, q, limit=20, lat=None, lon=None, distance=None):
+    """Return up to ``limit`` dicts with id, name, latitude, longitude
+    (and ``distance`` in metres when a position is given)."""
+    q = q.strip()
+    if not q:
+        return []
+    found = _candidates(conn, q, limit)
+    results = []
+    for id, (tier, score, name, tlat, tlon) in found.items():
+        item = dict(id=id, name=name, latitude=tlat, longitude=tlon)
+        # bm25 is negative, more negative = better
+        relevance = -score
+        if lat is not None and lon is not None and distance is not None:
+            d = distance(lat, lon, tlat, tlon)
+            item['distance'] = d
+            relevance += PROXIMITY_WEIGHT * 10 / (1 + d / 1000) ** 0.5
+        results.append((tier, -relevance, len(name), item))
+    results.sort(key=lambda r: r[:3])
+    return [r[3] for r in results[:limit]]
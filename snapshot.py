@@ -0,0 +1,254 @@
+"""Memory-mapped binary snapshot of the ``locations`` table.
+
+Building an in-memory index from ``SELECT`` takes seconds per million
+rows, in every worker, at every start. A snapshot file is written once
+and then mapped read-only by any number of processes; the kernel's page
+cache holds one copy for all of them and nothing is parsed at start.
+
+Layout (little endian, every section 8-byte aligned)::
+
+    header   magic "GPSSNAP1", format, flags, dataset version, count,
+             name count, name bytes, then the byte offset of each section
+    ids          int64[count], ascending
+    lats, lons   float64[count] (float32 if FLAG_FLOAT32)
+    name_refs    uint32[count]    index into the name table
+    name_offsets uint64[names+1]
+    name_data    UTF-8
+
+Rows are sorted by id, so lookups are a binary search over the mapped
+``ids`` with no index to build. ``numpy()`` returns zero-copy views.
+
+The snapshot carries the change-log version it was taken at.
+``LocationsView`` puts the changes made since then on top, so a stale
+snapshot is still exact. It rewrites the file (atomically, off the
+request thread) once that overlay grows past ``MAX_LAG`` changes.
+"""
+import bisect
+import mmap
+import os
+import struct
+import threading
+
+from changelog import changes_since, current_version
+from store import LocationStore, numpy
+
+MAGIC = b'GPSSNAP1'
+FORMAT = 1
+FLAG_FLOAT32 = 1
+HEADER = struct.Struct('<8sIIQQQQ6Q')   # magic .. name bytes, 6 section offsets
+MAX_LAG = 10_000
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def _align(n):
+    return (n + 7) & ~7
+
+
+def write_snapshot(conn, path, precision='float64'):
+    """Write the current ``locations`` table to ``path`` atomically and
+    return the dataset version it reflects."""
+    # One read transaction, so rows and version agree.
+    in_txn = conn.in_transaction
+    if not in_txn:
+        conn.execute('BEGIN')
+    try:
+        version = current_version(conn)
+        store = LocationStore.from_rows(
+            conn.execute('SELECT id, name, latitude, longitude FROM locations ORDER BY id'), precision)
+    finally:
+        if not in_txn:
+            conn.execute('COMMIT')
+    names = store.names
+    sections = (store.ids, store.lats, store.lons, store.name_refs, names.offsets, names.data)
+    offsets, pos = [], _align(HEADER.size)
+    for data in sections:
+        offsets.append(pos)
+        pos = _align(pos + len(memoryview(data).cast('B')))
+    header = HEADER.pack(MAGIC, FORMAT, FLAG_FLOAT32 if precision == 'float32' else 0,
+                         version, len(store), len(names), len(names.data), *offsets)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(header)
+        for offset, data in zip(offsets, sections):
+            f.write(b'\0' * (offset - f.tell()))
+            f.write(memoryview(data).cast('B'))
+        f.flush()
+        os.fsync(f.fileno())
+    # Readers keep the old inode mapped until they reopen.
+    os.replace(tmp, path)
+    return version
+
+
+class Snapshot:
+    """Read-only view of a snapshot file; all columns are ``memoryview``s
+    over one shared mapping."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            self.stat = (st.st_ino, st.st_mtime_ns, st.st_size)
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (magic, fmt, flags, self.version, self.count, name_count, name_bytes,
+             *offsets) = HEADER.unpack_from(self.mm)
+        except struct.error:
+            raise SnapshotError(f'{path}: truncated header')
+        if magic != MAGIC or fmt != FORMAT:
+            raise SnapshotError(f'{path}: not a version {FORMAT} snapshot')
+        self.precision = 'float32' if flags & FLAG_FLOAT32 else 'float64'
+        coord = 'f' if flags & FLAG_FLOAT32 else 'd'
+        self.offsets = offsets
+        self.buf = buf = memoryview(self.mm)
+        n = self.count
+
+        def column(i, code, length):
+            size = struct.calcsize(code)
+            return buf[offsets[i]:offsets[i] + size * length].cast(code)
+
+        self.ids = column(0, 'q', n)
+        self.lats = column(1, coord, n)
+        self.lons = column(2, coord, n)
+        self.name_refs = column(3, 'I', n)
+        self.name_offsets = column(4, 'Q', name_count + 1)
+        self.name_data = buf[offsets[5]:offsets[5] + name_bytes]
+
+    def __len__(self):
+        return self.count
+
+    def slot(self, id):
+        s = bisect.bisect_left(self.ids, id)
+        return s if s < self.count and self.ids[s] == id else None
+
+    def name(self, s):
+        i = self.name_refs[s]
+        return bytes(self.name_data[self.name_offsets[i]:self.name_offsets[i + 1]]).decode()
+
+    def row(self, s):
+        return self.ids[s], self.name(s), self.lats[s], self.lons[s]
+
+    def __iter__(self):
+        for s in range(self.count):
+            yield self.row(s)
+
+    def numpy(self):
+        """Zero-copy ``(ids, lats, lons)`` arrays over the mapping."""
+        if numpy is None:
+            raise RuntimeError('numpy is not installed')
+        n = self.count
+        return (numpy.frombuffer(self.mm, numpy.int64, n, self.offsets[0]),
+                numpy.frombuffer(self.mm, self.precision, n, self.offsets[1]),
+                numpy.frombuffer(self.mm, self.precision, n, self.offsets[2]))
+
+    def close(self):
+        # Fails with BufferError while NumPy views are alive.
+        for view in (self.ids, self.lats, self.lons, self.name_refs, self.name_offsets,
+                     self.name_data, self.buf):
+            view.release()
+        self.mm.close()
+
+
+class LocationsView:
+    """Snapshot plus the change log since it was taken.
+
+    ``refresh(conn)`` costs one ``sqlite_sequence`` read when nothing
+    changed. ``overlay`` maps id -> ``(name, lat, lon)`` for changed rows
+    and id -> ``None`` for deleted ones. Both live in one ``state`` tuple
+    that ``_open`` replaces in a single assignment, so a lock-free reader
+    never pairs a new snapshot with the old overlay.
+    """
+
+    def __init__(self, path, precision='float64'):
+        self.path = path
+        self.precision = precision
+        self.state = (None, {})
+        self.version = None
+        self.lock = threading.Lock()
+        self.writing = False
+
+    def _open(self):
+        try:
+            snap = Snapshot(self.path)
+        except (OSError, SnapshotError):
+            return False
+        # The old mapping is not closed here: another thread may be reading
+        # it. It is unmapped when the last reference goes away.
+        self.state = (snap, {})
+        self.version = snap.version
+        return True
+
+    @property
+    def snapshot(self):
+        return self.state[0]
+
+    @property
+    def overlay(self):
+        return self.state[1]
+
+    def _stale_file(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return False
+        return self.snapshot is None or (st.st_ino, st.st_mtime_ns, st.st_size) != self.snapshot.stat
+
+    def refresh(self, conn):
+        with self.lock:
+            if self._stale_file():
+                self._open()
+            if self.snapshot is None:
+                # no usable file yet: write one now, this once
+                write_snapshot(conn, self.path, self.precision)
+                self._open()
+            version = current_version(conn)
+            if version != self.version:
+                _, reset, upserts, deleted = changes_since(conn, self.version)
+                if reset:
+                    write_snapshot(conn, self.path, self.precision)
+                    self._open()
+                    _, _, upserts, deleted = changes_since(conn, self.version)
+                for id, name, lat, lon in upserts:
+                    self.overlay[id] = (name, lat, lon)
+                for id in deleted:
+                    self.overlay[id] = None
+                self.version = version
+            lag = len(self.overlay)
+        if lag > MAX_LAG:
+            self.rewrite_in_background(conn)
+
+    def rewrite_in_background(self, conn):
+        with self.lock:
+            if self.writing:
+                return
+            self.writing = True
+        # sqlite3 connections belong to one thread; the writer opens its own.
+        db = conn.execute('PRAGMA database_list').fetchone()[2]
+
+        def run():
+            import sqlite3
+            try:
+                with sqlite3.connect(db) as c:
+                    write_snapshot(c, self.path, self.precision)
+            finally:
+                self.writing = False
+
+        threading.Thread(target=run, name='snapshot-writer', daemon=True).start()
+
+    def get(self, id):
+        """``(id, name, lat, lon)`` or ``None``."""
+        snap, overlay = self.state
+        if id in overlay:
+            row = overlay[id]
+            return None if row is None else (id, *row)
+        s = snap.slot(id)
+        return None if s is None else snap.row(s)
+
+    def coords(self, id):
+        snap, overlay = self.state
+        if id in overlay:
+            row = overlay[id]
+            return None if row is None else row[1:]
+        s = snap.slot(id)
+        return None if s is None else (snap.lats[s], snap.lons[s])
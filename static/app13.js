@@ -0,0 +1,339 @@
+// ── Minecraft Compass ────────────────────────────────────────
+const TOTAL_FRAMES = 32;
+const FRAME_H      = 240;
+
+function bearingToFrame(bearing) {
+    const adjusted = (540 - bearing) % 360;
+    return Math.round((adjusted / 360) * TOTAL_FRAMES) % TOTAL_FRAMES;
+}
+
+function setCompassFrame(frame) {
+    const offsetY = -((TOTAL_FRAMES - 1 - frame) * FRAME_H);
+    document.getElementById('mcCompass').style.backgroundPosition = `0px ${offsetY}px`;
+}
+
+setCompassFrame(0);
+
+// ── Device Orientation ───────────────────────────────────────
+let currentHeading = 0;
+let lastBearing    = 0;
+
+window.addEventListener('deviceorientationabsolute', e => {
+    if (e.alpha != null) { currentHeading = 360 - e.alpha; updateCompassFrame(); }
+});
+window.addEventListener('deviceorientation', e => {
+    if (e.alpha != null && currentHeading === 0) { currentHeading = 360 - e.alpha; updateCompassFrame(); }
+});
+
+function updateCompassFrame() {
+    const rel = (lastBearing - currentHeading + 360) % 360;
+    setCompassFrame(bearingToFrame(rel));
+    document.getElementById('bearingValue').innerText   = Math.round(lastBearing) + '°';
+    document.getElementById('directionValue').innerText = getCardinalDirection(lastBearing);
+}
+
+// ── GPS ──────────────────────────────────────────────────────
+function getLocationAndAdd() {
+    navigator.geolocation.getCurrentPosition(pos => {
+        const name = prompt('Nama lokasi:');
+        if (!name) return;
+        api('POST', '/api/locations', { name, latitude: pos.coords.latitude, longitude: pos.coords.longitude })
+            .then(applyChange)
+            .catch(err => alert('Gagal menyimpan: ' + err.message));
+    }, err => alert('GPS Error: ' + err.message), { enableHighAccuracy: true });
+}
+
+// One geolocation source per page (FixRate). Switching the target only
+// re-answers the last fix; starting a second source would double every update.
+let lastFix = null;
+
+function updateLocation() {
+    LiveSession.setTarget(document.getElementById('locationSelect').value);
+    TileMap.select(document.getElementById('locationSelect').value);
+    if (FixRate.running()) {
+        refreshDistance();
+        return;
+    }
+    FixRate.start(sendLocation, err => {
+        console.warn('GPS Error:', err);
+        document.getElementById('distanceValue').innerText = 'Error';
+        document.getElementById('distanceValue').classList.remove('loading');
+    });
+}
+
+function stopLocation() {
+    FixRate.stop();
+}
+
+function sendLocation(fix) {
+    lastFix = fix;
+    Motion.add(fix);
+    TileMap.setPosition(fix);
+    refreshDistance();
+}
+
+function refreshDistance() {
+    if (!lastFix) return;
+    const fix  = lastFix;
+    const id   = document.getElementById('locationSelect').value;
+    const dest = OfflineStore.get(id);
+
+    // No network: the local copy answers and the fix stays on the phone.
+    if (dest && !navigator.onLine) return answerLocally(fix, dest);
+
+    // Online the fix still goes out (at the advised rate), so the server's
+    // dedupe, advice, motion model, result cache and heatmap see it too.
+    // `unchanged`: the new distance is within receiver noise of the last
+    // answer, so that distance stays; the run-on still restarts from it with
+    // the fresh motion model, or it would keep going after the phone stops.
+    if (LiveSession.sendFix(fix, msg => {
+        FixRate.apply(msg.advice);
+        showAnswer(msg.distance, msg.bearing, msg.motion);
+    })) return;
+
+    fetch('/update_location', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json', ...LiveSession.headers()},
+        body: JSON.stringify({ latitude: fix.lat, longitude: fix.lon, timestamp: fix.t,
+                               accuracy: fix.accuracy, speed: fix.speed, location_id: id })
+    })
+    .then(LiveSession.adopt).then(r => r.json()).then(data => {
+        if (data.distance === undefined) {
+            if (dest) answerLocally(fix, dest);
+            return;
+        }
+        FixRate.apply(data.advice);
+        if (data.unchanged) {
+            // Same distance, no coordinates needed: keep the bearing on screen.
+            showAnswer(data.distance, motion ? motion.bearing : lastBearing, data.motion);
+        } else if (dest) {
+            showAnswer(data.distance, calculate_bearing(fix.lat, fix.lon, dest.latitude, dest.longitude),
+                       data.motion);
+        } else {
+            showDistance(data.distance);
+            fetch('/get_location_coords/' + id).then(r => r.json()).then(dest => {
+                showAnswer(data.distance, calculate_bearing(fix.lat, fix.lon, dest.latitude, dest.longitude),
+                           data.motion);
+            });
+        }
+    })
+    // Server unreachable (Termux stopped, flaky data): fall back to the copy.
+    .catch(() => { if (dest) answerLocally(fix, dest); });
+}
+
+function answerLocally(fix, dest) {
+    const distance = haversine(fix.lat, fix.lon, dest.latitude, dest.longitude);
+    const bearing  = calculate_bearing(fix.lat, fix.lon, dest.latitude, dest.longitude);
+    FixRate.apply(FixRate.advise(distance));
+    showAnswer(distance, bearing, Motion.model(distance, bearing));
+}
+
+// Between fixes the distance, compass and ETA run on along the motion
+// model of the last answer (static/motion.js) until its horizon.
+const MOTION_TICK_MS = 500;
+let motion      = null;
+let motionTimer = null;
+
+function showAnswer(distance, bearing, model) {
+    motion = model ? { distance, bearing, model, at: performance.now() } : null;
+    if (motion && model.horizon > 0 && motionTimer === null) {
+        motionTimer = setInterval(runOn, MOTION_TICK_MS);
+    }
+    showDistance(distance);
+    showEta(model && model.eta);
+    lastBearing = bearing;
+    updateCompassFrame();
+}
+
+function runOn() {
+    const seconds = motion ? (performance.now() - motion.at) / 1000 : Infinity;
+    if (!motion || seconds >= motion.model.horizon) {
+        clearInterval(motionTimer);
+        motionTimer = null;
+        return;
+    }
+    const now = Motion.project(motion.distance, motion.bearing, motion.model, seconds);
+    showDistance(now.distance);
+    if (motion.model.eta !== null) showEta(Math.max(0, motion.model.eta - seconds));
+    lastBearing = now.bearing;
+    updateCompassFrame();
+}
+
+function showEta(seconds) {
+    const el = document.getElementById('etaValue');
+    if (seconds === null || seconds === undefined) el.innerText = '---';
+    else if (seconds < 60) el.innerText = Math.round(seconds) + ' s';
+    else if (seconds < 3600) el.innerText = Math.round(seconds / 60) + ' min';
+    else el.innerText = Math.floor(seconds / 3600) + ' h ' + Math.round(seconds % 3600 / 60) + ' min';
+}
+
+function showDistance(m) {
+    const el = document.getElementById('distanceValue');
+    el.innerText = formatDistance(m);
+    el.classList.remove('loading');
+}
+
+function formatDistance(m) {
+    return Math.round(m).toLocaleString('id-ID');
+}
+
+function haversine(lat1, lon1, lat2, lon2) {
+    const R     = 6371000;
+    const toRad = d => d * Math.PI / 180;
+    const dLat  = toRad(lat2 - lat1);
+    const dLon  = toRad(lon2 - lon1);
+    const a = Math.sin(dLat / 2) ** 2 +
+              Math.cos(toRad(lat1)) * Math.cos(toRad(lat2)) * Math.sin(dLon / 2) ** 2;
+    return R * 2 * Math.atan2(Math.sqrt(a), Math.sqrt(1 - a));
+}
+
+function calculate_bearing(lat1, lon1, lat2, lon2) {
+    const toRad = d => d * Math.PI / 180;
+    const toDeg = r => r * 180 / Math.PI;
+    const dLon  = toRad(lon2 - lon1);
+    const φ1 = toRad(lat1), φ2 = toRad(lat2);
+    const y = Math.sin(dLon) * Math.cos(φ2);
+    const x = Math.cos(φ1) * Math.sin(φ2) - Math.sin(φ1) * Math.cos(φ2) * Math.cos(dLon);
+    return (toDeg(Math.atan2(y, x)) + 360) % 360;
+}
+
+function getCardinalDirection(b) {
+    return ['N','NE','E','SE','S','SW','W','NW'][Math.round(b / 45) % 8];
+}
+
+// ── Google Maps ──────────────────────────────────────────────
+function openGoogleMaps(lat, lon) {
+    window.open(`https://www.google.com/maps/dir/?api=1&destination=${lat},${lon}&travelmode=driving`, '_blank');
+}
+
+function openGoogleMapsFromCompass() {
+    const id   = document.getElementById('locationSelect').value;
+    const dest = OfflineStore.get(id);
+    if (dest) return openGoogleMaps(dest.latitude, dest.longitude);
+    fetch('/get_location_coords/' + id).then(r => r.json()).then(dest => {
+        window.open(`https://www.google.com/maps/dir/?api=1&destination=${dest.latitude},${dest.longitude}&travelmode=driving`, '_blank');
+    });
+}
+
+// ── Reveal Koordinat (Mobile) ────────────────────────────────
+function toggleReveal(id) {
+    const lat = document.getElementById('lat-' + id);
+    const lon = document.getElementById('lon-' + id);
+    const btn = document.getElementById('revealBtn-' + id);
+    const shown = lat.classList.toggle('revealed');
+    lon.classList.toggle('revealed');
+    btn.textContent = shown ? '🙈 Sembunyikan Koordinat' : '👁️ Perlihatkan Koordinat';
+}
+
+// ── Reveal Koordinat (Desktop Table) ────────────────────────
+function toggleTableReveal(id) {
+    const tlat = document.getElementById('tlat-' + id);
+    const tlon = document.getElementById('tlon-' + id);
+    const btn  = document.getElementById('treveal-' + id);
+    const shown = tlat.classList.toggle('revealed');
+    tlon.classList.toggle('revealed');
+    btn.textContent = shown ? '🙈' : '👁️';
+}
+
+// ── Filter ───────────────────────────────────────────────────
+// Names are matched on the server (/search, FTS5 trigram index). The page
+// only flips a .match class on the hits and a .filtering class on the
+// lists, so a keystroke costs O(results) DOM work instead of O(locations).
+const SEARCH_DEBOUNCE_MS = 200;
+let searchTimer = null;
+let searchAbort = null;
+let matched     = [];
+let scannedDom  = false;
+
+function filterLocations() {
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(runSearch, SEARCH_DEBOUNCE_MS);
+}
+
+function setFiltering(on) {
+    ['locationSelect', 'locationsGrid', 'locationsTable'].forEach(id =>
+        document.getElementById(id).classList.toggle('filtering', on));
+}
+
+function markMatches(ids) {
+    matched.forEach(el => el.classList.remove('match'));
+    matched = [];
+    ids.forEach(id => {
+        [document.querySelector(`#locationSelect option[value="${id}"]`),
+         document.getElementById('card-' + id),
+         document.getElementById('row-' + id)].forEach(el => {
+            if (el) { el.classList.add('match'); matched.push(el); }
+        });
+    });
+}
+
+function runSearch() {
+    const q = document.getElementById('searchInput').value.trim();
+    if (searchAbort) searchAbort.abort();
+    if (!q) {
+        markMatches([]);
+        setFiltering(false);
+        return;
+    }
+    searchAbort = new AbortController();
+    let url = '/search?limit=200&q=' + encodeURIComponent(q);
+    if (lastFix) url += `&lat=${lastFix.lat}&lon=${lastFix.lon}`;
+    fetch(url, { signal: searchAbort.signal })
+        .then(r => r.json())
+        .then(data => {
+            if (scannedDom) {
+                filterLocationsLocal('');  // clear inline styles of the fallback
+                scannedDom = false;
+            }
+            markMatches(data.results.map(r => r.id));
+            setFiltering(true);
+        })
+        .catch(err => {
+            if (err.name === 'AbortError') return;
+            // Server unreachable: scan the page as before.
+            markMatches([]);
+            setFiltering(false);
+            filterLocationsLocal(q.toLowerCase());
+            scannedDom = true;
+        });
+}
+
+function filterLocationsLocal(input) {
+    const select = document.getElementById('locationSelect');
+    const table  = document.getElementById('locationsTable');
+    const grid   = document.getElementById('locationsGrid');
+
+    for (let i = 0; i < select.options.length; i++) {
+        select.options[i].style.display = select.options[i].text.toLowerCase().includes(input) ? '' : 'none';
+    }
+    if (table && table.getElementsByTagName('tbody')[0]) {
+        for (let row of table.getElementsByTagName('tbody')[0].rows) {
+            row.style.display = row.cells[1].textContent.toLowerCase().includes(input) ? '' : 'none';
+        }
+    }
+    if (grid) {
+        for (let card of grid.getElementsByClassName('location-card')) {
+            card.style.display = card.querySelector('.location-name').textContent.toLowerCase().includes(input) ? '' : 'none';
+        }
+    }
+}
+
+// ── Edit Toggle ──────────────────────────────────────────────
+function toggleEdit(id) {
+    const card = document.getElementById('card-' + id);
+    if (card) card.classList.toggle('edit-mode');
+}
+
+// ── Init ─────────────────────────────────────────────────────
+window.onload = () => {
+    LiveSession.connect();
+    OfflineStore.init().finally(updateLocation);
+    TileMap.init(OfflineStore.all);
+    window.addEventListener('pagehide', stopLocation);
+    window.addEventListener('pageshow', e => { if (e.persisted) updateLocation(); });
+    if (typeof DeviceOrientationEvent !== 'undefined' && typeof DeviceOrientationEvent.requestPermission === 'function') {
+        DeviceOrientationEvent.requestPermission()
+            .then(r => { if (r === 'granted') console.log('Orientation granted'); })
+            .catch(console.error);
+    }
+};
@@ -0,0 +1,200 @@
+let currentHeading = 0;
+let lastBearing = 0;
+let currentRotation = 0; // Track current rotation angle
+
+// Device orientation for compass heading
+window.addEventListener('deviceorientationabsolute', e => {
+    if (e.alpha != null) {
+        currentHeading = 360 - e.alpha;
+        updateCompassRotation();
+    }
+});
+
+// Fallback for devices without absolute orientation
+window.addEventListener('deviceorientation', e => {
+    if (e.alpha != null && currentHeading === 0) {
+        currentHeading = 360 - e.alpha;
+        updateCompassRotation();
+    }
+});
+
+function normalizeAngle(angle) {
+    // Normalize angle to 0-360 range
+    return ((angle % 360) + 360) % 360;
+}
+
+function getShortestRotation(from, to) {
+    // Calculate the shortest rotation direction
+    let diff = normalizeAngle(to - from);
+    if (diff > 180) {
+        diff = diff - 360;
+    }
+    return from + diff;
+}
+
+function updateCompassRotation() {
+    const arrow = document.getElementById('arrow');
+    const targetAngle = normalizeAngle(lastBearing - currentHeading);
+
+    // Calculate shortest path to target angle
+    const newRotation = getShortestRotation(currentRotation, targetAngle);
+    currentRotation = newRotation;
+
+    arrow.style.transform = `rotate(${currentRotation}deg)`;
+    arrow.style.transition = 'transform 0.3s ease-out';
+}
+
+function getLocationAndAdd() {
+    navigator.geolocation.getCurrentPosition(pos => {
+        const name = prompt('Enter location name:');
+        if (!name) return;
+        fetch('/add_location', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({
+                name: name,
+                latitude: pos.coords.latitude,
+                longitude: pos.coords.longitude
+            })
+        }).then(() => location.reload());
+    }, err => alert('GPS Error: ' + err.message), { enableHighAccuracy: true });
+}
+
+// One geolocation source per page (FixRate); switching the target
+// re-sends the last fix instead of adding another source.
+let lastFix   = null;
+let sessionId = null;
+
+function updateLocation() {
+    if (FixRate.running()) {
+        if (lastFix) sendLocation(lastFix);
+        return;
+    }
+    FixRate.start(sendLocation, err => {
+        console.warn('GPS Error:', err);
+        document.getElementById('distanceValue').innerText = 'Error';
+        document.getElementById('distanceValue').classList.remove('loading');
+    });
+}
+
+function stopLocation() {
+    FixRate.stop();
+}
+
+function sendLocation(fix) {
+    const lat = fix.lat;
+    const lon = fix.lon;
+    const id = document.getElementById('locationSelect').value;
+    lastFix = fix;
+
+    const headers = {'Content-Type': 'application/json'};
+    if (sessionId !== null) headers['X-Tracking-Session'] = sessionId;
+    fetch('/update_location', {
+        method: 'POST',
+        headers,
+        body: JSON.stringify({ latitude: lat, longitude: lon, timestamp: fix.t,
+                               accuracy: fix.accuracy, speed: fix.speed, location_id: id })
+    })
+    .then(r => {
+        sessionId = r.headers.get('X-Tracking-Session') || sessionId;
+        return r.json();
+    }).then(data => {
+        FixRate.apply(data.advice);
+        // `unchanged`: within receiver noise of the distance on screen.
+        if (data.distance !== undefined && !data.unchanged) {
+            const distanceEl = document.getElementById('distanceValue');
+            distanceEl.innerText = data.distance.toFixed(2);
+            distanceEl.classList.remove('loading');
+
+            fetch('/get_location_coords/' + id).then(r => r.json()).then(dest => {
+                const bearing = calculate_bearing(lat, lon, dest.latitude, dest.longitude);
+
+                // Smooth transition for bearing changes
+                const bearingDiff = Math.abs(bearing - lastBearing);
+                if (bearingDiff > 180) {
+                    // Large jump, adjust gradually
+                    lastBearing = bearing;
+                } else {
+                    // Small change, update directly
+                    lastBearing = bearing;
+                }
+
+                updateCompassRotation();
+
+                document.getElementById('bearingValue').innerText = Math.round(bearing) + '°';
+                document.getElementById('directionValue').innerText = getCardinalDirection(bearing);
+            });
+        }
+    });
+}
+
+function calculate_bearing(lat1, lon1, lat2, lon2) {
+    const toRad = deg => deg * Math.PI / 180;
+    const toDeg = rad => rad * 180 / Math.PI;
+    let dLon = toRad(lon2 - lon1);
+    let φ1 = toRad(lat1), φ2 = toRad(lat2);
+    let y = Math.sin(dLon) * Math.cos(φ2);
+    let x = Math.cos(φ1) * Math.sin(φ2) - Math.sin(φ1) * Math.cos(φ2) * Math.cos(dLon);
+    return (toDeg(Math.atan2(y, x)) + 360) % 360;
+}
+
+function getCardinalDirection(bearing) {
+    const directions = ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW'];
+    const index = Math.round(bearing / 45) % 8;
+    return directions[index];
+}
+
+function filterLocations() {
+    const input = document.getElementById('searchInput').value.toLowerCase();
+    const select = document.getElementById('locationSelect');
+    const table = document.getElementById('locationsTable');
+    const grid = document.getElementById('locationsGrid');
+
+    // Filter dropdown
+    for (let i = 0; i < select.options.length; i++) {
+        let text = select.options[i].text.toLowerCase();
+        select.options[i].style.display = text.includes(input) ? '' : 'none';
+    }
+
+    // Filter table (desktop)
+    if (table && table.getElementsByTagName('tbody')[0]) {
+        const tbody = table.getElementsByTagName('tbody')[0];
+        for (let row of tbody.rows) {
+            let nameCell = row.cells[1].textContent.toLowerCase();
+            row.style.display = nameCell.includes(input) ? '' : 'none';
+        }
+    }
+
+    // Filter cards (mobile)
+    if (grid) {
+        const cards = grid.getElementsByClassName('location-card');
+        for (let card of cards) {
+            const name = card.querySelector('.location-name').textContent.toLowerCase();
+            card.style.display = name.includes(input) ? '' : 'none';
+        }
+    }
+}
+
+function toggleEdit(id) {
+    const card = document.getElementById('card-' + id);
+    if (card) {
+        card.classList.toggle('edit-mode');
+    }
+}
+
+window.onload = () => {
+    updateLocation();
+    window.addEventListener('pagehide', stopLocation);
+    window.addEventListener('pageshow', e => { if (e.persisted) updateLocation(); });
+
+    // Request device orientation permission for iOS
+    if (typeof DeviceOrientationEvent !== 'undefined' && typeof DeviceOrientationEvent.requestPermission === 'function') {
+        DeviceOrientationEvent.requestPermission()
+            .then(response => {
+                if (response === 'granted') {
+                    console.log('Device orientation permission granted');
+                }
+            })
+            .catch(console.error);
+    }
+};
@@ -0,0 +1,181 @@
+// ── Kelola Lokasi tanpa Reload ──────────────────────────────
+// The forms still post to the old routes when JavaScript is off. With it,
+// submits go to /api/locations and only the affected location is patched
+// into the <select>, the card grid and the table.
+function escapeHtml(s) {
+    return String(s).replace(/[&<>"']/g, c => ({
+        '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+    })[c]);
+}
+
+function cardHtml(loc, index) {
+    const id = loc.id, name = escapeHtml(loc.name), lat = loc.latitude, lon = loc.longitude;
+    return `
+<div class="location-card" id="card-${id}">
+<div class="view-content">
+<div class="location-card-header">
+<div class="location-name">${name}</div>
+<div class="location-index">#${index}</div>
+</div>
+<div class="location-coords">
+<div class="coord-item">
+<div class="coord-label">Latitude</div>
+<div class="coord-value" id="lat-${id}">${lat.toFixed(6)}</div>
+</div>
+<div class="coord-item">
+<div class="coord-label">Longitude</div>
+<div class="coord-value" id="lon-${id}">${lon.toFixed(6)}</div>
+</div>
+</div>
+<button class="btn-reveal" onclick="toggleReveal(${id})" id="revealBtn-${id}">
+👁️ Perlihatkan Koordinat
+</button>
+<div class="location-actions" style="margin-top: 10px;">
+<button class="btn-primary" onclick="toggleEdit(${id})">✏️ Edit</button>
+<button class="btn-maps" onclick="openGoogleMaps(${lat}, ${lon})">🗺️ Maps</button>
+<form action="/delete_location/${id}" method="POST" style="flex: 1;">
+<button type="submit" class="btn-danger" style="width:100%;" onclick="return confirm('Hapus lokasi ini?')">🗑️ Hapus</button>
+</form>
+</div>
+</div>
+<form action="/edit_location/${id}" method="POST" class="edit-form">
+<div class="edit-input-group">
+<label>Nama Lokasi</label>
+<input type="text" name="name" value="${name}" required>
+</div>
+<div class="edit-input-group">
+<label>Latitude</label>
+<input type="number" step="any" name="latitude" value="${lat}" required>
+</div>
+<div class="edit-input-group">
+<label>Longitude</label>
+<input type="number" step="any" name="longitude" value="${lon}" required>
+</div>
+<div class="location-actions">
+<button type="submit" class="btn-success">💾 Simpan</button>
+<button type="button" class="btn-secondary" onclick="toggleEdit(${id})">✖️ Batal</button>
+</div>
+</form>
+</div>`;
+}
+
+function rowHtml(loc, index) {
+    const id = loc.id, name = escapeHtml(loc.name), lat = loc.latitude, lon = loc.longitude;
+    return `
+<tr id="row-${id}">
+<td>${index}</td>
+<td><strong>${name}</strong></td>
+<td><span class="table-coord" id="tlat-${id}">${lat.toFixed(6)}</span></td>
+<td><span class="table-coord" id="tlon-${id}">${lon.toFixed(6)}</span></td>
+<td>
+<button class="btn-secondary table-button" onclick="toggleTableReveal(${id})" id="treveal-${id}">👁️</button>
+<form action="/edit_location/${id}" method="POST" style="display:inline;">
+<input type="text" name="name" value="${name}" class="table-input" required>
+<input type="number" step="any" name="latitude" value="${lat}" class="table-input" required>
+<input type="number" step="any" name="longitude" value="${lon}" class="table-input" required>
+<button type="submit" class="btn-primary table-button">Simpan</button>
+</form>
+<button class="btn-maps table-button" onclick="openGoogleMaps(${lat}, ${lon})">🗺️ Maps</button>
+<form action="/delete_location/${id}" method="POST" style="display:inline;">
+<button type="submit" class="btn-danger table-button" onclick="return confirm('Hapus lokasi ini?')">Hapus</button>
+</form>
+</td>
+</tr>`;
+}
+
+function fromHtml(html, container) {
+    const t = document.createElement(container);
+    t.innerHTML = html.trim();
+    return t.firstElementChild;
+}
+
+function positionOf(el) {
+    return Array.prototype.indexOf.call(el.parentNode.children, el) + 1;
+}
+
+function upsertLocationDom(loc) {
+    const select = document.getElementById('locationSelect');
+    let opt = select.querySelector(`option[value="${loc.id}"]`);
+    if (!opt) {
+        opt = new Option('', loc.id);
+        select.add(opt);
+    }
+    opt.text = loc.name;
+
+    const grid = document.getElementById('locationsGrid');
+    const card = document.getElementById('card-' + loc.id);
+    if (card) card.replaceWith(fromHtml(cardHtml(loc, positionOf(card)), 'div'));
+    else grid.appendChild(fromHtml(cardHtml(loc, grid.children.length + 1), 'div'));
+
+    const tbody = document.querySelector('#locationsTable tbody');
+    const row   = document.getElementById('row-' + loc.id);
+    if (row) row.replaceWith(fromHtml(rowHtml(loc, positionOf(row)), 'tbody'));
+    else tbody.appendChild(fromHtml(rowHtml(loc, tbody.rows.length + 1), 'tbody'));
+}
+
+function removeLocationDom(id) {
+    const opt = document.querySelector(`#locationSelect option[value="${id}"]`);
+    if (opt) opt.remove();
+    // Only the entries after the removed one need renumbering.
+    const card = document.getElementById('card-' + id);
+    if (card) {
+        let next = card.nextElementSibling, i = positionOf(card);
+        card.remove();
+        for (; next; next = next.nextElementSibling, i++) {
+            next.querySelector('.location-index').textContent = '#' + i;
+        }
+    }
+    const row = document.getElementById('row-' + id);
+    if (row) {
+        let next = row.nextElementSibling, i = positionOf(row);
+        row.remove();
+        for (; next; next = next.nextElementSibling, i++) next.cells[0].textContent = i;
+    }
+}
+
+function api(method, url, body) {
+    return fetch(url, {
+        method,
+        headers: body ? { 'Content-Type': 'application/json' } : {},
+        body: body ? JSON.stringify(body) : undefined
+    }).then(r => r.json().then(data => {
+        if (!r.ok) throw new Error(data.error || r.status);
+        return data;
+    }));
+}
+
+function applyChange(data) {
+    if (data.location) upsertLocationDom(data.location);
+    else removeLocationDom(data.deleted);
+    OfflineStore.applyLocal(data);
+    return data;
+}
+
+function formJson(form) {
+    const f = form.elements;
+    return {
+        name:      f.namedItem('name').value,
+        latitude:  f.namedItem('latitude').value,
+        longitude: f.namedItem('longitude').value
+    };
+}
+
+const FORM_ROUTES = [
+    [/^\/add_location$/,          form => api('POST', '/api/locations', formJson(form))],
+    [/^\/edit_location\/(\d+)$/,  (form, id) => api('PUT', '/api/locations/' + id, formJson(form))],
+    [/^\/delete_location\/(\d+)$/, (form, id) => api('DELETE', '/api/locations/' + id)],
+];
+
+document.addEventListener('submit', e => {
+    const action = e.target.getAttribute('action') || '';
+    for (const [re, send] of FORM_ROUTES) {
+        const m = action.match(re);
+        if (!m) continue;
+        e.preventDefault();
+        const form = e.target;
+        send(form, m[1]).then(applyChange).then(data => {
+            if (data.location && !m[1]) form.reset();
+        }).catch(err => alert('Gagal menyimpan: ' + err.message));
+        return;
+    }
+});
@@ -0,0 +1,128 @@
+// ── Fix Rate ────────────────────────────────────────────────
+// GPS fixes only as often as the distance on screen needs them. Every
+// answer from the server carries advice {interval, min_distance}
+// (tracking.advise); a distance computed on the phone gets the same rule
+// from advise() below. A reading is handed on once `interval` seconds
+// have passed since the last one handed on *and* the phone has moved
+// `min_distance` metres. From POLL_FROM_S on, the continuous watcher is
+// replaced by one timed reading per interval so the receiver can sleep
+// in between; from COARSE_FROM_M on, network positioning is precise
+// enough and the GPS chip stays off.
+const FixRate = (() => {
+    // Same rule and constants as tracking.py.
+    const ERROR_FRACTION  = 0.1;
+    const NEAR_ERROR_M    = 5;
+    const MIN_SPEED       = 1.4;
+    const SPEED_MARGIN    = 2.5;
+    const MIN_INTERVAL_S  = 1;
+    const MAX_INTERVAL_S  = 60;
+    const MAX_DISTANCE_M  = 250;
+    const SPEED_SMOOTHING = 0.5;
+
+    const POLL_FROM_S   = 15;
+    const COARSE_FROM_M = 100;
+    const SLACK_S       = 0.5;    // readings arrive a little early or late
+    const M_PER_DEG     = 111320;
+
+    let advice  = { interval: MIN_INTERVAL_S, min_distance: 0 };
+    let onFix   = null;
+    let onError = null;
+    let watchId = null;
+    let timer   = null;
+    let poll    = false;
+    let coarse  = false;
+    let passed  = null;   // last fix handed on
+    let speed   = null;   // m/s, smoothed over handed-on fixes
+
+    function advise(distance) {
+        const allowed = Math.max(ERROR_FRACTION * distance, NEAR_ERROR_M);
+        const accuracy = passed && passed.accuracy;
+        // No speed yet: nothing bounds how far the phone gets, ask again at once.
+        const interval = speed === null ? MIN_INTERVAL_S : Math.min(MAX_INTERVAL_S,
+            Math.max(MIN_INTERVAL_S, (allowed - (accuracy || 0)) / (Math.max(speed, MIN_SPEED) * SPEED_MARGIN)));
+        let minDistance = Math.min(allowed / 2, MAX_DISTANCE_M);
+        if (accuracy) minDistance = Math.min(Math.max(minDistance, accuracy), allowed);
+        return { interval, min_distance: minDistance };
+    }
+
+    // Short hops only, so a flat-earth approximation is plenty.
+    function moved(a, b) {
+        const x = (b.lon - a.lon) * Math.cos(a.lat * Math.PI / 180);
+        return Math.hypot(b.lat - a.lat, x) * M_PER_DEG;
+    }
+
+    function reading(pos) {
+        const fix = {
+            lat: pos.coords.latitude, lon: pos.coords.longitude, t: pos.timestamp,
+            accuracy: pos.coords.accuracy, speed: pos.coords.speed
+        };
+        if (passed) {
+            const dt = (fix.t - passed.t) / 1000;
+            if (dt + SLACK_S < advice.interval) return;
+            const d = moved(passed, fix);
+            if (d < advice.min_distance) return;
+            const v = fix.speed != null ? fix.speed : Math.max(0, d - (fix.accuracy || 0)) / dt;
+            speed = speed === null || v > speed ? v : speed + SPEED_SMOOTHING * (v - speed);
+        }
+        fix.speed = speed;
+        passed = fix;
+        onFix(fix);
+    }
+
+    function failed(err) {
+        if (onError) onError(err);
+    }
+
+    function options() {
+        return { enableHighAccuracy: !coarse, maximumAge: 0, timeout: poll ? 15000 : 5000 };
+    }
+
+    // Next timed reading: when the interval since the last fix handed on
+    // runs out, or a whole interval from now if it already has (that
+    // reading had not moved far enough).
+    function schedule() {
+        clearTimeout(timer);
+        const wait = advice.interval * 1000 - (passed ? Date.now() - passed.t : Infinity);
+        timer = setTimeout(() => {
+            navigator.geolocation.getCurrentPosition(pos => { reading(pos); schedule(); },
+                                                     err => { failed(err); schedule(); }, options());
+        }, wait > 0 ? wait : advice.interval * 1000);
+    }
+
+    function acquire() {
+        release();
+        poll   = advice.interval >= POLL_FROM_S;
+        coarse = advice.min_distance >= COARSE_FROM_M;
+        if (poll) schedule();
+        else watchId = navigator.geolocation.watchPosition(reading, failed, options());
+    }
+
+    function release() {
+        if (watchId !== null) navigator.geolocation.clearWatch(watchId);
+        clearTimeout(timer);
+        watchId = timer = null;
+    }
+
+    function start(fixCallback, errorCallback) {
+        onFix   = fixCallback;
+        onError = errorCallback;
+        passed  = null;
+        advice  = { interval: MIN_INTERVAL_S, min_distance: 0 };
+        acquire();
+    }
+
+    function stop() {
+        release();
+        onFix = null;
+    }
+
+    function apply(next) {
+        if (!next || !onFix) return;
+        const shorter = next.interval < advice.interval;
+        advice = next;
+        if (poll !== advice.interval >= POLL_FROM_S || coarse !== advice.min_distance >= COARSE_FROM_M) acquire();
+        else if (poll && shorter) schedule();
+    }
+
+    return { start, stop, apply, advise, running: () => onFix !== null };
+})();
@@ -0,0 +1,89 @@
+// ── Live Session (WebSocket) ────────────────────────────────
+// One socket per page to /ws/track. The server remembers the selected
+// target, so after `target` each fix is just [lat, lon, timestamp,
+// accuracy, speed]; it pushes a new distance when the target is edited
+// and a `dataset` note when any location changes, so the local copy
+// re-syncs right away instead of on the next poll. Without a socket
+// (server has no flask-sock, proxy blocks upgrades) the page keeps
+// working over plain HTTP.
+const LiveSession = (() => {
+    const MAX_BACKOFF_MS = 30000;
+
+    let ws        = null;
+    let open      = false;
+    let everOpen  = false;
+    let failures  = 0;
+    let targetId  = null;
+    let sessionId = null;
+    let onDistance = null;
+
+    function connect() {
+        if (!('WebSocket' in window)) return;
+        const proto = location.protocol === 'https:' ? 'wss:' : 'ws:';
+        ws = new WebSocket(`${proto}//${location.host}/ws/track`);
+        ws.onopen = () => {
+            open = everOpen = true;
+            failures = 0;
+            if (targetId !== null) send({ type: 'target', location_id: targetId });
+        };
+        ws.onmessage = e => handle(JSON.parse(e.data));
+        ws.onclose = () => {
+            open = false;
+            ws = null;
+            failures++;
+            // Never opened at all: the server has no WebSocket route.
+            if (!everOpen && failures >= 3) return;
+            setTimeout(connect, Math.min(MAX_BACKOFF_MS, 1000 * 2 ** failures));
+        };
+    }
+
+    function handle(msg) {
+        switch (msg.type) {
+        case 'hello':
+            sessionId = msg.session;
+            break;
+        case 'ping':
+            send({ type: 'pong' });
+            break;
+        case 'dataset':
+            OfflineStore.sync().then(changed => { if (changed) refreshDistance(); });
+            break;
+        case 'distance':
+            if (String(msg.location_id) === String(targetId) && onDistance) onDistance(msg);
+            break;
+        case 'error':
+            console.warn('Live session:', msg.error);
+            break;
+        }
+    }
+
+    function send(msg) {
+        if (!open) return false;
+        ws.send(JSON.stringify(msg));
+        return true;
+    }
+
+    function setTarget(id) {
+        targetId = id;
+        return send({ type: 'target', location_id: Number(id) });
+    }
+
+    function sendFix(fix, callback) {
+        onDistance = callback;
+        return send([fix.lat, fix.lon, fix.t, fix.accuracy, fix.speed]);
+    }
+
+    // The HTTP fallback shares the session id, so the server can spot the
+    // same fix arriving over both paths.
+    function headers() {
+        return sessionId === null ? {} : { 'X-Tracking-Session': String(sessionId) };
+    }
+
+    function adopt(response) {
+        const id = response.headers.get('X-Tracking-Session');
+        if (id !== null && !open) sessionId = Number(id);
+        return response;
+    }
+
+    return { connect, setTarget, sendFix, headers, adopt, isOpen: () => open };
+})();
@@ -0,0 +1,189 @@
+// ── Offline Map ─────────────────────────────────────────────
+// Raster tiles from the server's MBTiles files (/tiles, see tiles.py)
+// with the targets and the current position on top. No map library
+// and nothing from the internet. The map follows the phone until it is
+// dragged; ⌖ centres it again. 🔥 lays the server's heatmap of where
+// devices spend time (/heat, see heatmap.py) over it. It stays hidden
+// when the server has no tilesets.
+const TileMap = (() => {
+    const TILE = 256;
+    const DEFAULT_ZOOM = 15;
+    const HEAT_URL = '/heat/{z}/{x}/{y}.png';
+    const HEAT_MAX_ZOOM = 17;     // heatmap.MAX_ZOOM
+
+    let box       = null;
+    let tileLayer = null;
+    let heatLayer = null;
+    let markers   = null;
+    let heat      = false;
+    let tileset   = null;
+    let source    = () => [];     // current targets, [{id, name, latitude, longitude}]
+    let zoom      = DEFAULT_ZOOM;
+    let center    = null;         // {lat, lon}
+    let follow    = true;
+    let position  = null;
+    let selected  = null;
+    let drag      = null;
+    const tiles   = new Map();    // "z/x/y" -> <img>
+    const heatTiles = new Map();
+
+    // Web Mercator, in pixels at zoom z.
+    function toPixels(lat, lon, z) {
+        const size = TILE * 2 ** z;
+        const s = Math.sin(lat * Math.PI / 180);
+        return {
+            x: (lon + 180) / 360 * size,
+            y: (0.5 - Math.log((1 + s) / (1 - s)) / (4 * Math.PI)) * size
+        };
+    }
+
+    function fromPixels(x, y, z) {
+        const size = TILE * 2 ** z;
+        const n = Math.PI - 2 * Math.PI * y / size;
+        return { lat: Math.atan(Math.sinh(n)) * 180 / Math.PI, lon: x / size * 360 - 180 };
+    }
+
+    async function init(targets) {
+        box = document.getElementById('tileMap');
+        if (!box) return;
+        source = targets;
+        let data;
+        try {
+            data = await (await fetch('/tiles')).json();
+        } catch (e) {
+            return;
+        }
+        if (!data.tilesets || !data.tilesets.length) return;
+        tileset = data.tilesets[0];
+        zoom = Math.min(tileset.maxzoom, Math.max(tileset.minzoom, DEFAULT_ZOOM));
+        if (tileset.center) center = { lat: tileset.center[1], lon: tileset.center[0] };
+        else if (tileset.bounds) {
+            const [w, s, e, n] = tileset.bounds;
+            center = { lat: (s + n) / 2, lon: (w + e) / 2 };
+        } else center = { lat: 0, lon: 0 };
+        tileLayer = document.createElement('div');
+        heatLayer = document.createElement('div');
+        markers   = document.createElement('div');
+        tileLayer.className = 'tile-layer';
+        heatLayer.className = 'tile-layer heat-layer';
+        markers.className   = 'marker-layer';
+        box.append(tileLayer, heatLayer, markers);
+        document.getElementById('mapAttribution').innerText = tileset.attribution || '';
+        document.getElementById('mapBox').hidden = false;
+        box.addEventListener('pointerdown', startDrag);
+        box.addEventListener('pointermove', moveDrag);
+        box.addEventListener('pointerup', endDrag);
+        box.addEventListener('pointercancel', endDrag);
+        window.addEventListener('resize', render);
+        if (position) setPosition(position);
+        else select(selected);
+    }
+
+    function startDrag(e) {
+        drag = { x: e.clientX, y: e.clientY, at: toPixels(center.lat, center.lon, zoom) };
+        box.setPointerCapture(e.pointerId);
+    }
+
+    function moveDrag(e) {
+        if (!drag) return;
+        center = fromPixels(drag.at.x - (e.clientX - drag.x), drag.at.y - (e.clientY - drag.y), zoom);
+        follow = false;
+        render();
+    }
+
+    function endDrag() {
+        drag = null;
+    }
+
+    function render() {
+        if (!tileset) return;
+        const w = box.clientWidth, h = box.clientHeight;
+        const c = toPixels(center.lat, center.lon, zoom);
+        const left = c.x - w / 2, top = c.y - h / 2;
+        drawTiles(tileLayer, tiles, tileset.url, left, top, w, h);
+        drawTiles(heatLayer, heatTiles, heat && zoom <= HEAT_MAX_ZOOM ? HEAT_URL : null, left, top, w, h);
+        drawMarkers(left, top, w, h);
+    }
+
+    // Keeps one <img> per visible tile of `url` in `layer`; no url clears it.
+    function drawTiles(layer, cache, url, left, top, w, h) {
+        const n = 2 ** zoom;
+        const wanted = new Set();
+        for (let ty = Math.floor(top / TILE); url && ty * TILE < top + h; ty++) {
+            if (ty < 0 || ty >= n) continue;
+            for (let tx = Math.floor(left / TILE); tx * TILE < left + w; tx++) {
+                const x = ((tx % n) + n) % n;
+                const key = `${zoom}/${x}/${ty}`;
+                wanted.add(key);
+                let img = cache.get(key);
+                if (!img) {
+                    img = document.createElement('img');
+                    img.alt = '';
+                    img.draggable = false;
+                    img.onerror = () => { img.style.visibility = 'hidden'; };
+                    img.src = url.replace('{z}', zoom).replace('{x}', x).replace('{y}', ty);
+                    cache.set(key, img);
+                    layer.appendChild(img);
+                }
+                img.style.transform = `translate(${tx * TILE - left}px, ${ty * TILE - top}px)`;
+            }
+        }
+        for (const [key, img] of cache) {
+            if (!wanted.has(key)) { img.remove(); cache.delete(key); }
+        }
+    }
+
+    function drawMarkers(left, top, w, h) {
+        markers.textContent = '';
+        const place = (lat, lon, className, title) => {
+            const p = toPixels(lat, lon, zoom);
+            const x = p.x - left, y = p.y - top;
+            if (x < -20 || y < -20 || x > w + 20 || y > h + 20) return;
+            const m = document.createElement('div');
+            m.className = className;
+            m.style.transform = `translate(${x}px, ${y}px)`;
+            if (title) m.title = title;
+            markers.appendChild(m);
+        };
+        for (const t of source()) {
+            place(t.latitude, t.longitude,
+                  String(t.id) === String(selected) ? 'map-marker target selected' : 'map-marker target', t.name);
+        }
+        if (position) place(position.lat, position.lon, 'map-marker position');
+    }
+
+    function setPosition(fix) {
+        position = fix;
+        if (!tileset) return;
+        if (follow) center = { lat: fix.lat, lon: fix.lon };
+        render();
+    }
+
+    function select(id) {
+        selected = id;
+        if (!tileset) return;
+        // Before the first fix, show the target instead of the tileset centre.
+        const target = !position && source().find(t => String(t.id) === String(id));
+        if (target) center = { lat: target.latitude, lon: target.longitude };
+        render();
+    }
+
+    function zoomBy(step) {
+        if (!tileset) return;
+        zoom = Math.min(tileset.maxzoom, Math.max(tileset.minzoom, zoom + step));
+        render();
+    }
+
+    function toggleHeat() {
+        heat = !heat;
+        document.getElementById('heatToggle').classList.toggle('active', heat);
+        render();
+    }
+
+    function recenter() {
+        follow = true;
+        if (position) setPosition(position);
+    }
+
+    return { init, setPosition, select, zoomBy, recenter, toggleHeat, render };
+})();
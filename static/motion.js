@@ -0,0 +1,67 @@
+// ── Motion ──────────────────────────────────────────────────
+// Between fixes the page runs on from the last answer along a motion
+// model {lat, lon, speed, heading, eta, horizon} (tracking.Motion): the
+// server sends one with every answer, and for distances computed on the
+// phone model() builds the same thing from the fixes passed to add().
+// project() moves the last distance and bearing along the model; over a
+// horizon of a minute or less a flat-earth step is plenty.
+const Motion = (() => {
+    // Same rule and constants as tracking.py.
+    const FIXES      = 8;
+    const WINDOW_S   = 10;
+    const SMOOTHING  = 0.7;
+    const HORIZON_S  = 60;
+    const MIN_SPEED  = 0.5;
+    const R          = 6371000;
+    const RAD        = Math.PI / 180;
+
+    let fixes = [];       // {t (s), lat, lon}, oldest first
+    let north = 0;        // m/s
+    let east  = 0;
+
+    function add(fix) {
+        const t = fix.t / 1000;
+        const last = fixes[fixes.length - 1];
+        if (last && t <= last.t) {
+            if (t < last.t) { fixes = []; north = east = 0; }
+            else fixes.pop();
+        }
+        fixes.push({ t, lat: fix.lat, lon: fix.lon });
+        if (fixes.length > FIXES) fixes.shift();
+        while (fixes.length > 2 && t - fixes[0].t > WINDOW_S) fixes.shift();
+        const first = fixes[0];
+        if (t === first.t) return;
+        let n = (fix.lat - first.lat) * RAD * R;
+        let e = (fix.lon - first.lon) * RAD * R * Math.cos(first.lat * RAD);
+        if (Math.hypot(n, e) <= (fix.accuracy || 0)) n = e = 0;
+        north += SMOOTHING * (n / (t - first.t) - north);
+        east  += SMOOTHING * (e / (t - first.t) - east);
+    }
+
+    function model(distance, bearing) {
+        const last = fixes[fixes.length - 1];
+        if (!last) return null;
+        const speed = Math.hypot(north, east);
+        if (speed < MIN_SPEED) {
+            return { lat: last.lat, lon: last.lon, speed: 0, heading: null, eta: null, horizon: 0 };
+        }
+        const heading = (Math.atan2(east, north) / RAD + 360) % 360;
+        const closing = speed * Math.cos((bearing - heading) * RAD);
+        return {
+            lat: last.lat, lon: last.lon, speed, heading,
+            eta: closing >= MIN_SPEED ? Math.round(distance / closing) : null,
+            horizon: Math.min(HORIZON_S, distance / speed)
+        };
+    }
+
+    // Distance and bearing to the target `seconds` after the model's fix,
+    // given both at the fix.
+    function project(distance, bearing, m, seconds) {
+        const s = Math.min(seconds, m.horizon) * m.speed;
+        const n = distance * Math.cos(bearing * RAD) - s * Math.cos(m.heading * RAD);
+        const e = distance * Math.sin(bearing * RAD) - s * Math.sin(m.heading * RAD);
+        return { distance: Math.hypot(n, e), bearing: (Math.atan2(e, n) / RAD + 360) % 360 };
+    }
+
+    return { add, model, project };
+})();
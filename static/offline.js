@@ -0,0 +1,120 @@
+// ── Offline Dataset (IndexedDB) ─────────────────────────────
+// The page keeps a local copy of all locations and computes distance and
+// bearing itself, so a GPS fix never needs the server. The server is only
+// asked for dataset changes (/locations/changes?since=<version>): on load,
+// when coming back online, when the tab becomes visible again and every
+// SYNC_INTERVAL_MS.
+const OfflineStore = (() => {
+    const DB_NAME          = 'gps-tracker';
+    const STORE            = 'locations';
+    const META             = 'meta';
+    const SYNC_INTERVAL_MS = 5 * 60 * 1000;
+
+    const byId  = new Map();
+    let db      = null;
+    let version = null;
+
+    function request(req) {
+        return new Promise((resolve, reject) => {
+            req.onsuccess = () => resolve(req.result);
+            req.onerror   = () => reject(req.error);
+        });
+    }
+
+    function openDb() {
+        const req = indexedDB.open(DB_NAME, 1);
+        req.onupgradeneeded = () => {
+            req.result.createObjectStore(STORE, { keyPath: 'id' });
+            req.result.createObjectStore(META);
+        };
+        return request(req);
+    }
+
+    async function load() {
+        const tx   = db.transaction([STORE, META]);
+        const rows = await request(tx.objectStore(STORE).getAll());
+        version = await request(tx.objectStore(META).get('version'));
+        if (version === undefined) version = null;
+        byId.clear();
+        rows.forEach(r => byId.set(r.id, r));
+    }
+
+    function apply(data, reset) {
+        const tx    = db.transaction([STORE, META], 'readwrite');
+        const store = tx.objectStore(STORE);
+        if (reset) {
+            byId.clear();
+            store.clear();
+        }
+        data.changes.forEach(r => { byId.set(r.id, r); store.put(r); });
+        data.deleted.forEach(id => { byId.delete(id); store.delete(id); });
+        version = data.version;
+        tx.objectStore(META).put(version, 'version');
+        return new Promise((resolve, reject) => {
+            tx.oncomplete = resolve;
+            tx.onerror    = () => reject(tx.error);
+        });
+    }
+
+    async function sync() {
+        let r;
+        try {
+            r = await fetch('/locations/changes?since=' + (version === null ? 0 : version));
+        } catch (e) {
+            return false;  // offline: keep using the local copy
+        }
+        if (!r.ok) return false;
+        const data = await r.json();
+        if (data.version === version) return false;
+        await apply(data, data.reset || version === null);
+        return true;
+    }
+
+    async function init() {
+        if (!('indexedDB' in window)) return false;
+        try {
+            db = await openDb();
+            await load();
+        } catch (e) {
+            console.warn('IndexedDB unavailable:', e);
+            return false;
+        }
+        const first = sync();
+        if (byId.size === 0) await first;
+        setInterval(sync, SYNC_INTERVAL_MS);
+        window.addEventListener('online', sync);
+        document.addEventListener('visibilitychange', () => {
+            if (document.visibilityState === 'visible') sync();
+        });
+        return true;
+    }
+
+    function get(id) {
+        return byId.get(Number(id));
+    }
+
+    function all() {
+        return [...byId.values()];
+    }
+
+    // Apply the reply of our own /api/locations call. If someone else
+    // changed the dataset in between, fall back to a regular delta sync.
+    function applyLocal(data) {
+        if (!db) return;
+        if (version === null || data.version !== version + 1) {
+            sync();
+            return;
+        }
+        apply({
+            version: data.version,
+            changes: data.location ? [data.location] : [],
+            deleted: data.location ? [] : [data.deleted]
+        }, false);
+    }
+
+    return { init, sync, get, all, applyLocal };
+})();
+
+if ('serviceWorker' in navigator) {
+    navigator.serviceWorker.register('/sw.js').catch(err => console.warn('Service worker:', err));
+}
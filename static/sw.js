@@ -0,0 +1,49 @@
+// Service worker: lets the page itself open without a network.
+// Hashed /assets/ URLs never change, so they are served cache-first;
+// the page is network-first with the cached copy as offline fallback.
+// Map tiles with the tileset version in the URL (?v=, see tiles.py) never
+// change either, so once seen they are there without a network too.
+// Location data lives in IndexedDB (see offline.js), not here.
+const CACHE = 'gps-tracker-v1';
+
+self.addEventListener('install', e => {
+    e.waitUntil(caches.open(CACHE).then(c => c.add('/')));
+    self.skipWaiting();
+});
+
+self.addEventListener('activate', e => {
+    e.waitUntil(caches.keys()
+        .then(keys => Promise.all(keys.filter(k => k !== CACHE).map(k => caches.delete(k))))
+        .then(() => self.clients.claim()));
+});
+
+async function cacheFirst(req) {
+    const cached = await caches.match(req);
+    if (cached) return cached;
+    const resp = await fetch(req);
+    if (resp.ok) (await caches.open(CACHE)).put(req, resp.clone());
+    return resp;
+}
+
+async function networkFirst(req) {
+    try {
+        const resp = await fetch(req);
+        if (resp.ok) (await caches.open(CACHE)).put(req, resp.clone());
+        return resp;
+    } catch (e) {
+        const cached = await caches.match(req);
+        if (cached) return cached;
+        throw e;
+    }
+}
+
+self.addEventListener('fetch', e => {
+    const url = new URL(e.request.url);
+    if (e.request.method !== 'GET' || url.origin !== self.location.origin) return;
+    if (url.pathname.startsWith('/assets/')
+            || (url.pathname.startsWith('/tiles/') && url.searchParams.has('v'))) {
+        e.respondWith(cacheFirst(e.request));
+    } else if (url.pathname === '/') {
+        e.respondWith(networkFirst(e.request));
+    }
+});
@@ -0,0 +1,251 @@
+"""Compact in-memory copy of the ``locations`` table.
+
+A list of ``fetchall()`` tuples costs 150+ bytes per location (tuple,
+two floats, an int and a str object each). ``LocationStore`` keeps the
+same data as parallel ``array`` columns instead:
+
+``ids``         int64, one per slot
+``lats/lons``   float64 (or float32 with ``precision='float32'``, about 1 m
+                resolution at these longitudes)
+``name_refs``   uint32 index into a ``NamePool``: UTF-8 bytes in one
+                buffer, identical names stored once
+
+plus ``index``, an int32 array mapping id -> slot (ids from SQLite are
+dense, so this is 4 bytes per id up to the largest one; ids far beyond
+that fall back to a dict). With distinct names of about a dozen
+characters that is 60-70 bytes per location with float64, so 10M
+locations fit in well under a gigabyte; repeated names cost less.
+
+Slots are dense: removing a location moves the last slot into the hole,
+so ``lats[:len(store)]`` is always the live data and can be handed to
+NumPy without copying (``store.numpy()``). Those views pin the arrays:
+updates in place show through them, but adding or removing a location
+raises ``BufferError``, leaving the store as it was, until every view is
+released (``del``).
+"""
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+COORD_TYPES = {'float64': 'd', 'float32': 'f'}
+SPARSE_GAP = 1 << 20   # ids further than this past the index go to a dict
+
+
+class NamePool:
+    """Append-only interned strings. ``intern(name)`` returns a stable
+    index; equal names share one copy of their bytes. The lookup table is
+    open addressing over an int32 array kept at most 2/3 full, so a
+    distinct name costs 8 bytes of offset plus 6-12 bytes of table on top
+    of its text."""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = array('Q', [0])
+        self.table = array('i', [-1]) * 1024
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def _bytes(self, i):
+        return self.data[self.offsets[i]:self.offsets[i + 1]]
+
+    def _probe(self, raw):
+        # slot in table holding raw, or the empty slot where it would go
+        table, data, offsets = self.table, self.data, self.offsets
+        mask = len(table) - 1
+        h = hash(raw) & mask
+        while True:
+            i = table[h]
+            if i < 0 or data[offsets[i]:offsets[i + 1]] == raw:
+                return h
+            h = (h + 1) & mask
+
+    def intern(self, name):
+        raw = name.encode()
+        h = self._probe(raw)
+        i = self.table[h]
+        if i >= 0:
+            return i
+        i = len(self.offsets) - 1
+        self.data += raw
+        self.offsets.append(len(self.data))
+        self.table[h] = i
+        if i * 3 >= len(self.table) * 2:
+            self._grow()
+        return i
+
+    def _grow(self):
+        self.table = table = array('i', [-1]) * (len(self.table) * 2)
+        data, offsets = self.data, self.offsets
+        mask = len(table) - 1
+        for i in range(len(offsets) - 1):
+            h = hash(bytes(data[offsets[i]:offsets[i + 1]])) & mask
+            while table[h] >= 0:
+                h = (h + 1) & mask
+            table[h] = i
+
+    def get(self, i):
+        return self._bytes(i).decode()
+
+    def nbytes(self):
+        return (len(self.data) + self.offsets.itemsize * len(self.offsets)
+                + self.table.itemsize * len(self.table))
+
+
+class LocationStore:
+    def __init__(self, precision='float64'):
+        code = COORD_TYPES[precision]
+        self.precision = precision
+        self.ids = array('q')
+        self.lats = array(code)
+        self.lons = array(code)
+        self.name_refs = array('I')
+        self.names = NamePool()
+        self.index = array('i')
+        self.sparse = {}
+
+    @classmethod
+    def from_rows(cls, rows, precision='float64'):
+        """Build from any iterable of ``(id, name, lat, lon)``, e.g. a cursor;
+        rows are consumed one at a time, never all held at once."""
+        store = cls(precision)
+        add = store.add
+        for id, name, lat, lon in rows:
+            add(id, name, lat, lon)
+        return store
+
+    @classmethod
+    def load(cls, conn, precision='float64'):
+        return cls.from_rows(conn.execute('SELECT id, name, latitude, longitude FROM locations'), precision)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, id):
+        return self.slot(id) is not None
+
+    def slot(self, id):
+        if 0 <= id < len(self.index):
+            s = self.index[id]
+            return s if s >= 0 else None
+        return self.sparse.get(id)
+
+    def _set_slot(self, id, s):
+        if id < 0 or id >= len(self.index) + SPARSE_GAP:
+            if s < 0:
+                self.sparse.pop(id, None)
+            else:
+                self.sparse[id] = s
+            return
+        if id >= len(self.index):
+            # grow geometrically so appends in id order stay O(1) amortised
+            self.index.extend(array('i', [-1]) * max(id + 1 - len(self.index), len(self.index)))
+        self.index[id] = s
+
+    def add(self, id, name, lat, lon):
+        """Insert, or overwrite if ``id`` exists. Amortised O(1)."""
+        s = self.index[id] if 0 <= id < len(self.index) else self.sparse.get(id)
+        if s is not None and s >= 0:
+            self.lats[s], self.lons[s] = lat, lon
+            self.name_refs[s] = self.names.intern(name)
+            return
+        s = len(self.ids)
+        try:
+            self.ids.append(id)
+            self.lats.append(lat)
+            self.lons.append(lon)
+        except BufferError:
+            # A numpy() view is still alive; undo the columns that grew.
+            for column in (self.ids, self.lats, self.lons):
+                del column[s:]
+            raise
+        self.name_refs.append(self.names.intern(name))
+        self._set_slot(id, s)
+
+    def update(self, id, name=None, lat=None, lon=None):
+        s = self.slot(id)
+        if s is None:
+            raise KeyError(id)
+        if name is not None:
+            self.name_refs[s] = self.names.intern(name)
+        if lat is not None:
+            self.lats[s] = lat
+        if lon is not None:
+            self.lons[s] = lon
+
+    def remove(self, id):
+        """Delete by moving the last slot into the hole. O(1)."""
+        s = self.slot(id)
+        if s is None:
+            raise KeyError(id)
+        columns = (self.ids, self.lats, self.lons)
+        popped = []
+        try:
+            for column in columns:
+                popped.append(column.pop())
+        except BufferError:
+            # A numpy() view is still alive; put back what was popped.
+            for column, value in zip(columns, popped):
+                column.append(value)
+            raise
+        ref = self.name_refs.pop()
+        if s != len(self.ids):
+            moved, lat, lon = popped
+            self.ids[s], self.lats[s], self.lons[s] = moved, lat, lon
+            self.name_refs[s] = ref
+            self._set_slot(moved, s)
+        self._set_slot(id, -1)
+
+    def discard(self, id):
+        if id in self:
+            self.remove(id)
+
+    def get(self, id):
+        s = self.slot(id)
+        if s is None:
+            raise KeyError(id)
+        return self.row(s)
+
+    def row(self, s):
+        return self.ids[s], self.names.get(self.name_refs[s]), self.lats[s], self.lons[s]
+
+    def coords(self, id):
+        s = self.slot(id)
+        if s is None:
+            raise KeyError(id)
+        return self.lats[s], self.lons[s]
+
+    def __iter__(self):
+        for s in range(len(self.ids)):
+            yield self.row(s)
+
+    def apply_changes(self, reset, upserts, deleted):
+        """Apply a ``changelog.changes_since`` delta."""
+        if reset:
+            self.__init__(self.precision)
+        for id, name, lat, lon in upserts:
+            self.add(id, name, lat, lon)
+        for id in deleted:
+            self.discard(id)
+
+    def numpy(self):
+        """Zero-copy NumPy views ``(ids, lats, lons)`` of the live slots.
+
+        Release them before the next ``add`` of a new id or ``remove``:
+        while any is alive those raise ``BufferError``."""
+        if numpy is None:
+            raise RuntimeError('numpy is not installed')
+        return (numpy.frombuffer(self.ids, dtype=numpy.int64),
+                numpy.frombuffer(self.lats, dtype=self.precision),
+                numpy.frombuffer(self.lons, dtype=self.precision))
+
+    def nbytes(self):
+        """Bytes held by the columns, index and name pool (allocated capacity
+        of ``array`` objects is not visible; see bench/bench_store.py for
+        measured process memory)."""
+        columns = (self.ids, self.lats, self.lons, self.name_refs, self.index)
+        return (sum(c.itemsize * len(c) for c in columns) + self.names.nbytes()
+                + 100 * len(self.sparse))
@@ -0,0 +1,21 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """``app13-v4.py`` loaded fresh, with its databases in ``tmp_path``."""
+    monkeypatch.chdir(tmp_path)
+    spec = importlib.util.spec_from_file_location('app13_v4', os.path.join(ROOT, 'app13-v4.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    yield module
+    module.sessions.stop()
+    module.jobs.shutdown()
@@ -0,0 +1,78 @@
+import sqlite3
+import time
+
+import pytest
+
+import changelog
+from changelog import changes_since, compact, current_version, floor_version, init_changelog
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE locations (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, '
+                 'latitude REAL NOT NULL, longitude REAL NOT NULL)')
+    conn.execute("INSERT INTO locations (name, latitude, longitude) VALUES ('Monas', -6.1754, 106.8272)")
+    init_changelog(conn)
+    return conn
+
+
+def add(conn, name):
+    conn.execute('INSERT INTO locations (name, latitude, longitude) VALUES (?, -6.2, 106.8)', (name,))
+    conn.commit()
+
+
+def test_rows_before_the_triggers_get_a_version(conn):
+    assert current_version(conn) == 1
+    version, reset, upserts, deleted = changes_since(conn, 0)
+    assert (version, reset, deleted) == (1, False, [])
+    assert upserts == [(1, 'Monas', -6.1754, 106.8272)]
+
+
+def test_delta_has_current_values_and_deletions(conn):
+    add(conn, 'Kota Tua')
+    conn.execute("UPDATE locations SET name = 'Monumen Nasional' WHERE id = 1")
+    conn.execute('DELETE FROM locations WHERE id = 2')
+    conn.commit()
+    version, reset, upserts, deleted = changes_since(conn, 1)
+    assert (version, reset) == (4, False)
+    assert upserts == [(1, 'Monumen Nasional', -6.1754, 106.8272)]
+    assert deleted == [2]
+    assert changes_since(conn, version)[2:] == ([], [])
+
+
+def test_version_from_another_database_resets(conn):
+    version, reset, upserts, _ = changes_since(conn, 99)
+    assert reset and version == 1 and len(upserts) == 1
+
+
+def test_compaction_keeps_versions_and_raises_the_floor(conn):
+    add(conn, 'Kota Tua')                       # v2
+    conn.execute('DELETE FROM locations WHERE id = 2')    # v3, tombstone
+    conn.execute("UPDATE locations SET name = 'Monas' WHERE id = 1")   # v4
+    conn.commit()
+    compact(conn)
+    # newest entry per location stays; a fresh tombstone is kept
+    assert conn.execute('SELECT version FROM location_changes ORDER BY version').fetchall() == [(3,), (4,)]
+    assert floor_version(conn) == 0
+    assert changes_since(conn, 1)[1:] == (False, [(1, 'Monas', -6.1754, 106.8272)], [2])
+
+    compact(conn, now=time.time() + changelog.TOMBSTONE_TTL + 60)
+    assert floor_version(conn) == 3
+    # the newest row may go, the version never goes back
+    assert current_version(conn) == 4
+    assert changes_since(conn, 2)[1] is True
+    assert changes_since(conn, 3)[1:] == (False, [(1, 'Monas', -6.1754, 106.8272)], [])
+    # the floor only rises
+    conn.execute("INSERT INTO changelog_meta (key, value) VALUES ('floor', 1) "
+                 "ON CONFLICT (key) DO UPDATE SET value = MAX(value, excluded.value)")
+    assert floor_version(conn) == 3
+
+
+def test_maybe_compact_waits_for_the_interval(conn, monkeypatch):
+    calls = []
+    monkeypatch.setattr(changelog, 'compact', lambda conn, now: calls.append(now))
+    monkeypatch.setattr(changelog, '_last_compact', 0.0)
+    changelog.maybe_compact(conn)
+    changelog.maybe_compact(conn)
+    assert len(calls) == 1
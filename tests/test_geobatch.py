@@ -0,0 +1,66 @@
+import csv
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+
+from geo import haversine
+from geobatch import glue_targets
+
+
+def run(tmp_path, *args):
+    src = tmp_path / 'in.csv'
+    src.write_text('name,lat,lon\njakarta,-6.2,106.8\nsurabaya,-7.25,112.75\n')
+    out = subprocess.run([sys.executable, os.path.join(ROOT, 'geobatch.py'), 'many', str(src), *args,
+                          '--workers', '1', '--quiet'], capture_output=True, text=True, cwd=tmp_path)
+    assert out.returncode == 0, out.stderr
+    return list(csv.DictReader(out.stdout.splitlines()))
+
+
+def test_many_negative_latitude_target(tmp_path):
+    rows = run(tmp_path, '--target', '-7,107', '--target=-6.2,106.8')
+    assert [(r['name'], r['target']) for r in rows] == [
+        ('jakarta', '0'), ('jakarta', '1'), ('surabaya', '0'), ('surabaya', '1')]
+    assert float(rows[0]['distance']) == round(haversine(-6.2, 106.8, -7.0, 107.0), 3)
+    assert float(rows[1]['distance']) == 0
+
+
+def test_glue_targets():
+    assert glue_targets(['many', 'in.csv', '--target', '-7,107', '--target', '6,-107']) == [
+        'many', 'in.csv', '--target=-7,107', '--target', '6,-107']
+    # Only a LAT,LON pair is glued on; a following option stays an option.
+    assert glue_targets(['--target', '--locations']) == ['--target', '--locations']
+
+
+def test_chunks_take_the_numpy_path(monkeypatch):
+    numpy = pytest.importorskip('numpy')
+    import geo
+    import geobatch
+    seen = []
+    for name in ('haversine_pairs', 'bearing_pairs', 'haversine_many', 'bearing_many'):
+        kernel = getattr(geo, name)
+
+        def spy(*args, kernel=kernel):
+            out = kernel(*args)
+            seen.append((kernel.__name__, type(args[-1]), type(out)))
+            return out
+        monkeypatch.setattr(geo, name, spy)
+
+    rows = [['-6.2', '106.8', '-7.25', '112.75'], ['x', '1', '2', '3'], ['-6.2', '106.8', '-6.2', '106.8']]
+    geobatch._init_worker(dict(mode='pairs', targets=None, block=None))
+    pairs = geobatch._compute(rows)
+    geobatch._init_worker(dict(mode='many', targets=([0, 1], [-7.25, -6.2], [112.75, 106.8]), block=None))
+    many = geobatch._compute([r[:2] for r in rows])
+
+    assert seen and all(arg is numpy.ndarray and out is numpy.ndarray for _, arg, out in seen)
+    assert {name for name, _, _ in seen} == {'haversine_pairs', 'bearing_pairs', 'haversine_many', 'bearing_many'}
+    assert pairs[1] == [] and many[1] == []
+    assert pairs[0][0][1] == pytest.approx(haversine(-6.2, 106.8, -7.25, 112.75))
+    assert pairs[0][0][2] == pytest.approx(geo.bearing(-6.2, 106.8, -7.25, 112.75))
+    assert [(label, round(d, 6)) for label, d, _ in many[0]] == [
+        (0, round(haversine(-6.2, 106.8, -7.25, 112.75), 6)), (1, 0.0)]
+    # plain floats come back, as on the scalar path
+    assert type(pairs[0][0][1]) is float and type(many[2][0][2]) is float
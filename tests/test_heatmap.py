@@ -0,0 +1,66 @@
+import zlib
+
+import heatmap
+from heatmap import CELLS, EMPTY_PNG, MAX_DWELL, MAX_ZOOM, HeatGrid, cell_of
+
+
+def pixels(png):
+    """Palette indexes of a 256x256 tile from ``encode_png``."""
+    i, idat = 8, b''
+    while i < len(png):
+        size = int.from_bytes(png[i:i + 4], 'big')
+        if png[i + 4:i + 8] == b'IDAT':
+            idat += png[i + 8:i + 8 + size]
+        i += 12 + size
+    raw = zlib.decompress(idat)
+    return [raw[r * 257 + 1:(r + 1) * 257] for r in range(256)]
+
+
+def tile_of(lat, lon, z):
+    gx, gy = cell_of(lat, lon)
+    shift = MAX_ZOOM - z
+    return z, (gx >> shift) // CELLS, (gy >> shift) // CELLS
+
+
+def test_flush_rolls_up_every_level_and_bumps_the_generation(tmp_path):
+    grid = HeatGrid(db=str(tmp_path / 'heat.db'))
+    grid.add(-6.1754, 106.8272, 30)
+    grid.add(-6.1754, 106.8272, 10 * MAX_DWELL)     # a long gap counts as MAX_DWELL
+    assert grid.flush() > MAX_ZOOM
+    assert grid.flush() == 0
+    with grid.connect() as conn:
+        per_level = conn.execute('SELECT z, SUM(seconds), SUM(fixes) FROM heat_cells GROUP BY z').fetchall()
+        assert per_level == [(z, 30 + MAX_DWELL, 2) for z in range(MAX_ZOOM + 1)]
+        first = grid.generation(conn, *tile_of(-6.1754, 106.8272, 12))
+    grid.add(-6.1754, 106.8272, 5)
+    grid.flush()
+    with grid.connect() as conn:
+        assert grid.generation(conn, *tile_of(-6.1754, 106.8272, 12)) == first + 1
+        # a tile that got nothing keeps no generation
+        assert grid.generation(conn, *tile_of(-7.25, 112.75, 12)) is None
+
+
+def test_tiles_are_redrawn_only_for_a_new_generation(tmp_path):
+    grid = HeatGrid(db=str(tmp_path / 'heat.db'))
+    assert grid.tile(*tile_of(-6.1754, 106.8272, 15)) == (EMPTY_PNG, None)
+    grid.add(-6.1754, 106.8272, 60)
+    z, x, y = tile_of(-6.1754, 106.8272, 15)
+    png, generation = grid.tile(z, x, y)        # flushes the buffer first
+    assert generation == 1 and any(any(row) for row in pixels(png))
+    assert grid.tile(z, x, y) == (png, 1) and grid.drawn == 1
+    grid.add(-6.1754, 106.8272, 60)
+    assert grid.tile(z, x, y)[1] == 2 and grid.drawn == 2
+
+
+def test_edge_cells_touch_the_neighbouring_tile(tmp_path, monkeypatch):
+    grid = HeatGrid(db=str(tmp_path / 'heat.db'))
+    # first cell column of a MAX_ZOOM tile: the blur reaches into the tile to the west
+    gx, gy = cell_of(-6.1754, 106.8272)
+    gx -= gx % CELLS
+    monkeypatch.setattr(heatmap, 'cell_of', lambda lat, lon: (gx, gy))
+    grid.add(0, 0, 1)
+    grid.flush()
+    with grid.connect() as conn:
+        tx, ty = gx // CELLS, gy // CELLS
+        assert grid.generation(conn, MAX_ZOOM, tx - 1, ty) == 1
+        assert grid.generation(conn, MAX_ZOOM, tx + 1, ty) is None
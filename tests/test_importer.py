@@ -0,0 +1,41 @@
+import io
+import sqlite3
+
+import pytest
+
+import importer
+from importer import WaypointError, import_waypoints
+
+
+def gpx(n, broken=False):
+    body = ''.join(f'<wpt lat="{-6 - i * 0.01:.4f}" lon="106.8"><name>Titik {i}</name></wpt>' for i in range(n))
+    tail = '<wpt lat="1" lon="2"><name>' if broken else '</gpx>'
+    return io.BytesIO(f'<gpx xmlns="http://www.topografix.com/GPX/1/1">{body}{tail}'.encode())
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:', isolation_level=None)
+    conn.execute('CREATE TABLE locations (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, '
+                 'latitude REAL NOT NULL, longitude REAL NOT NULL)')
+    return conn
+
+
+def test_import_skips_near_duplicates(conn):
+    stats = import_waypoints(conn, io.BytesIO(
+        b'<gpx><wpt lat="-6.2" lon="106.8"><name>A</name></wpt>'
+        b'<wpt lat="-6.20001" lon="106.8"><name>B</name></wpt>'
+        b'<wpt lat="95" lon="106.8"/><wpt lat="x" lon="1"/></gpx>'), min_distance=10)
+    assert stats == dict(imported=1, skipped=1, invalid=2)
+
+
+def test_broken_file_reports_committed_batches(conn, monkeypatch):
+    monkeypatch.setattr(importer, 'BATCH_SIZE', 2)
+    with pytest.raises(WaypointError) as info:
+        import_waypoints(conn, gpx(5, broken=True), min_distance=0)
+    e = info.value
+    # two full batches went in; the fifth point was pending and is dropped
+    assert e.stats['imported'] == 4
+    assert e.last_id == 4
+    assert conn.execute('SELECT COUNT(*), MAX(id) FROM locations').fetchone() == (4, 4)
+    assert not conn.in_transaction
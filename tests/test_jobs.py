@@ -0,0 +1,68 @@
+import random
+import sqlite3
+import time
+
+import pytest
+
+import jobs
+from changelog import init_changelog
+from geo import haversine
+
+POINTS = [(-6.2, 106.8), (0.0, 179.99), (0.0, -179.99), (89.9, 0.0), (-6.17, 106.83)]
+
+
+@pytest.fixture
+def block(tmp_path):
+    rnd = random.Random(3)
+    rows = [(f'Titik {i}', rnd.uniform(-10, 10), rnd.uniform(100, 115)) for i in range(500)]
+    rows += [('Timur', 0.0, -179.995), ('Kutub', 89.0, 120.0)]
+    db = tmp_path / 'locations.db'
+    with sqlite3.connect(db) as conn:
+        conn.execute('CREATE TABLE locations (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, '
+                     'latitude REAL NOT NULL, longitude REAL NOT NULL)')
+        conn.executemany('INSERT INTO locations (name, latitude, longitude) VALUES (?, ?, ?)', rows)
+        init_changelog(conn)
+    name, count, version = jobs.build_locations(str(db))
+    yield name, count, [(i + 1, lat, lon) for i, (_, lat, lon) in enumerate(rows)]
+    jobs.unlink_block(name)
+
+
+def test_nearest_matches_a_full_scan(block):
+    name, count, rows = block
+    ids, _, _, distances = jobs.nearest_many(name, count, [p[0] for p in POINTS], [p[1] for p in POINTS])
+    for (lat, lon), id, d in zip(POINTS, ids, distances):
+        best = min(rows, key=lambda r: haversine(lat, lon, r[1], r[2]))
+        assert id == best[0]
+        assert d == pytest.approx(haversine(lat, lon, best[1], best[2]))
+    # across the antimeridian and near the pole
+    assert ids[1] == ids[2] == 501 and ids[3] == 502
+
+
+@pytest.mark.parametrize('kind, points, targets', [
+    ('nearby', [[0, 0]], None),
+    ('nearest', [], None),
+    ('nearest', [[91, 0]], None),
+    ('nearest', [[0]], None),
+    ('nearest', [[0, 0]], [1]),
+    ('matrix', [[0, 0]], ['x']),
+    ('matrix', [[0, 0]] * 1000, list(range(jobs.MAX_MATRIX_CELLS // 1000 + 1))),
+])
+def test_submit_rejects_bad_input(kind, points, targets):
+    with pytest.raises(jobs.JobError):
+        jobs.JobManager(db=':memory:').submit(kind, points, targets)
+
+
+def test_nearest_job_end_to_end(app):
+    client = app.app.test_client()
+    ids = [client.post('/api/locations', json=dict(name=name, latitude=lat, longitude=lon)).json['location']['id']
+           for name, lat, lon in [('Monas', -6.1754, 106.8272), ('Ancol', -6.1223, 106.8336)]]
+    resp = client.post('/jobs', json=dict(kind='nearest', points=[[-6.17, 106.83], [-6.12, 106.83]]))
+    assert resp.status_code == 202
+    url = resp.headers['Location']
+    deadline = time.monotonic() + 60
+    while client.get(url).json['status'] not in ('done', 'failed'):
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    result = client.get(url + '/result').json
+    assert result['status'] == 'done'
+    assert [row['location_id'] for row in result['rows']] == ids
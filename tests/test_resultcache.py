@@ -0,0 +1,71 @@
+from math import cos, radians
+
+import pytest
+
+from geo import haversine
+from resultcache import M_PER_DEG, ResultCache
+
+
+def test_key_cell_follows_accuracy():
+    cache = ResultCache(min_cell=2.0, max_cell=128.0)
+    assert cache.key(1, -6.2, 106.8)[1] == 2.0
+    assert cache.key(1, -6.2, 106.8, accuracy=13)[1] == 8.0
+    assert cache.key(1, -6.2, 106.8, accuracy=5000)[1] == 128.0
+    # a metre from the middle of an 8 m cell: still the same key
+    _, cell, row, col = cache.key(1, -6.2, 106.8, 13)
+    lat = (row + 0.5) * cell / M_PER_DEG
+    lon = (col + 0.5) * cell / (M_PER_DEG * cos(radians(row * cell / M_PER_DEG)))
+    assert cache.key(1, lat, lon, 13) == cache.key(1, lat + 1 / M_PER_DEG, lon, 13) == (1, cell, row, col)
+
+
+def test_invalidate_drops_only_that_target():
+    cache = ResultCache()
+    a1, a2 = cache.key(1, -6.2, 106.8), cache.key(1, -6.3, 106.8)
+    b = cache.key(2, -6.2, 106.8)
+    for key in (a1, a2, b):
+        cache.put(key, 100.0)
+    cache.invalidate(1)
+    assert cache.get(a1) is None and cache.get(a2) is None
+    assert cache.get(b) == 100.0
+    assert 1 not in cache.by_target
+    assert cache.stats()['invalidated'] == 2
+    cache.invalidate(1)
+    assert cache.stats()['invalidated'] == 2
+    # the target is cached again after its edit
+    cache.put(a1, 120.0)
+    assert cache.get(a1) == 120.0
+
+
+def test_eviction_keeps_the_target_index_in_step():
+    cache = ResultCache(size=2)
+    keys = [cache.key(t, -6.2, 106.8) for t in (1, 2, 3)]
+    for key in keys:
+        cache.put(key, 1.0)
+    assert list(cache.entries) == keys[1:]
+    assert set(cache.by_target) == {2, 3}
+    cache.get(keys[1])
+    cache.put(cache.key(4, -6.2, 106.8), 1.0)
+    assert set(cache.by_target) == {2, 4}
+
+
+def test_unchanged_within_a_cell_of_the_same_target():
+    cache = ResultCache()
+    key = cache.key(1, -6.2, 106.8, accuracy=10)
+    assert ResultCache.unchanged(key, 500.0, key, 505.0)
+    assert not ResultCache.unchanged(key, 500.0, key, 508.0)
+    assert not ResultCache.unchanged(key, 500.0, cache.key(2, -6.2, 106.8, accuracy=10), 500.0)
+    assert not ResultCache.unchanged(None, None, key, 500.0)
+
+
+def test_editing_a_target_drops_its_answers(app):
+    client = app.app.test_client()
+    id = client.post('/api/locations', json=dict(name='Monas', latitude=-6.1754, longitude=106.8272)).json['location']['id']
+    fix = dict(latitude=-6.2, longitude=106.8, location_id=id, accuracy=10)
+    first = client.post('/update_location', json=fix).json['distance']
+    key = app.results.key(id, -6.2, 106.8, 10)
+    assert app.results.get(key)[1] == first
+    client.put(f'/api/locations/{id}', json=dict(name='Monas', latitude=-6.0, longitude=106.8272))
+    assert app.results.get(key) is None
+    # a new session for the same spot gets the edited target's distance
+    second = client.post('/update_location', json=fix).json['distance']
+    assert second == pytest.approx(haversine(-6.2, 106.8, -6.0, 106.8272))
@@ -0,0 +1,60 @@
+import sqlite3
+
+import pytest
+
+from geo import haversine
+from search import init_search, search
+
+NAMES = [('Monas', -6.1754, 106.8272), ('Masjid Istiqlal', -6.1702, 106.8310),
+         ('Taman Monas Selatan', -7.0, 110.0), ('Ancol', -6.1223, 106.8336)]
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE locations (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, '
+                 'latitude REAL NOT NULL, longitude REAL NOT NULL)')
+    init_search(conn)
+    conn.executemany('INSERT INTO locations (name, latitude, longitude) VALUES (?, ?, ?)', NAMES)
+    conn.commit()
+    return conn
+
+
+def names(results):
+    return [r['name'] for r in results]
+
+
+def test_prefix_before_substring(conn):
+    assert names(search(conn, 'mon')) == ['Monas', 'Taman Monas Selatan']
+    assert search(conn, '   ') == []
+
+
+def test_short_queries_and_typos(conn):
+    assert names(search(conn, 'an')) == ['Ancol']
+    assert 'Masjid Istiqlal' in names(search(conn, 'istiqlaal'))
+
+
+def test_index_follows_edits(conn):
+    conn.execute("UPDATE locations SET name = 'Monumen Nasional' WHERE id = 1")
+    conn.execute('DELETE FROM locations WHERE id = 3')
+    conn.commit()
+    # the old names are gone; the new one is only a fuzzy match for "monas"
+    assert names(search(conn, 'monas')) == ['Monumen Nasional']
+    assert names(search(conn, 'selatan')) == []
+    assert names(search(conn, 'monumen')) == ['Monumen Nasional']
+
+
+def test_distance_and_limit(conn):
+    found = search(conn, 'mon', limit=1, lat=-6.2, lon=106.8, distance=haversine)
+    assert names(found) == ['Monas']
+    assert found[0]['distance'] == pytest.approx(haversine(-6.2, 106.8, -6.1754, 106.8272))
+
+
+def test_route_clamps_the_limit(app):
+    client = app.app.test_client()
+    with sqlite3.connect('locations.db') as db:
+        db.executemany('INSERT INTO locations (name, latitude, longitude) VALUES (?, ?, ?)',
+                       [(f'Titik {i}', -6.2, 106.8) for i in range(250)])
+    assert len(client.get('/search?q=titik&limit=0').json['results']) == 1
+    assert len(client.get('/search?q=titik&limit=-5').json['results']) == 1
+    assert len(client.get('/search?q=titik&limit=1000').json['results']) == 200
@@ -0,0 +1,47 @@
+import sqlite3
+
+from changelog import init_changelog
+from snapshot import LocationsView
+
+
+def make_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE locations (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, '
+                 'latitude REAL NOT NULL, longitude REAL NOT NULL)')
+    conn.executemany('INSERT INTO locations (name, latitude, longitude) VALUES (?, ?, ?)',
+                     [('Monas', -6.1754, 106.8272), ('Kota Tua', -6.1352, 106.8133)])
+    init_changelog(conn)
+    return conn
+
+
+def test_overlay_tracks_changes_since_the_snapshot(tmp_path):
+    conn = make_db(tmp_path / 'locations.db')
+    view = LocationsView(str(tmp_path / 'locations.snap'))
+    view.refresh(conn)
+    assert view.get(1) == (1, 'Monas', -6.1754, 106.8272)
+    snap = view.snapshot
+    conn.execute("UPDATE locations SET latitude = -6.0 WHERE id = 1")
+    conn.execute("DELETE FROM locations WHERE id = 2")
+    conn.execute("INSERT INTO locations (name, latitude, longitude) VALUES ('Ancol', -6.1223, 106.8336)")
+    conn.commit()
+    view.refresh(conn)
+    assert view.snapshot is snap
+    assert view.coords(1) == (-6.0, 106.8272)
+    assert view.get(2) is None
+    assert view.get(3) == (3, 'Ancol', -6.1223, 106.8336)
+
+
+def test_reopen_swaps_snapshot_and_overlay_together(tmp_path):
+    conn = make_db(tmp_path / 'locations.db')
+    view = LocationsView(str(tmp_path / 'locations.snap'))
+    view.refresh(conn)
+    conn.execute("UPDATE locations SET name = 'Monas Baru' WHERE id = 1")
+    conn.commit()
+    view.refresh(conn)
+    old = view.state
+    assert old[1]
+    assert view._open()
+    snap, overlay = view.state
+    assert snap is not old[0] and overlay == {}
+    # the old pair is left intact for readers that already took it
+    assert old[1][1][0] == 'Monas Baru'
@@ -0,0 +1,57 @@
+import pytest
+
+from store import LocationStore
+
+ROWS = [(1, 'Monas', -6.1754, 106.8272), (2, 'Kota Tua', -6.1352, 106.8133), (3, 'Ancol', -6.1223, 106.8336)]
+
+
+def views(store):
+    # numpy() hands out buffer views exactly like memoryview does.
+    return [memoryview(c) for c in (store.ids, store.lats, store.lons)]
+
+
+def test_views_block_add_and_remove_until_released():
+    store = LocationStore.from_rows(ROWS)
+    held = views(store)
+    with pytest.raises(BufferError):
+        store.add(4, 'Istiqlal', -6.1702, 106.8310)
+    with pytest.raises(BufferError):
+        store.remove(1)
+    # Nothing changed, and updates in place still go through the views.
+    assert list(store) == ROWS
+    assert 4 not in store
+    store.update(2, lat=-6.0)
+    assert held[1][1] == -6.0
+    for view in held:
+        view.release()
+    store.add(4, 'Istiqlal', -6.1702, 106.8310)
+    store.remove(1)
+    assert sorted(store) == [(2, 'Kota Tua', -6.0, 106.8133), (3, 'Ancol', -6.1223, 106.8336),
+                             (4, 'Istiqlal', -6.1702, 106.8310)]
+
+
+def test_partial_views_leave_store_consistent():
+    store = LocationStore.from_rows(ROWS)
+    lons = memoryview(store.lons)
+    with pytest.raises(BufferError):
+        store.add(4, 'Istiqlal', -6.1702, 106.8310)
+    with pytest.raises(BufferError):
+        store.remove(1)
+    assert (len(store.ids), len(store.lats), len(store.lons), len(store.name_refs)) == (3, 3, 3, 3)
+    assert list(store) == ROWS
+    lons.release()
+    store.remove(1)
+    assert store.get(3) == ROWS[2]
+
+
+def test_numpy_views():
+    pytest.importorskip('numpy')
+    store = LocationStore.from_rows(ROWS)
+    ids, lats, lons = store.numpy()
+    assert ids.tolist() == [1, 2, 3]
+    assert lats.tolist() == [r[2] for r in ROWS]
+    with pytest.raises(BufferError):
+        store.add(4, 'Istiqlal', -6.1702, 106.8310)
+    del ids, lats, lons
+    store.add(4, 'Istiqlal', -6.1702, 106.8310)
+    assert store.get(4) == (4, 'Istiqlal', -6.1702, 106.8310)
@@ -0,0 +1,59 @@
+import sqlite3
+import threading
+
+import pytest
+
+from tiles import ConnectionPool, Tileset
+
+
+def make_mbtiles(path):
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE metadata (name TEXT, value TEXT);
+        CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB);
+        INSERT INTO metadata VALUES ('format', 'png'), ('minzoom', '0'), ('maxzoom', '1');
+        INSERT INTO tiles VALUES (1, 0, 1, x'89504e47');
+    ''')
+    conn.commit()
+    conn.close()
+    return str(path)
+
+
+def test_tile_rows_are_flipped_to_xyz(tmp_path):
+    ts = Tileset('peta', make_mbtiles(tmp_path / 'peta.mbtiles'))
+    assert ts.tile(1, 0, 0) == b'\x89PNG'
+    assert ts.tile(1, 0, 1) is None
+    assert ts.info('/tiles')['url'] == f'/tiles/peta/{{z}}/{{x}}/{{y}}.png?v={ts.version}'
+
+
+def test_close_closes_connections_returned_later(tmp_path):
+    pool = ConnectionPool(make_mbtiles(tmp_path / 'peta.mbtiles'), size=2)
+    with pool.connection() as busy:
+        with pool.connection() as idle:
+            pass
+        pool.close()
+        with pytest.raises(sqlite3.ProgrammingError):
+            idle.execute('SELECT 1')
+        busy.execute('SELECT 1')
+    with pytest.raises(sqlite3.ProgrammingError):
+        busy.execute('SELECT 1')
+    # still usable by a request that holds the old tileset, without pooling
+    with pool.connection() as late:
+        assert late.execute('SELECT COUNT(*) FROM tiles').fetchone() == (1,)
+    with pytest.raises(sqlite3.ProgrammingError):
+        late.execute('SELECT 1')
+    assert pool.idle.qsize() == 1
+
+
+def test_close_wakes_waiters(tmp_path):
+    pool = ConnectionPool(make_mbtiles(tmp_path / 'peta.mbtiles'), size=1)
+    got = []
+    with pool.connection():
+        def wait():
+            with pool.connection() as conn:
+                got.append(conn.execute('SELECT 1').fetchone())
+        t = threading.Thread(target=wait)
+        t.start()
+        pool.close()
+        t.join(5)
+    assert not t.is_alive() and got == [(1,)]
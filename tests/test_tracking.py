@@ -0,0 +1,51 @@
+import pytest
+
+from tracking import (FIX_ACCEPTED, FIX_COALESCED, FIX_DUPLICATE, FIX_STALE, SessionRegistry,
+                      TrackingSession)
+
+
+@pytest.fixture
+def registry():
+    # no open(): the sessions are built by hand, so no reaper thread starts
+    return SessionRegistry(min_fix_interval=1.0, duplicate_window=2.0)
+
+
+def test_client_timestamps(registry):
+    s = TrackingSession(1)
+    check = lambda t, lat=-6.2: registry.check_fix(s, lat, 106.8, timestamp=t, now=0)
+    assert check(10_000) == FIX_ACCEPTED
+    assert check(10_000, lat=-6.3) == FIX_DUPLICATE
+    assert check(9_000) == FIX_STALE
+    assert check(10_500) == FIX_COALESCED
+    # judged on the client's clock: arriving at the same server instant is fine
+    assert check(11_000) == FIX_ACCEPTED
+    assert s.last_fix_time == 11_000
+    assert s.counts == {FIX_ACCEPTED: 2, FIX_DUPLICATE: 1, FIX_STALE: 1, FIX_COALESCED: 1}
+    assert registry.stats()['dropped'] == 3
+
+
+def test_arrival_time_without_timestamps(registry):
+    s = TrackingSession(1)
+    assert registry.check_fix(s, -6.2, 106.8, now=100) == FIX_ACCEPTED
+    assert registry.check_fix(s, -6.2, 106.8, now=101.5) == FIX_DUPLICATE
+    assert registry.check_fix(s, -6.3, 106.8, now=100.5) == FIX_COALESCED
+    assert registry.check_fix(s, -6.2, 106.8, now=103) == FIX_ACCEPTED
+    assert registry.check_fix(s, -6.3, 106.8, now=104) == FIX_ACCEPTED
+    assert s.last_fix == (-6.3, 106.8)
+
+
+def test_new_target_always_answers(registry):
+    s = TrackingSession(1)
+    s.target_id = 1
+    assert registry.check_fix(s, -6.2, 106.8, timestamp=1_000, now=0) == FIX_ACCEPTED
+    assert registry.check_fix(s, -6.2, 106.8, timestamp=1_000, now=0, target_id=2) == FIX_ACCEPTED
+
+
+def test_only_accepted_fixes_report_dwell(registry):
+    dwells = []
+    registry.on_fix = lambda lat, lon, seconds: dwells.append((lat, lon, seconds))
+    s = TrackingSession(1)
+    registry.check_fix(s, -6.2, 106.8, timestamp=0, now=0)
+    registry.check_fix(s, -6.3, 106.8, timestamp=500, now=0)
+    registry.check_fix(s, -6.3, 106.8, timestamp=5_000, now=0)
+    assert dwells == [(-6.2, 106.8, 5.0)]
@@ -0,0 +1,140 @@
+import os
+import sqlite3
+
+import pytest
+
+from vectortiles import (CLUSTER_BELOW, EXTENT, FLUSH_ALL, VectorTileCache, encode_tile, init_vectortiles,
+                         tile_xy)
+
+
+def fields(buf):
+    """Protobuf wire format -> ``[(number, value)]``; varints as ints,
+    length-delimited fields as bytes."""
+    out, i = [], 0
+
+    def varint():
+        nonlocal i
+        n = shift = 0
+        while True:
+            b = buf[i]
+            i += 1
+            n |= (b & 0x7F) << shift
+            shift += 7
+            if b < 0x80:
+                return n
+
+    while i < len(buf):
+        key = varint()
+        if key & 7 == 0:
+            out.append((key >> 3, varint()))
+        else:
+            assert key & 7 == 2
+            size = varint()
+            out.append((key >> 3, bytes(buf[i:i + size])))
+            i += size
+    return out
+
+
+def packed(buf):
+    """Packed repeated uint32 field -> list."""
+    values, i = [], 0
+    while i < len(buf):
+        n = shift = 0
+        while True:
+            b = buf[i]
+            i += 1
+            n |= (b & 0x7F) << shift
+            shift += 7
+            if b < 0x80:
+                break
+        values.append(n)
+    return values
+
+
+def layer(tile):
+    (number, data), = fields(tile)
+    assert number == 3
+    return fields(data)
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'locations.db')
+    conn.execute('CREATE TABLE locations (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, '
+                 'latitude REAL NOT NULL, longitude REAL NOT NULL)')
+    init_vectortiles(conn)
+    conn.executemany('INSERT INTO locations (name, latitude, longitude) VALUES (?, ?, ?)',
+                     [('Monas', -6.1754, 106.8272), ('Istiqlal', -6.1702, 106.8310)])
+    conn.commit()
+    return conn
+
+
+def tile_of(lat, lon, z):
+    px, py = tile_xy(lat, lon, z)
+    return z, int(px), int(py)
+
+
+def test_mvt_layer_carries_points_and_names(conn):
+    z, x, y = tile_of(-6.1754, 106.8272, 17)
+    body = layer(encode_tile(conn, z, x, y))
+    assert (1, b'locations') in body
+    assert (5, EXTENT) in body and (15, 2) in body
+    keys = [v for n, v in body if n == 3]
+    values = [fields(v)[0][1] for n, v in body if n == 4]
+    features = [dict(fields(v)) for n, v in body if n == 2]
+    assert keys == [b'name', b'count']
+    assert [f[1] for f in features] == [1]
+    tags = packed(features[0][2])
+    assert keys[tags[0]] == b'name' and values[tags[1]] == b'Monas'
+    command, px, py = packed(features[0][4])
+    assert command == 1 << 3 | 1          # MoveTo, one point
+    fx, fy = tile_xy(-6.1754, 106.8272, z)
+    assert (px >> 1, py >> 1) == (round(fx * EXTENT) - x * EXTENT, round(fy * EXTENT) - y * EXTENT)
+
+
+def test_low_zooms_cluster_nearby_points(conn):
+    z, x, y = tile_of(-6.1754, 106.8272, CLUSTER_BELOW - 5)
+    features = [dict(fields(v)) for n, v in layer(encode_tile(conn, z, x, y)) if n == 2]
+    assert len(features) == 1
+    assert packed(features[0][2])[0] == 1    # tagged with "count", not a name
+    assert encode_tile(conn, *tile_of(10.0, 10.0, 10)) == b''
+
+
+def test_edit_deletes_only_the_tiles_it_touched(conn, tmp_path):
+    cache = VectorTileCache(root=str(tmp_path / 'vtiles'), db=str(tmp_path / 'locations.db'))
+    monas = tile_of(-6.1754, 106.8272, 16)
+    far = tile_of(-7.25, 112.75, 16)
+    cache.tile(*monas)
+    cache.tile(*far)
+    assert os.path.exists(cache.path(*monas)) and os.path.exists(cache.path(*far))
+    assert cache.tile(*monas) and cache.hits == 1
+
+    conn.execute("UPDATE locations SET name = 'Monumen Nasional' WHERE id = 1")
+    conn.commit()
+    data = cache.tile(*monas)
+    assert b'Monumen Nasional' in data
+    assert os.path.exists(cache.path(*far))
+    assert conn.execute('SELECT COUNT(*) FROM vector_tile_dirty').fetchone() == (0,)
+
+
+def test_dirty_table_is_trimmed_and_a_full_one_drops_the_cache(conn, tmp_path):
+    cache = VectorTileCache(root=str(tmp_path / 'vtiles'), db=str(tmp_path / 'locations.db'))
+    far = tile_of(-7.25, 112.75, 16)
+    cache.tile(*far)
+    conn.executemany('INSERT INTO locations (name, latitude, longitude) VALUES (?, ?, ?)',
+                     [(f'Titik {i}', -6 - i * 1e-4, 106.8) for i in range(2 * FLUSH_ALL)])
+    conn.commit()
+    count = conn.execute('SELECT COUNT(*) FROM vector_tile_dirty').fetchone()[0]
+    assert FLUSH_ALL <= count < FLUSH_ALL + 100
+    # positions may be gone, so nothing cached can be trusted
+    cache.tile(*tile_of(-6.1754, 106.8272, 16))
+    assert not os.path.exists(cache.path(*far))
+    assert conn.execute('SELECT COUNT(*) FROM vector_tile_dirty').fetchone() == (0,)
+
+
+def test_init_trims_a_table_from_before_the_trigger(conn):
+    conn.execute('DROP TRIGGER vector_tile_dirty_trim')
+    conn.executemany('INSERT INTO vector_tile_dirty (latitude, longitude) VALUES (0, 0)', [()] * (FLUSH_ALL + 500))
+    conn.commit()
+    init_vectortiles(conn)
+    assert conn.execute('SELECT COUNT(*) FROM vector_tile_dirty').fetchone() == (FLUSH_ALL,)
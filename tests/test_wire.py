@@ -0,0 +1,52 @@
+import math
+
+import pytest
+
+import wire
+from wire import FIX, WireError, decode_fixes
+
+
+def test_packed_fix_round_trips():
+    fixes, batched = decode_fixes(wire.FIX_TYPE, FIX.pack(-6.1754, 106.8272, 7, 12.5))
+    assert not batched
+    assert fixes == [(-6.1754, 106.8272, 7, 12.5)]
+
+
+@pytest.mark.parametrize('mimetype, body', [
+    (wire.FIX_TYPE, b'\0' * (FIX.size - 1)),
+    (wire.FIX_BATCH_TYPE, b'\0' * (FIX.size + 3)),
+    ('text/plain', b''),
+])
+def test_bad_length_or_type(mimetype, body):
+    with pytest.raises(WireError):
+        decode_fixes(mimetype, body)
+
+
+@pytest.mark.parametrize('lat, lon', [(math.nan, 106.8), (-6.2, math.inf)])
+def test_packed_non_finite_coordinates(lat, lon):
+    with pytest.raises(WireError):
+        decode_fixes(wire.FIX_TYPE, FIX.pack(lat, lon, 1, math.nan))
+    with pytest.raises(WireError):
+        decode_fixes(wire.FIX_BATCH_TYPE, FIX.pack(-6.2, 106.8, 1, 5) + FIX.pack(lat, lon, 2, 5))
+
+
+msgpack = pytest.importorskip('msgpack')
+
+
+def test_msgpack_single_and_batch():
+    fixes, batched = decode_fixes('application/msgpack', msgpack.packb([-6.2, 106.8, 3]))
+    assert not batched and fixes[0][:3] == (-6.2, 106.8, 3) and math.isnan(fixes[0][3])
+    fixes, batched = decode_fixes('application/msgpack', msgpack.packb([[-6.2, 106.8, 3, 4.0], [-6.3, 106.9, 4]]))
+    assert batched and [f[2] for f in fixes] == [3, 4]
+
+
+@pytest.mark.parametrize('obj', [5, 'abc', {'lat': -6.2}, None, [-6.2, 106.8], [[-6.2, 106.8, 1], 4],
+                                 [[-6.2, 'x', 1]], [math.nan, 106.8, 1]])
+def test_msgpack_bad_bodies(obj):
+    with pytest.raises(WireError):
+        decode_fixes('application/msgpack', msgpack.packb(obj))
+
+
+def test_msgpack_garbage():
+    with pytest.raises(WireError):
+        decode_fixes('application/msgpack', b'\xc1')
@@ -0,0 +1,238 @@
+"""Raster map tiles from local MBTiles files.
+
+Every ``*.mbtiles`` file in the tiles folder (``TILES_DIR``, default
+``tiles/`` in the working directory, next to locations.db) is published
+as ``/tiles/<name>/<z>/<x>/<y>.<format>``, and ``/tiles`` lists them with
+their metadata and a URL template. MBTiles is the SQLite layout that
+QGIS ("Generate XYZ tiles"), MOBAC, TileMill and most offline map apps
+export; rows are stored bottom-up (TMS) and flipped here to the XYZ
+numbering web maps use.
+
+Each file has a small pool of read-only connections, so request threads
+neither share a connection nor open one per tile. Recently served tiles
+stay in memory, least recently used first out once ``cache_bytes`` is
+reached. Tile URLs carry the file's version (``?v=``): with the current
+version a tile is cacheable forever, without it for a day and then
+revalidated by ETag. Replacing a file bumps its version on the next
+``/tiles`` listing.
+"""
+import collections
+import contextlib
+import os
+import queue
+import sqlite3
+import threading
+import urllib.parse
+
+from flask import Response, abort, jsonify, request
+
+from assets import CACHE_FOREVER
+
+CACHE_UNVERSIONED = 'public, max-age=86400'
+MIMETYPES = {'png': 'image/png', 'jpg': 'image/jpeg', 'jpeg': 'image/jpeg', 'webp': 'image/webp'}
+
+
+class ConnectionPool:
+    """Up to ``size`` read-only connections to one SQLite file, opened on
+    first use and handed out one thread at a time.
+
+    ``close()`` closes the idle connections at once and the busy ones as
+    they are returned. A request that still holds the old tileset after
+    that gets a connection of its own, closed after use."""
+
+    def __init__(self, path, size=4):
+        self.path = path
+        self.size = size
+        self.idle = queue.LifoQueue()
+        self.opened = 0
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def _open(self):
+        uri = 'file:' + urllib.parse.quote(os.path.abspath(self.path)) + '?mode=ro'
+        return sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+    @contextlib.contextmanager
+    def connection(self):
+        try:
+            conn = self.idle.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                grow = self.opened < self.size
+                if grow:
+                    self.opened += 1
+            if grow:
+                try:
+                    conn = self._open()
+                except Exception:
+                    with self.lock:
+                        self.opened -= 1
+                    raise
+            else:
+                conn = self.idle.get()
+        if conn is None:
+            # closed: pass the wake-up on to the next waiter
+            self.idle.put(None)
+            conn = self._open()
+        try:
+            yield conn
+        finally:
+            with self.lock:
+                closed = self.closed
+                if not closed:
+                    self.idle.put(conn)
+            if closed:
+                conn.close()
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            idle = []
+            while True:
+                try:
+                    idle.append(self.idle.get_nowait())
+                except queue.Empty:
+                    break
+            # wakes threads blocked in connection() waiting for a return
+            self.idle.put(None)
+        for conn in idle:
+            if conn is not None:
+                conn.close()
+
+
+class Tileset:
+    def __init__(self, name, path, pool_size=4):
+        self.name = name
+        self.path = path
+        stat = os.stat(path)
+        self.version = f'{int(stat.st_mtime)}-{stat.st_size}'
+        self.pool = ConnectionPool(path, pool_size)
+        with self.pool.connection() as conn:
+            self.metadata = dict(conn.execute('SELECT name, value FROM metadata'))
+        self.format = self.metadata.get('format', 'png')
+        self.mimetype = MIMETYPES.get(self.format, 'application/octet-stream')
+
+    def tile(self, z, x, y):
+        """Tile data in XYZ numbering, or None."""
+        with self.pool.connection() as conn:
+            row = conn.execute('SELECT tile_data FROM tiles WHERE zoom_level=? AND tile_column=? AND tile_row=?',
+                               (z, x, (1 << z) - 1 - y)).fetchone()
+        return row[0] if row else None
+
+    def info(self, prefix):
+        meta = self.metadata
+        info = dict(name=self.name, format=self.format, version=self.version,
+                    url=f'{prefix}/{urllib.parse.quote(self.name)}/{{z}}/{{x}}/{{y}}.{self.format}?v={self.version}',
+                    minzoom=int(meta.get('minzoom', 0)), maxzoom=int(meta.get('maxzoom', 22)),
+                    attribution=meta.get('attribution'), description=meta.get('description'))
+        if meta.get('bounds'):
+            info['bounds'] = [float(v) for v in meta['bounds'].split(',')]
+        if meta.get('center'):
+            info['center'] = [float(v) for v in meta['center'].split(',')]
+        return info
+
+
+class TileCache:
+    """Tile bytes by ``(tileset, version, z, x, y)``, bounded by size in bytes.
+    Missing tiles are cached too, as ``b''``."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            data = self.entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old)
+            self.entries[key] = data
+            self.bytes += len(data)
+            while self.bytes > self.max_bytes:
+                _, dropped = self.entries.popitem(last=False)
+                self.bytes -= len(dropped)
+
+    def stats(self):
+        with self.lock:
+            return dict(tiles=len(self.entries), bytes=self.bytes, hits=self.hits, misses=self.misses)
+
+
+class TileServer:
+    def __init__(self, root=None, prefix='/tiles', cache_bytes=32 << 20, pool_size=4):
+        self.root = root
+        self.prefix = prefix
+        self.pool_size = pool_size
+        self.cache = TileCache(cache_bytes)
+        self.tilesets = {}
+        self.lock = threading.Lock()
+
+    def scan(self):
+        """Pick up added, replaced and removed ``.mbtiles`` files."""
+        found = {}
+        if os.path.isdir(self.root):
+            for filename in sorted(os.listdir(self.root)):
+                name, ext = os.path.splitext(filename)
+                if ext == '.mbtiles':
+                    found[name] = os.path.join(self.root, filename)
+        with self.lock:
+            for name in list(self.tilesets):
+                if name not in found:
+                    self.tilesets.pop(name).pool.close()
+            for name, path in found.items():
+                current = self.tilesets.get(name)
+                stat = os.stat(path)
+                if current is not None and current.version == f'{int(stat.st_mtime)}-{stat.st_size}':
+                    continue
+                try:
+                    tileset = Tileset(name, path, self.pool_size)
+                except sqlite3.Error:
+                    continue    # not an MBTiles file, or still being copied
+                self.tilesets[name] = tileset
+                if current is not None:
+                    current.pool.close()
+        return self.tilesets
+
+    def index(self):
+        self.scan()
+        return jsonify(tilesets=[t.info(self.prefix) for t in self.tilesets.values()],
+                       cache=self.cache.stats())
+
+    def serve(self, name, z, x, y, ext):
+        tileset = self.tilesets.get(name)
+        if tileset is None or ext != tileset.format or not (0 <= x < 1 << z and 0 <= y < 1 << z):
+            abort(404)
+        key = (name, tileset.version, z, x, y)
+        data = self.cache.get(key)
+        if data is None:
+            data = tileset.tile(z, x, y) or b''
+            self.cache.put(key, data)
+        if not data:
+            resp = Response(status=404)
+            resp.headers['Cache-Control'] = CACHE_UNVERSIONED
+            return resp
+        resp = Response(data, mimetype=tileset.mimetype)
+        current = request.args.get('v') == tileset.version
+        resp.headers['Cache-Control'] = CACHE_FOREVER if current else CACHE_UNVERSIONED
+        resp.set_etag(f'{tileset.version}-{z}-{x}-{y}')
+        return resp.make_conditional(request)
+
+    def init_app(self, app):
+        if self.root is None:
+            self.root = app.config.get('TILES_DIR', 'tiles')
+        self.scan()
+        app.add_url_rule(self.prefix, 'tilesets', self.index)
+        app.add_url_rule(self.prefix + '/<name>/<int:z>/<int:x>/<int:y>.<ext>', 'tile', self.serve)
@@ -0,0 +1,427 @@
+"""Live tracking sessions.
+
+A session remembers its target (id and coordinates) and last fix, so a
+client sends the target once and afterwards only positions. Sessions
+are plain objects with ``__slots__``; an idle one is a few hundred bytes
+plus whatever its transport holds.
+
+One background thread per process does the periodic work for all
+sessions: it sends heartbeats, closes sessions that have been silent for
+longer than ``idle_timeout`` and polls the change log so sessions whose
+target was edited or deleted get a fresh distance without waiting for
+their next fix.
+
+Every fix goes through ``SessionRegistry.check_fix``. A page that ends up
+with two geolocation watchers (or an HTTP retry racing the socket) sends
+the same fix twice or interleaves two streams; repeats and fixes older
+than the last accepted one are dropped, and fixes arriving faster than
+``min_fix_interval`` are coalesced into the previous answer. Each outcome
+is counted, see ``SessionRegistry.stats``.
+
+Each answer also carries advice for the next fix (``advise``): how long
+to wait and how far to move before sending one. Compared with sending
+every fix, the distance on screen lags by at most ``ADVICE_ERROR_FRACTION``
+of itself or ``ADVICE_NEAR_ERROR`` metres, whichever is more, as long as
+the phone keeps under ``ADVICE_SPEED_MARGIN`` times its recent speed and
+the receiver error within its reported accuracy. A phone 40 km out can
+then wait a minute between fixes, while one 20 m from its target keeps
+reporting every second or two.
+
+Each session also keeps its last few accepted fixes (``Motion``), from
+which speed, heading and ETA are kept up to date in constant time per
+fix. ``SessionRegistry.motion`` turns them into a short-horizon model the
+page extrapolates from, so the distance and compass keep moving between
+sparse fixes. Sessions are held in least-recently-used order; past
+``max_sessions`` the longest-idle one is closed.
+"""
+import collections
+import itertools
+import threading
+import time
+from math import atan2, cos, degrees, hypot, radians
+
+from geo import EARTH_RADIUS, bearing, haversine
+
+SESSION_HEADER = 'X-Tracking-Session'
+
+FIX_ACCEPTED = 'accepted'
+FIX_DUPLICATE = 'duplicate'     # same position and timestamp as the last fix
+FIX_STALE = 'stale'             # older than the last accepted fix
+FIX_COALESCED = 'coalesced'     # too soon after the last accepted fix
+FIX_OUTCOMES = (FIX_ACCEPTED, FIX_DUPLICATE, FIX_STALE, FIX_COALESCED)
+
+# Fix-rate advice; static/fixrate.js runs the same rule for local distances.
+ADVICE_ERROR_FRACTION = 0.1     # allowed lag, as a share of the distance
+ADVICE_NEAR_ERROR = 5.0         # metres; the allowed lag never drops below this
+ADVICE_MIN_SPEED = 1.4          # m/s; walking pace is assumed for slower phones
+ADVICE_SPEED_MARGIN = 2.5       # upper speed estimate, as a multiple of the smoothed speed
+ADVICE_MIN_INTERVAL = 1.0       # seconds
+ADVICE_MAX_INTERVAL = 60.0
+ADVICE_MAX_DISTANCE = 250.0     # metres
+SPEED_SMOOTHING = 0.5           # weight of a slower sample; a faster one counts in full
+
+# Motion model (see ``Motion``); static/motion.js mirrors it for local distances.
+MOTION_FIXES = 8                # ring buffer length
+MOTION_WINDOW = 10.0            # seconds; velocity is taken across at most this
+MOTION_SMOOTHING = 0.7          # weight of the newest window velocity
+MOTION_HORIZON = 60.0           # seconds the page may extrapolate at most
+MOTION_MIN_SPEED = 0.5          # m/s; slower counts as standing still
+
+
+def advise(distance, speed=None, accuracy=None):
+    """``{'interval': s, 'min_distance': m}`` for the next fix.
+
+    The next fix should wait ``interval`` seconds *and* until the phone
+    has moved ``min_distance`` metres. Until then the distance shown lags by
+    at most the allowed error. The interval is what is left of it after
+    ``accuracy`` (the fix can move that far with the phone lying still),
+    at an upper estimate of the speed: a smoothed speed averages the stops
+    of stop-and-go traffic in, so the phone may well go ``ADVICE_SPEED_MARGIN``
+    times as fast before the next fix. Without a speed (the first fix)
+    nothing bounds how far the phone gets, so the next fix is asked for
+    at once. The movement threshold is raised to ``accuracy``, since a
+    smaller movement cannot be told apart from receiver noise, but never
+    above the allowed error.
+    """
+    if distance is None:
+        return dict(interval=ADVICE_MIN_INTERVAL, min_distance=0.0)
+    allowed = max(ADVICE_ERROR_FRACTION * distance, ADVICE_NEAR_ERROR)
+    interval = ADVICE_MIN_INTERVAL
+    if speed is not None:
+        interval = (allowed - (accuracy or 0.0)) / (max(speed, ADVICE_MIN_SPEED) * ADVICE_SPEED_MARGIN)
+        interval = min(max(interval, ADVICE_MIN_INTERVAL), ADVICE_MAX_INTERVAL)
+    min_distance = min(allowed / 2, ADVICE_MAX_DISTANCE)
+    if accuracy:
+        min_distance = min(max(min_distance, accuracy), allowed)
+    return dict(interval=round(interval, 1), min_distance=round(min_distance, 1))
+
+
+class Motion:
+    """Velocity of a device from a ring buffer of its recent fixes.
+
+    ``add`` is O(1): the velocity is the displacement from the oldest to
+    the newest fix in the buffer over their time span, which averages
+    out receiver noise without keeping a history. Displacements within
+    the newest fix's accuracy count as standing still. The result is then
+    smoothed as a vector, so the heading does not wrap around at north.
+    """
+    __slots__ = ('fixes', 'north', 'east')
+
+    def __init__(self):
+        self.fixes = collections.deque(maxlen=MOTION_FIXES)   # (t, lat, lon)
+        self.north = self.east = 0.0    # m/s
+
+    def add(self, t, lat, lon, accuracy=None):
+        """Record a fix at ``t`` seconds (any clock, as long as it is the
+        same one for the whole session)."""
+        fixes = self.fixes
+        if fixes and t <= fixes[-1][0]:
+            if t < fixes[-1][0]:
+                # Clock changed (HTTP fixes without timestamps, then socket
+                # fixes with): start over.
+                fixes.clear()
+                self.north = self.east = 0.0
+            else:
+                fixes.pop()
+        fixes.append((t, lat, lon))
+        while len(fixes) > 2 and t - fixes[0][0] > MOTION_WINDOW:
+            fixes.popleft()
+        t0, lat0, lon0 = fixes[0]
+        if t == t0:
+            return
+        north = radians(lat - lat0) * EARTH_RADIUS
+        east = radians(lon - lon0) * EARTH_RADIUS * cos(radians(lat0))
+        if hypot(north, east) <= (accuracy or 0.0):
+            north = east = 0.0
+        self.north += MOTION_SMOOTHING * (north / (t - t0) - self.north)
+        self.east += MOTION_SMOOTHING * (east / (t - t0) - self.east)
+
+    @property
+    def speed(self):
+        return hypot(self.north, self.east)
+
+    @property
+    def heading(self):
+        """Direction of travel, degrees clockwise from north."""
+        return degrees(atan2(self.east, self.north)) % 360
+
+    def model(self, distance, target):
+        """What the page needs to extrapolate from the newest fix:
+
+        ``lat``/``lon``  the fix the model starts from
+        ``speed``        m/s, 0 when standing still
+        ``heading``      degrees, None when standing still
+        ``eta``          seconds to the target at the current closing
+                         speed, None when not closing in
+        ``horizon``      seconds the extrapolation may run; 0 when
+                         standing still, never past the target
+        """
+        if not self.fixes:
+            return None
+        _, lat, lon = self.fixes[-1]
+        speed = self.speed
+        if speed < MOTION_MIN_SPEED:
+            return dict(lat=lat, lon=lon, speed=0.0, heading=None, eta=None, horizon=0.0)
+        heading = self.heading
+        eta = horizon = None
+        if distance is not None and target is not None:
+            closing = speed * cos(radians(bearing(lat, lon, *target) - heading))
+            if closing >= MOTION_MIN_SPEED:
+                eta = round(distance / closing)
+            horizon = min(MOTION_HORIZON, distance / speed)
+        return dict(lat=lat, lon=lon, speed=round(speed, 2), heading=round(heading, 1), eta=eta,
+                    horizon=round(MOTION_HORIZON if horizon is None else horizon, 1))
+
+
+def fix_extras(msg):
+    """``accuracy``/``speed`` keyword arguments for ``check_fix`` from a
+    fix message; browsers send null when the receiver has no value."""
+    return {k: float(msg[k]) for k in ('accuracy', 'speed') if msg.get(k) is not None}
+
+
+class TrackingSession:
+    __slots__ = ('id', 'send_raw', 'close_raw', 'lock', 'last_seen',
+                 'target_id', 'target', 'last_fix', 'last_fix_time',
+                 'last_accepted', 'last_distance', 'last_cell', 'speed',
+                 'accuracy', 'motion', 'counts', 'closed')
+
+    def __init__(self, id, send=None, close=None):
+        self.id = id
+        self.send_raw = send
+        self.close_raw = close
+        self.lock = threading.Lock()
+        self.last_seen = time.monotonic()
+        self.target_id = None
+        self.target = None      # (lat, lon) of target_id, cached
+        self.last_fix = None    # (lat, lon)
+        self.last_fix_time = None   # client timestamp of last_fix, if sent
+        self.last_accepted = 0.0    # server monotonic time of last_fix
+        self.last_distance = None   # answer for last_fix, reused for drops
+        self.last_cell = None       # result-cache key of that answer
+        self.speed = None       # m/s, smoothed over accepted fixes
+        self.accuracy = None    # metres, as reported with last_fix
+        self.motion = Motion()
+        self.counts = dict.fromkeys(FIX_OUTCOMES, 0)
+        self.closed = False
+
+    @property
+    def has_transport(self):
+        # HTTP-only sessions have nothing to push to.
+        return self.send_raw is not None
+
+    def send(self, message):
+        # Transports are not safe for concurrent writers; the request thread
+        # and the heartbeat thread both send.
+        with self.lock:
+            if self.closed or self.send_raw is None:
+                return False
+            try:
+                self.send_raw(message)
+                return True
+            except Exception:
+                self.closed = True
+                return False
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+        if self.close_raw is None:
+            return
+        try:
+            self.close_raw()
+        except Exception:
+            pass
+
+
+class SessionRegistry:
+    def __init__(self, idle_timeout=90, heartbeat_interval=30, poll_interval=1.0,
+                 min_fix_interval=0.25, duplicate_window=2.0, max_sessions=10000):
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.heartbeat_interval = heartbeat_interval
+        self.poll_interval = poll_interval
+        self.min_fix_interval = min_fix_interval
+        self.duplicate_window = duplicate_window   # for fixes without timestamp
+        self.sessions = {}      # least recently seen first, see touch()
+        self.counts = collections.Counter(dict.fromkeys(FIX_OUTCOMES, 0))
+        self.lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._thread = None
+        self._stop = threading.Event()
+        self.on_poll = None     # callable(registry), e.g. change-log watcher
+        self.on_fix = None      # callable(lat, lon, seconds), e.g. heatmap.HeatGrid.add
+
+    def open(self, send=None, close=None):
+        session = TrackingSession(next(self._ids), send, close)
+        evicted = []
+        with self.lock:
+            self.sessions[session.id] = session
+            while len(self.sessions) > self.max_sessions:
+                evicted.append(self.sessions.pop(next(iter(self.sessions))))
+        for old in evicted:
+            old.close()
+        self.start()
+        return session
+
+    def touch(self, session, now=None):
+        """Mark the session as just seen, moving it to the back of the
+        eviction order."""
+        session.last_seen = time.monotonic() if now is None else now
+        with self.lock:
+            if self.sessions.pop(session.id, None) is not None:
+                self.sessions[session.id] = session
+
+    def get(self, id):
+        try:
+            return self.sessions.get(int(id))
+        except (TypeError, ValueError):
+            return None
+
+    def resolve(self, id):
+        """Session for a client-supplied id; unknown or reaped ids get a new one."""
+        session = self.get(id)
+        if session is None or session.closed:
+            session = self.open()
+        self.touch(session)
+        return session
+
+    def check_fix(self, session, lat, lon, timestamp=None, target_id=None, now=None,
+                  accuracy=None, speed=None):
+        """Classify a fix; only ``FIX_ACCEPTED`` updates ``session.last_fix``.
+
+        ``timestamp`` is the client's fix time in milliseconds (the
+        Geolocation API's ``position.timestamp``). With it, spacing is judged
+        on the client's clock, so an accelerated replay is not coalesced;
+        without it, on arrival time.
+
+        ``accuracy`` (metres) and ``speed`` (m/s) are what the client
+        reports with the fix, if anything. Without a speed it is estimated
+        from the distance to the previous accepted fix, less the
+        accuracy, so receiver noise alone does not look like movement.
+
+        On acceptance ``on_fix`` gets the previous fix and the seconds
+        since it, the time the device spent there.
+        """
+        now = time.monotonic() if now is None else now
+        dwell = None
+        with session.lock:
+            if target_id is not None and target_id != session.target_id:
+                # New target: the same fix still needs a fresh answer.
+                outcome = FIX_ACCEPTED
+            elif session.last_fix is None:
+                outcome = FIX_ACCEPTED
+            elif timestamp is not None and session.last_fix_time is not None:
+                if timestamp < session.last_fix_time:
+                    outcome = FIX_STALE
+                elif timestamp == session.last_fix_time:
+                    outcome = FIX_DUPLICATE
+                elif timestamp - session.last_fix_time < self.min_fix_interval * 1000:
+                    outcome = FIX_COALESCED
+                else:
+                    outcome = FIX_ACCEPTED
+            elif (lat, lon) == session.last_fix and now - session.last_accepted < self.duplicate_window:
+                outcome = FIX_DUPLICATE
+            elif now - session.last_accepted < self.min_fix_interval:
+                outcome = FIX_COALESCED
+            else:
+                outcome = FIX_ACCEPTED
+            if outcome == FIX_ACCEPTED:
+                if session.last_fix is not None:
+                    # The device was at the previous fix until this one.
+                    if timestamp is not None and session.last_fix_time is not None:
+                        dwell = session.last_fix + ((timestamp - session.last_fix_time) / 1000,)
+                    else:
+                        dwell = session.last_fix + (now - session.last_accepted,)
+                self._update_speed(session, lat, lon, timestamp, now, accuracy, speed)
+                session.accuracy = accuracy
+                session.motion.add(now if timestamp is None else timestamp / 1000, lat, lon, accuracy)
+                session.last_fix = (lat, lon)
+                session.last_fix_time = timestamp
+                session.last_accepted = now
+            session.counts[outcome] += 1
+        with self.lock:
+            self.counts[outcome] += 1
+        if dwell is not None and dwell[2] > 0 and self.on_fix is not None:
+            self.on_fix(*dwell)
+        return outcome
+
+    @staticmethod
+    def _update_speed(session, lat, lon, timestamp, now, accuracy, speed):
+        if speed is None and session.last_fix is not None:
+            if timestamp is not None and session.last_fix_time is not None:
+                dt = (timestamp - session.last_fix_time) / 1000
+            else:
+                dt = now - session.last_accepted
+            if dt <= 0:
+                return
+            moved = haversine(*session.last_fix, lat, lon) - (accuracy or 0.0)
+            speed = max(moved, 0.0) / dt
+        if speed is None:
+            return
+        if session.speed is None or speed > session.speed:
+            session.speed = speed   # speeding up must shorten the interval at once
+        else:
+            session.speed += SPEED_SMOOTHING * (speed - session.speed)
+
+    def advice(self, session):
+        """``advise`` for the session's last answer."""
+        return advise(session.last_distance, session.speed, session.accuracy)
+
+    def motion(self, session):
+        """``Motion.model`` for the session's last answer."""
+        return session.motion.model(session.last_distance, session.target)
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.counts)
+        dropped = sum(n for k, n in counts.items() if k != FIX_ACCEPTED)
+        return dict(sessions=len(self.sessions), fixes=counts, dropped=dropped)
+
+    def discard(self, session):
+        with self.lock:
+            self.sessions.pop(session.id, None)
+        session.close()
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.sessions.values())
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def reap(self, now=None):
+        now = time.monotonic() if now is None else now
+        expired = [s for s in self.snapshot() if s.closed or now - s.last_seen > self.idle_timeout]
+        for session in expired:
+            self.discard(session)
+        return len(expired)
+
+    def heartbeat(self, message):
+        for session in self.snapshot():
+            if session.has_transport and not session.send(message):
+                self.discard(session)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='tracking-sessions', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        last_beat = time.monotonic()
+        while not self._stop.wait(self.poll_interval):
+            now = time.monotonic()
+            self.reap(now)
+            if now - last_beat >= self.heartbeat_interval:
+                last_beat = now
+                self.heartbeat('{"type":"ping"}')
+            if self.on_poll is not None and self.sessions:
+                try:
+                    self.on_poll(self)
+                except Exception:
+                    pass
@@ -0,0 +1,331 @@
+"""Mapbox Vector Tiles of the ``locations`` table.
+
+``/vtiles/<z>/<x>/<y>.mvt`` returns one layer, ``locations``, with a point
+feature per location (``id``, ``name``) in the usual XYZ tile numbering,
+so MapLibre/Mapbox GL, OpenLayers or QGIS draw any number of locations
+without downloading them all as JSON.
+
+Simplification per zoom: below ``CLUSTER_BELOW`` locations that fall in
+the same ``CLUSTER_GRID`` cell (16 screen pixels) become one feature at
+their centre with a ``count``; from that zoom on every location is its
+own feature. Either way a tile holds at most a few thousand features.
+
+Only the locations near a tile are read: ``locations_rtree`` is an R*Tree
+over the coordinates, kept in sync by triggers like ``locations_fts``
+(see search.py). Below ``RTREE_FROM_ZOOM``, and in SQLite builds without
+R*Tree, a range scan is used instead.
+
+Encoded tiles are kept on disk under ``VTILES_DIR`` (default
+``vtiles/``). Triggers write the old and new position of every changed
+location to ``vector_tile_dirty``; before serving a tile the cache
+deletes the files of every tile, at every zoom, that those positions
+fall in, so any write path (form routes, JSON API, batch, importers,
+other processes) invalidates exactly the tiles it touched. Every 100th
+insert trims the table to the last ``FLUSH_ALL`` positions, so it stays
+small when no tiles are served; once it is that full, some may be gone,
+and the whole cache is dropped instead. The stored tiles are shared, so
+use one cache folder per database.
+
+The app keeps no stored tracks, so there is no track layer yet.
+"""
+import math
+import os
+import shutil
+import sqlite3
+import threading
+
+from flask import Response, request
+
+EXTENT = 4096
+BUFFER = 64            # extent units drawn beyond each edge, so edge markers are not cut off
+CLUSTER_BELOW = 15
+CLUSTER_GRID = 256     # extent units, 16 px on a 256 px tile
+MAX_ZOOM = 22
+RTREE_FROM_ZOOM = 8    # below this a tile spans much of the data and a plain scan is faster
+MAX_LAT = 85.0511287798
+FLUSH_ALL = 1000       # dirty positions kept; a full table drops the whole cache
+MIMETYPE = 'application/vnd.mapbox-vector-tile'
+
+RTREE_SCHEMA = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS locations_rtree USING rtree(id, min_lon, max_lon, min_lat, max_lat);
+CREATE TRIGGER IF NOT EXISTS locations_rtree_insert AFTER INSERT ON locations BEGIN
+    INSERT INTO locations_rtree VALUES (new.id, new.longitude, new.longitude, new.latitude, new.latitude);
+END;
+CREATE TRIGGER IF NOT EXISTS locations_rtree_update AFTER UPDATE OF latitude, longitude ON locations BEGIN
+    INSERT OR REPLACE INTO locations_rtree VALUES (new.id, new.longitude, new.longitude, new.latitude, new.latitude);
+END;
+CREATE TRIGGER IF NOT EXISTS locations_rtree_delete AFTER DELETE ON locations BEGIN
+    DELETE FROM locations_rtree WHERE id = old.id;
+END;
+'''
+
+DIRTY_SCHEMA = f'''
+CREATE TABLE IF NOT EXISTS vector_tile_dirty (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS locations_vtile_insert AFTER INSERT ON locations BEGIN
+    INSERT INTO vector_tile_dirty (latitude, longitude) VALUES (new.latitude, new.longitude);
+END;
+CREATE TRIGGER IF NOT EXISTS locations_vtile_update AFTER UPDATE ON locations BEGIN
+    INSERT INTO vector_tile_dirty (latitude, longitude) VALUES (old.latitude, old.longitude);
+    INSERT INTO vector_tile_dirty (latitude, longitude)
+    SELECT new.latitude, new.longitude
+    WHERE new.latitude != old.latitude OR new.longitude != old.longitude;
+END;
+CREATE TRIGGER IF NOT EXISTS locations_vtile_delete AFTER DELETE ON locations BEGIN
+    INSERT INTO vector_tile_dirty (latitude, longitude) VALUES (old.latitude, old.longitude);
+END;
+CREATE TRIGGER IF NOT EXISTS vector_tile_dirty_trim AFTER INSERT ON vector_tile_dirty
+WHEN new.seq % 100 = 0 BEGIN
+    DELETE FROM vector_tile_dirty WHERE seq <= new.seq - {FLUSH_ALL};
+END;
+'''
+
+
+def init_vectortiles(conn):
+    """Create the change table and, if this SQLite has R*Tree, the
+    spatial index. Returns whether the index is available."""
+    conn.executescript(DIRTY_SCHEMA)
+    # Tables from before the trim trigger may have grown past it.
+    conn.execute('DELETE FROM vector_tile_dirty WHERE seq <= ?', (dirty_seq(conn) - FLUSH_ALL,))
+    conn.commit()
+    if has_rtree(conn):
+        return True
+    try:
+        conn.executescript(RTREE_SCHEMA)
+    except sqlite3.OperationalError:
+        return False  # no R*Tree in this SQLite build
+    conn.execute('INSERT INTO locations_rtree SELECT id, longitude, longitude, latitude, latitude FROM locations')
+    conn.commit()
+    return True
+
+
+def has_rtree(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'locations_rtree'").fetchone() is not None
+
+
+def dirty_seq(conn):
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'vector_tile_dirty'").fetchone()
+    return row[0] if row else 0
+
+
+# ── Web Mercator ─────────────────────────────────────────────
+
+def tile_xy(lat, lon, z):
+    """Position in tile units at zoom ``z``; the integer parts are the tile."""
+    n = 1 << z
+    lat = min(max(lat, -MAX_LAT), MAX_LAT)
+    s = math.sin(math.radians(lat))
+    return (lon + 180.0) / 360.0 * n, (0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)) * n
+
+
+def tile_lonlat(x, y, z):
+    n = 1 << z
+    return x / n * 360.0 - 180.0, math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+
+
+def tiles_around(lat, lon, z):
+    """Tiles at zoom ``z`` whose buffered area contains the point."""
+    px, py = tile_xy(lat, lon, z)
+    b = BUFFER / EXTENT
+    last = (1 << z) - 1
+    xs = range(max(int(px - b), 0), min(int(px + b), last) + 1)
+    ys = range(max(int(py - b), 0), min(int(py + b), last) + 1)
+    return [(x, y) for x in xs for y in ys]
+
+
+def locations_in_tile(conn, z, x, y):
+    """``(id, name, lat, lon)`` rows inside the tile plus its buffer."""
+    b = BUFFER / EXTENT
+    west, north = tile_lonlat(x - b, y - b, z)
+    east, south = tile_lonlat(x + 1 + b, y + 1 + b, z)
+    if z >= RTREE_FROM_ZOOM and has_rtree(conn):
+        return conn.execute('''
+            SELECT l.id, l.name, l.latitude, l.longitude
+            FROM locations_rtree r JOIN locations l ON l.id = r.id
+            WHERE r.min_lon <= ? AND r.max_lon >= ? AND r.min_lat <= ? AND r.max_lat >= ?
+        ''', (east, west, north, south))
+    return conn.execute('''
+        SELECT id, name, latitude, longitude FROM locations
+        WHERE longitude BETWEEN ? AND ? AND latitude BETWEEN ? AND ?
+    ''', (west, east, south, north))
+
+
+# ── Encoding (vector_tile.proto, version 2) ──────────────────
+
+def _varint(n):
+    out = bytearray()
+    while n > 0x7F:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def _zigzag(n):
+    return (n << 1) ^ (n >> 63)
+
+
+def _len_field(number, payload):
+    return _varint(number << 3 | 2) + _varint(len(payload)) + payload
+
+
+def _int_field(number, value):
+    return _varint(number << 3) + _varint(value)
+
+
+def _point(px, py):
+    return _varint(1 << 3 | 1) + _varint(_zigzag(px)) + _varint(_zigzag(py))   # MoveTo(1)
+
+
+def points(rows, z, x, y):
+    """Features for ``rows`` in tile coordinates: ``(id, px, py, name, count)``,
+    clustered below ``CLUSTER_BELOW``."""
+    # tile_xy() inlined: at low zooms this loop sees every location.
+    lo, hi = -BUFFER, EXTENT + BUFFER
+    scale = EXTENT * (1 << z)
+    x0, y0 = x * EXTENT, y * EXTENT
+    sin, log, rad = math.sin, math.log, math.radians
+    placed = []
+    for id, name, lat, lon in rows:
+        px = round((lon + 180.0) / 360.0 * scale) - x0
+        if px < lo or px > hi:
+            continue
+        s = sin(rad(min(max(lat, -MAX_LAT), MAX_LAT)))
+        py = round((0.5 - log((1 + s) / (1 - s)) / (4 * math.pi)) * scale) - y0
+        if lo <= py <= hi:
+            placed.append((id, px, py, name))
+    if z >= CLUSTER_BELOW:
+        return [(id, px, py, name, 1) for id, px, py, name in placed]
+    cells = {}
+    for id, px, py, name in placed:
+        key = (px // CLUSTER_GRID, py // CLUSTER_GRID)
+        cell = cells.get(key)
+        if cell is None:
+            cells[key] = [id, px, py, name, 1]
+        else:
+            if id < cell[0]:
+                cell[0] = id
+            cell[1] += px
+            cell[2] += py
+            cell[4] += 1
+    return [(id, sx // n, sy // n, name if n == 1 else None, n) for id, sx, sy, name, n in cells.values()]
+
+
+def encode_layer(name, features):
+    """One MVT layer of point features ``(id, px, py, name, count)``."""
+    keys = ['name', 'count']
+    values, value_index = [], {}
+
+    def value(v):
+        key = (type(v), v)
+        i = value_index.get(key)
+        if i is None:
+            i = value_index[key] = len(values)
+            values.append(_len_field(1, v.encode()) if isinstance(v, str) else _int_field(5, v))
+        return i
+
+    body = [_len_field(1, name.encode())]
+    for id, px, py, label, count in features:
+        tags = [1, value(count)] if count > 1 else [0, value(label)]
+        body.append(_len_field(2, _int_field(1, id) + _len_field(2, b''.join(map(_varint, tags)))
+                               + _int_field(3, 1) + _len_field(4, _point(px, py))))
+    body += [_len_field(3, k.encode()) for k in keys]
+    body += [_len_field(4, v) for v in values]
+    body += [_int_field(5, EXTENT), _int_field(15, 2)]
+    return b''.join(body)
+
+
+def encode_tile(conn, z, x, y):
+    features = points(locations_in_tile(conn, z, x, y), z, x, y)
+    return _len_field(3, encode_layer('locations', features)) if features else b''
+
+
+# ── Disk cache ───────────────────────────────────────────────
+
+class VectorTileCache:
+    def __init__(self, root=None, db='locations.db', prefix='/vtiles'):
+        self.root = root
+        self.db = db
+        self.prefix = prefix
+        self.seen = 0                   # last vector_tile_dirty seq applied
+        self.lock = threading.Lock()
+        self.hits = self.encoded = self.invalidated = 0
+
+    def path(self, z, x, y):
+        return os.path.join(self.root, str(z), str(x), f'{y}.mvt')
+
+    def sync(self, conn):
+        """Delete the cached tiles touched by location changes since the
+        last call and return the change sequence they reflect."""
+        seq = dirty_seq(conn)
+        if seq == self.seen:
+            return seq
+        with self.lock:
+            count = conn.execute('SELECT COUNT(*) FROM vector_tile_dirty WHERE seq <= ?', (seq,)).fetchone()[0]
+            if count >= FLUSH_ALL:      # full: older positions may have been trimmed
+                self.clear()
+            else:
+                for lat, lon in conn.execute('SELECT latitude, longitude FROM vector_tile_dirty WHERE seq <= ?',
+                                             (seq,)).fetchall():
+                    for z in range(MAX_ZOOM + 1):
+                        for x, y in tiles_around(lat, lon, z):
+                            try:
+                                os.unlink(self.path(z, x, y))
+                                self.invalidated += 1
+                            except FileNotFoundError:
+                                pass
+            conn.execute('DELETE FROM vector_tile_dirty WHERE seq <= ?', (seq,))
+            conn.commit()
+            self.seen = seq
+        return seq
+
+    def clear(self):
+        if os.path.isdir(self.root):
+            doomed = f'{self.root}.old-{os.getpid()}-{threading.get_ident()}'
+            os.replace(self.root, doomed)
+            shutil.rmtree(doomed, ignore_errors=True)
+            self.invalidated += 1
+
+    def tile(self, z, x, y):
+        """Encoded tile bytes (``b''`` for an empty tile)."""
+        with sqlite3.connect(self.db) as conn:
+            seq = self.sync(conn)
+            path = self.path(z, x, y)
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                self.hits += 1
+                return data
+            except FileNotFoundError:
+                pass
+            data = encode_tile(conn, z, x, y)
+            self.encoded += 1
+            with self.lock:
+                # A change while encoding means the tile may already be stale.
+                if dirty_seq(conn) == seq:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    tmp = f'{path}.{os.getpid()}-{threading.get_ident()}'
+                    with open(tmp, 'wb') as f:
+                        f.write(data)
+                    os.replace(tmp, path)
+        return data
+
+    def stats(self):
+        return dict(hits=self.hits, encoded=self.encoded, invalidated=self.invalidated)
+
+    def serve(self, z, x, y):
+        if not (0 <= z <= MAX_ZOOM and 0 <= x < 1 << z and 0 <= y < 1 << z):
+            return Response('Tile out of range', status=404)
+        resp = Response(self.tile(z, x, y), mimetype=MIMETYPE)
+        resp.headers['Cache-Control'] = 'no-cache'
+        resp.add_etag()
+        return resp.make_conditional(request)
+
+    def init_app(self, app):
+        if self.root is None:
+            self.root = app.config.get('VTILES_DIR', 'vtiles')
+        app.add_url_rule(self.prefix + '/<int:z>/<int:x>/<int:y>.mvt', 'vector_tile', self.serve)
@@ -0,0 +1,101 @@
+"""Compact encodings for GPS fixes and distance replies.
+
+``/update_location`` picks the codec from ``Content-Type`` and the reply
+encoding from ``Accept``; plain JSON stays the default.
+
+``application/x-gps-fix``        one packed fix (24 bytes, little endian):
+                                 float64 lat, float64 lon, uint32 location_id,
+                                 float32 accuracy (NaN if unknown)
+``application/x-gps-fix-batch``  any number of packed fixes back to back
+``application/x-gps-distance``   reply: one float64 distance per fix,
+                                 NaN where the location does not exist
+``application/msgpack``          ``[lat, lon, location_id(, accuracy)]`` or a
+                                 list of those; needs the ``msgpack`` package
+"""
+import math
+import struct
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+FIX = struct.Struct('<ddIf')
+DISTANCE = struct.Struct('<d')
+
+FIX_TYPE = 'application/x-gps-fix'
+FIX_BATCH_TYPE = 'application/x-gps-fix-batch'
+DISTANCE_TYPE = 'application/x-gps-distance'
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack')
+JSON_TYPE = 'application/json'
+
+COMPACT_TYPES = (FIX_TYPE, FIX_BATCH_TYPE) + MSGPACK_TYPES
+
+
+class WireError(ValueError):
+    pass
+
+
+def is_compact(mimetype):
+    return mimetype in COMPACT_TYPES
+
+
+def decode_fixes(mimetype, body):
+    """Return ``(fixes, batched)``; each fix is ``(lat, lon, location_id, accuracy)``."""
+    if mimetype == FIX_TYPE:
+        if len(body) != FIX.size:
+            raise WireError(f'expected {FIX.size} bytes, got {len(body)}')
+        return _checked([FIX.unpack(body)]), False
+    if mimetype == FIX_BATCH_TYPE:
+        if len(body) % FIX.size:
+            raise WireError(f'body length {len(body)} is not a multiple of {FIX.size}')
+        return _checked(FIX.iter_unpack(body)), True
+    if mimetype in MSGPACK_TYPES:
+        if msgpack is None:
+            raise WireError('msgpack is not installed on the server')
+        try:
+            obj = msgpack.unpackb(body)
+        except Exception as e:
+            raise WireError(f'bad msgpack body: {e}')
+        if not isinstance(obj, (list, tuple)):
+            raise WireError(f'expected a fix or a list of fixes, got {type(obj).__name__}')
+        batched = bool(obj) and isinstance(obj[0], (list, tuple))
+        try:
+            return _checked(_fix_from_seq(f) for f in (obj if batched else [obj])), batched
+        except (TypeError, ValueError, IndexError) as e:
+            raise WireError(f'bad fix: {e}')
+    raise WireError(f'unsupported content type {mimetype}')
+
+
+def _fix_from_seq(f):
+    if not isinstance(f, (list, tuple)):
+        raise TypeError(f'expected a list, got {type(f).__name__}')
+    acc = float(f[3]) if len(f) > 3 and f[3] is not None else math.nan
+    return float(f[0]), float(f[1]), int(f[2]), acc
+
+
+def _checked(fixes):
+    fixes = list(fixes)
+    for lat, lon, _, _ in fixes:
+        if not (math.isfinite(lat) and math.isfinite(lon)):
+            raise WireError(f'non-finite coordinates ({lat}, {lon})')
+    return fixes
+
+
+def reply_mimetype(accept, request_mimetype):
+    """Pick the reply encoding; without a usable Accept, mirror the request."""
+    offers = [DISTANCE_TYPE, JSON_TYPE]
+    if msgpack is not None:
+        offers[1:1] = MSGPACK_TYPES
+    own = request_mimetype if request_mimetype in MSGPACK_TYPES else DISTANCE_TYPE
+    if own in offers:
+        offers.remove(own)
+        offers.insert(0, own)
+    return accept.best_match(offers, default=own)
+
+
+def encode_distances(mimetype, distances, batched):
+    if mimetype == DISTANCE_TYPE:
+        return struct.pack(f'<{len(distances)}d', *distances)
+    values = [None if math.isnan(d) else d for d in distances]
+    return msgpack.packb(values if batched else values[0])